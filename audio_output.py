@@ -0,0 +1,71 @@
+import threading
+import sounddevice as sd
+
+
+class AudioOutput:
+    """One float32 sounddevice output stream that players take turns feeding.
+
+    A playlist hands the same AudioOutput to each clip's player, so moving from one
+    clip to the next only switches the callback instead of closing the device and
+    opening it again. The stream is only reopened when the channels or sample rate
+    change, and plays silence while no player is attached.
+    """
+
+    def __init__(self, blocksize=1024, latency='low'):
+        self.blocksize = blocksize
+        self.latency = latency
+        self.stream = None
+        self._format = None
+        self._callback = None
+        self._lock = threading.Lock()
+
+    def open(self, channels, sample_rate):
+        """Have the stream running in this format, reopening it only if it was in
+        another. Returns its output latency in seconds."""
+        with self._lock:
+            if self._format != (channels, sample_rate):
+                self._close()
+                self.stream = sd.OutputStream(
+                    channels=channels,
+                    dtype='float32',
+                    samplerate=sample_rate,
+                    callback=self._audio_callback,
+                    blocksize=self.blocksize,
+                    latency=self.latency
+                )
+                self._format = (channels, sample_rate)
+                self.stream.start()
+            return self.stream.latency
+
+    def attach(self, callback):
+        """Send the stream's callbacks to callback from the next one on"""
+        with self._lock:
+            self._callback = callback
+
+    def detach(self, callback):
+        """Go back to silence, if callback is still the one attached"""
+        with self._lock:
+            if self._callback == callback:
+                self._callback = None
+
+    def _audio_callback(self, outdata, frames, time_info, status):
+        callback = self._callback
+        if callback is None:
+            outdata.fill(0)
+            return
+        callback(outdata, frames, time_info, status)
+
+    def _close(self):
+        if self.stream is not None:
+            try:
+                self.stream.stop()
+                self.stream.close()
+            except Exception as e:
+                print(f"Error stopping audio: {e}")
+        self.stream = None
+        self._format = None
+        self._callback = None
+
+    def close(self):
+        with self._lock:
+            self._close()
@@ -0,0 +1,130 @@
+import time
+import av
+import numpy as np
+
+# Seconds of audio decoded and thrown away ahead of a seek target, so the decoder has
+# the frames before it (AAC overlaps each frame with the last)
+DECODER_WARMUP = 0.1
+
+
+class AudioRingBuffer:
+    """Preallocated float32 ring of (samples, channels) for one producer and one consumer.
+
+    write_index and read_index count samples since the last reset and only ever grow;
+    the producer is the only writer of write_index and the consumer of read_index, so
+    the two sides need no lock. Neither side allocates sample memory.
+    """
+
+    def __init__(self, capacity, channels):
+        self.capacity = capacity
+        self.channels = channels
+        self.buffer = np.zeros((capacity, channels), dtype=np.float32)
+        self.write_index = 0
+        self.read_index = 0
+        # Reads that came up short, writes that found too little room (the producer
+        # normally waits and writes the rest later) and writes whose rest the producer
+        # dropped instead. Only the last loses samples.
+        self.underruns = 0
+        self.full_waits = 0
+        self.overruns = 0
+
+    def available(self):
+        return self.write_index - self.read_index
+
+    def space(self):
+        return self.capacity - self.available()
+
+    def write(self, samples):
+        """Copy as many samples as fit and return how many that was"""
+        count = min(len(samples), self.space())
+        if count < len(samples):
+            self.full_waits += 1
+        start = self.write_index % self.capacity
+        first = min(count, self.capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        self.buffer[:count - first] = samples[first:count]
+        self.write_index += count
+        return count
+
+    def read_into(self, out):
+        """Fill out with the next samples, padding with silence. Returns samples read."""
+        count = min(len(out), self.available())
+        if count < len(out):
+            self.underruns += 1
+            out[count:].fill(0)
+        start = self.read_index % self.capacity
+        first = min(count, self.capacity - start)
+        out[:first] = self.buffer[start:start + first]
+        out[first:count] = self.buffer[:count - first]
+        self.read_index += count
+        return count
+
+    def reset(self):
+        """Drop everything buffered. Only safe while neither side is running."""
+        self.write_index = 0
+        self.read_index = 0
+
+
+def decode_audio_into(ring, video_path, start_time, sample_rate, keep_going, stats=None):
+    """Decode the first audio track from start_time into ring, as packed float32 with
+    ring.channels channels at sample_rate, until keep_going() turns false.
+
+    Waits for the consumer to make room rather than dropping audio. Returns True if it
+    ran to the end of the track. With stats (a PipelineStats), decoding and resampling
+    each frame is recorded as audio_decode, not counting the waits.
+    """
+    audio_container = av.open(video_path)
+    try:
+        audio_stream = audio_container.streams.audio[0]
+        audio_stream.thread_type = 'AUTO'
+        # Start a little early: the first frame decoded after a seek has nothing to overlap
+        # with and comes out wrong, so it should be one of the ones dropped below
+        audio_container.seek(int(max(0.0, start_time - DECODER_WARMUP) / audio_stream.time_base),
+                             stream=audio_stream)
+
+        # Resample straight to packed float32, which is what sounddevice plays
+        resampler = av.AudioResampler(
+            format='flt',
+            layout='stereo' if ring.channels == 2 else 'mono',
+            rate=sample_rate
+        )
+
+        start = time.perf_counter()
+        for frame in audio_container.decode(audio_stream):
+            if not keep_going():
+                return False
+
+            try:
+                # The seek lands before start_time, drop the samples ahead of it so the
+                # clock (which counts samples from start_time) stays in sync
+                skip = 0
+                if frame.pts is not None and frame.pts * frame.time_base < start_time:
+                    skip = round((start_time - float(frame.pts * frame.time_base)) * sample_rate)
+
+                for out_frame in resampler.resample(frame):
+                    # Packed audio comes back as one interleaved row, view it as (samples, channels)
+                    audio_data = out_frame.to_ndarray().reshape(-1, ring.channels)
+                    if skip:
+                        dropped = min(skip, len(audio_data))
+                        audio_data = audio_data[dropped:]
+                        skip -= dropped
+                        if not len(audio_data):
+                            continue
+                    if stats is not None:
+                        stats.record('audio_decode', start)
+
+                    written = ring.write(audio_data)
+                    while written < len(audio_data) and keep_going():
+                        time.sleep(0.005)
+                        written += ring.write(audio_data[written:])
+                    if written < len(audio_data):
+                        # Stopped while waiting, the rest of this frame is thrown away
+                        ring.overruns += 1
+                    start = time.perf_counter()
+
+            except Exception as e:
+                print(f"Audio processing error: {e}")
+                continue
+        return True
+    finally:
+        audio_container.close()
@@ -0,0 +1,65 @@
+import threading
+import time
+
+
+class MasterClock:
+    """Playback position that video frames are presented against.
+
+    With audio, the position is derived from the number of samples the output stream
+    has actually consumed, minus the device latency, so video follows what is being
+    heard and cannot drift from it. Without audio, or once the audio track has run
+    out, it free-runs on time.monotonic(), at `rate` times real time for shuttle
+    playback. Both are computed from a fixed origin rather than accumulated per frame,
+    so long files don't build up error.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.base = 0.0
+        self.sample_rate = None
+        self.latency = 0.0
+        self.samples_played = 0
+        self.running = False
+        self.rate = 1.0
+        self._t0 = 0.0
+
+    def start(self, position, sample_rate=None, latency=0.0, rate=1.0):
+        with self._lock:
+            self.base = position
+            self.sample_rate = sample_rate
+            self.latency = latency
+            self.rate = rate
+            self.samples_played = 0
+            self._t0 = time.monotonic()
+            self.running = True
+
+    def stop(self):
+        """Freeze at the current position"""
+        position = self.now()
+        with self._lock:
+            self.base = position
+            self.sample_rate = None
+            self.running = False
+
+    def add_samples(self, count):
+        """Called from the audio callback with the number of samples it handed to the device"""
+        self.samples_played += count
+
+    def free_run(self):
+        """Audio ran out, carry on from where it got to on the monotonic clock"""
+        if self.sample_rate is None:
+            return
+        position = self.now()
+        with self._lock:
+            self.base = position
+            self.sample_rate = None
+            self._t0 = time.monotonic()
+
+    def now(self):
+        with self._lock:
+            if not self.running:
+                return self.base
+            if self.sample_rate:
+                played = self.samples_played / self.sample_rate - self.latency
+                return self.base + max(0.0, played)
+            return self.base + (time.monotonic() - self._t0) * self.rate
@@ -0,0 +1,60 @@
+"""Decoded frames per second for each video decoder threading setting.
+
+    python -m benchmarks.decode_threads [--size 1920x1080] [--seconds 5] [--counts 0,2,4]
+
+Runs over synthetic H.264 and HEVC clips, each encoded once without and once with
+slices (slice threading can only split frames that were encoded in slices). Only
+decoding is timed, no conversion.
+"""
+import argparse
+import os
+import time
+import av
+from decoder_options import DecoderOptions, THREAD_TYPES, open_video
+from benchmarks.synthetic import make_clip
+
+
+def decode_fps(path, options, repeat=2):
+    """Best of repeat full decodes, in frames per second"""
+    best = 0.0
+    for _ in range(repeat):
+        container = open_video(path, options)
+        try:
+            stream = container.streams.video[0]
+            start = time.perf_counter()
+            frames = sum(1 for _ in container.decode(stream))
+            best = max(best, frames / (time.perf_counter() - start))
+        finally:
+            container.close()
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', default='1920x1080')
+    parser.add_argument('--seconds', type=int, default=5)
+    parser.add_argument('--counts', default='0,2,4',
+                        help="thread counts to try, 0 means one per core")
+    parser.add_argument('--repeat', type=int, default=2)
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.size.split('x'))
+    counts = [int(c) for c in args.counts.split(',')]
+
+    codecs = [c for c in ('libx264', 'libx265') if c in av.codecs_available]
+    print(f"{os.cpu_count()} cores, {width}x{height}, {args.seconds} s per clip")
+    print(f"{'clip':<34} {'setting':<12} {'fps':>8}")
+    for codec in codecs:
+        for slices in (0, 8):
+            path = make_clip(width, height, args.seconds, codec=codec, slices=slices)
+            label = f"{codec} {'8 slices' if slices else '1 slice'}"
+            # NONE ignores the count, run it once as the single-threaded baseline
+            settings = [DecoderOptions('NONE')] + [DecoderOptions(t, c) for t in THREAD_TYPES[1:]
+                                                   for c in counts]
+            for options in settings:
+                name = options.thread_type if options.thread_type == 'NONE' else \
+                    f"{options.thread_type}:{options.thread_count or 'cores'}"
+                print(f"{label:<34} {name:<12} {decode_fps(path, options, args.repeat):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
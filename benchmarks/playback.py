@@ -0,0 +1,321 @@
+"""Playback benchmarks over synthetic clips, written to JSON for comparing commits.
+
+    python -m benchmarks.playback [--out results.json] [--baseline old.json]
+                                  [--seconds 5] [--quick] [--only vfr]
+
+Starts from one baseline clip (H.264 720p, 48-frame GOP, stereo AAC) and varies one
+thing at a time: codec, GOP length, resolution, rotation, variable frame rate and
+audio layout. For each clip it measures, with the same pieces the player uses:
+
+    open_ms              opening the file up to the video stream
+    ttff_ms              open, decode and convert the first frame for display
+    index_ms             building the keyframe index
+    seek_random_*_ms     p50/p99 of seeks to random frames (decode_from, as seek_frame does)
+    seek_sequential_*_ms p50/p99 of seeks stepping forward through the clip
+    decode_fps           decoding alone
+    playback_fps         decoding plus the display conversion, as the decode thread does
+    convert_*_ms         per-frame cost of each conversion the player can make
+    audio_underruns      short reads of the audio ring while the audio decode thread
+                         and a decode-and-convert loop run in real time, not counting
+                         the ones before the first audio arrived (audio_startup_underruns)
+
+Nothing here needs a display or an audio device. Rotation is applied through texture
+coordinates when drawing, so rotated clips cost the same to decode and convert.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+import av
+import numpy as np
+from audio_ring import AudioRingBuffer, decode_audio_into
+from decoder_options import open_video
+from decoding import decode_from
+from planar_frame import PlanarFrame
+from video_index import VideoIndex
+from benchmarks.synthetic import make_clip
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+BASELINE = dict(width=1280, height=720, codec='libx264', gop=48, bframes=2, audio='stereo')
+
+
+def clip_matrix(quick=False):
+    """(label, make_clip arguments) for the baseline and each variation of it"""
+    variations = [('baseline', {})]
+    for codec in ('libx265', 'libvpx-vp9'):
+        if codec in av.codecs_available:
+            variations.append((codec, {'codec': codec, 'bframes': 0 if 'vpx' in codec else 2}))
+    variations += [
+        ('gop12', {'gop': 12}),
+        ('gop250', {'gop': 250}),
+        ('360p', {'width': 640, 'height': 360}),
+        ('1080p', {'width': 1920, 'height': 1080}),
+        ('rotate90', {'rotation': 90}),
+        ('vfr', {'vfr': True}),
+        ('no-audio', {'audio': None}),
+        ('mono', {'audio': 'mono'}),
+        ('5.1', {'audio': '5.1'}),
+    ]
+    base = BASELINE
+    if quick:
+        base = dict(BASELINE, width=640, height=360)
+        variations = [(label, kwargs) for label, kwargs in variations if 'width' not in kwargs]
+    return [(label, dict(base, **kwargs)) for label, kwargs in variations]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def _percentiles(name, samples):
+    samples = np.asarray(samples)
+    return {f"{name}_p50_ms": _ms(np.percentile(samples, 50)),
+            f"{name}_p99_ms": _ms(np.percentile(samples, 99))}
+
+
+def _display_convert(frame):
+    # What the player's default YUV display path does with every frame it shows
+    return PlanarFrame.from_av(frame)
+
+
+def measure_open(path, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        container = open_video(path)
+        container.streams.video[0]
+        times.append(time.perf_counter() - start)
+        container.close()
+    return {'open_ms': _ms(np.median(times))}
+
+
+def measure_first_frame(path, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        container = open_video(path)
+        for frame in container.decode(container.streams.video[0]):
+            _display_convert(frame)
+            break
+        times.append(time.perf_counter() - start)
+        container.close()
+    return {'ttff_ms': _ms(np.median(times))}
+
+
+def _seek(container, stream, index, target):
+    """Decode to frame number target from its keyframe and convert it, like seek_frame"""
+    target_pts = int(index.pts[target])
+    for frame in decode_from(container, stream, index, target):
+        if frame.pts >= target_pts:
+            return _display_convert(frame)
+    return None
+
+
+def measure_seeks(path, index, count, seed=0):
+    container = open_video(path)
+    try:
+        stream = container.streams.video[0]
+        frames = len(index)
+        rng = np.random.default_rng(seed)
+        results = {}
+        for name, targets in (('seek_random', rng.integers(0, frames, count)),
+                              ('seek_sequential', np.linspace(0, frames - 1, count).astype(int))):
+            times = []
+            for target in targets:
+                start = time.perf_counter()
+                _seek(container, stream, index, int(target))
+                times.append(time.perf_counter() - start)
+            results.update(_percentiles(name, times))
+        return results
+    finally:
+        container.close()
+
+
+def measure_throughput(path):
+    results = {}
+    for name, convert in (('decode_fps', None), ('playback_fps', _display_convert)):
+        container = open_video(path)
+        try:
+            start = time.perf_counter()
+            count = 0
+            for frame in container.decode(container.streams.video[0]):
+                if convert is not None:
+                    convert(frame)
+                count += 1
+            results[name] = round(count / (time.perf_counter() - start), 2)
+        finally:
+            container.close()
+    return results
+
+
+def measure_conversions(path, frames=30):
+    container = open_video(path)
+    try:
+        stream = container.streams.video[0]
+        half = (stream.width // 4 * 2, stream.height // 4 * 2)
+        conversions = {
+            'convert_planar_ms': PlanarFrame.from_av,
+            'convert_rgb24_ms': lambda f: f.to_ndarray(format='rgb24'),
+            # --display-size: converted straight to the size it is drawn at
+            'convert_planar_half_ms': lambda f: PlanarFrame.from_av(f, *half),
+            'convert_rgb24_half_ms': lambda f: f.to_ndarray(width=half[0], height=half[1],
+                                                            format='rgb24'),
+        }
+        times = {name: [] for name in conversions}
+        for i, frame in enumerate(container.decode(stream)):
+            if i == frames:
+                break
+            for name, convert in conversions.items():
+                start = time.perf_counter()
+                convert(frame)
+                times[name].append(time.perf_counter() - start)
+        return {name: _ms(np.median(samples)) for name, samples in times.items()}
+    finally:
+        container.close()
+
+
+def measure_audio(path, seconds, blocksize=1024, buffer_seconds=0.5):
+    """Run the player's audio decode thread against a consumer reading blocksize samples
+    at the sample rate, with video decoding and converting alongside it"""
+    container = av.open(path)
+    if not container.streams.audio:
+        container.close()
+        return {}
+    audio = container.streams.audio[0]
+    rate = audio.rate
+    channels = 2 if audio.channels >= 2 else 1
+    container.close()
+
+    ring = AudioRingBuffer(int(rate * buffer_seconds), channels)
+    running = True
+    producer = threading.Thread(target=decode_audio_into,
+                                args=(ring, path, 0.0, rate, lambda: running))
+    producer.daemon = True
+
+    def video_load():
+        video = open_video(path)
+        try:
+            for frame in video.decode(video.streams.video[0]):
+                if not running:
+                    break
+                _display_convert(frame)
+        finally:
+            video.close()
+
+    loader = threading.Thread(target=video_load)
+    loader.daemon = True
+    producer.start()
+    loader.start()
+
+    # Same start as play(): the decode thread gets going just before the device does
+    out = np.zeros((blocksize, channels), dtype=np.float32)
+    blocks = int(seconds * rate / blocksize)
+    # Reads that come up short before any audio has arrived are startup latency,
+    # counted apart from underruns once playback is going
+    startup_underruns = None
+    start = time.perf_counter()
+    for n in range(blocks):
+        delay = start + n * blocksize / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        if ring.read_into(out) and startup_underruns is None:
+            startup_underruns = ring.underruns
+    running = False
+    producer.join(timeout=1.0)
+    loader.join(timeout=1.0)
+    startup_underruns = ring.underruns if startup_underruns is None else startup_underruns
+    return {'audio_underruns': ring.underruns - startup_underruns,
+            'audio_startup_underruns': startup_underruns, 'audio_blocks': blocks}
+
+
+def run_clip(path, seeks, audio_seconds):
+    started = time.perf_counter()
+    index = VideoIndex.build(path)
+    results = {'index_ms': _ms(time.perf_counter() - started), 'frames': len(index)}
+    results.update(measure_open(path))
+    results.update(measure_first_frame(path))
+    results.update(measure_seeks(path, index, seeks))
+    results.update(measure_throughput(path))
+    results.update(measure_conversions(path))
+    results.update(measure_audio(path, min(audio_seconds, index.duration)))
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """Print each metric next to the same one in an earlier results file"""
+    with open(baseline_path) as f:
+        baseline = {clip['label']: clip for clip in json.load(f)['clips']}
+    print(f"\nAgainst {baseline_path}:")
+    for clip in results['clips']:
+        before = baseline.get(clip['label'])
+        if before is None:
+            continue
+        for name, value in clip['metrics'].items():
+            old = before['metrics'].get(name)
+            if not isinstance(value, (int, float)) or not old:
+                continue
+            print(f"  {clip['label']:<12} {name:<28} {old:>10} -> {value:>10} "
+                  f"({(value - old) / old:+.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', default=None,
+                        help="results file, default benchmarks/results/bench-<commit>.json")
+    parser.add_argument('--baseline', default=None, help="earlier results to compare against")
+    parser.add_argument('--seconds', type=int, default=5, help="length of each clip")
+    parser.add_argument('--seeks', type=int, default=40, help="seeks of each kind per clip")
+    parser.add_argument('--audio-seconds', type=float, default=3.0)
+    parser.add_argument('--quick', action='store_true', help="small clips only")
+    parser.add_argument('--only', default=None, help="clips whose label contains this")
+    args = parser.parse_args()
+
+    commit = _git_commit()
+    results = {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pyav': av.__version__,
+        'ffmpeg': av.ffmpeg_version_info,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'clips': [],
+    }
+    for label, kwargs in clip_matrix(args.quick):
+        if args.only and args.only not in label:
+            continue
+        path = make_clip(seconds=args.seconds, **kwargs)
+        metrics = run_clip(path, args.seeks, args.audio_seconds)
+        results['clips'].append({'label': label, 'clip': os.path.basename(path),
+                                 'params': kwargs, 'metrics': metrics})
+        print(f"{label:<12} open {metrics['open_ms']:.1f} ms, first frame {metrics['ttff_ms']:.1f} ms, "
+              f"seek p50/p99 {metrics['seek_random_p50_ms']:.1f}/{metrics['seek_random_p99_ms']:.1f} ms, "
+              f"{metrics['playback_fps']:.0f} fps, "
+              f"{metrics.get('audio_underruns', '-')} underruns")
+
+    out_path = args.out
+    if out_path is None:
+        # Kept out of git, see .gitignore
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out_path = os.path.join(RESULTS_DIR, f"bench-{commit or 'local'}.json")
+    with open(out_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {out_path}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
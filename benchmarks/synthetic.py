@@ -0,0 +1,184 @@
+"""Synthetic test clips for the benchmarks, generated with PyAV and cached on disk.
+
+Frames are a scrolling noise texture over a moving gradient, so the encoder has real
+detail and motion to code and decoding them costs about what camera footage does.
+"""
+import math
+import os
+import struct
+import tempfile
+from fractions import Fraction
+import av
+import numpy as np
+
+MEDIA_DIR = os.path.join(tempfile.gettempdir(), 'video-playground-bench')
+
+AUDIO_LAYOUTS = ('mono', 'stereo', '5.1')
+
+# Frame durations for variable frame rate clips, in quarters of the nominal interval.
+# They average out to the nominal rate, so a clip still lasts about `seconds`.
+_VFR_PATTERN = (4, 2, 6, 4, 3, 5, 4, 8, 1, 3)
+
+
+def clip_name(width, height, seconds, fps, codec, gop, bframes, slices, audio,
+              rotation=0, vfr=False):
+    name = f"{codec}_{width}x{height}_{seconds}s_{fps}fps_g{gop}_b{bframes}"
+    if slices:
+        name += f"_s{slices}"
+    if vfr:
+        name += "_vfr"
+    if rotation:
+        name += f"_r{rotation}"
+    if audio:
+        layout = _audio_layout(audio)
+        name += "_audio" if layout == 'stereo' else f"_audio-{layout}"
+    return name + ".mp4"
+
+
+def _audio_layout(audio):
+    # True was the only option before there were layouts
+    return 'stereo' if audio is True else audio
+
+
+def _encoder_options(codec, slices):
+    if codec == 'libx265':
+        return {'preset': 'veryfast',
+                'x265-params': 'log-level=error' + (f":slices={slices}" if slices else '')}
+    if codec.startswith('libvpx'):
+        return {'deadline': 'realtime', 'cpu-used': '8'}
+    options = {'preset': 'veryfast'}
+    if slices:
+        options['slices'] = str(slices)
+    return options
+
+
+def _boxes(data, start, end):
+    """(type, payload start, end) of the ISO BMFF boxes in data[start:end]"""
+    while start + 8 <= end:
+        size, kind = struct.unpack('>I4s', data[start:start + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', data[start + 8:start + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - start
+        yield kind, start + header, start + size
+        start += size
+
+
+def set_rotation(path, degrees):
+    """Give the video track of an MP4 a display matrix that turns it degrees
+    counterclockwise, by rewriting its tkhd box in place.
+
+    PyAV can't attach display matrix side data to an output stream, and the mp4 muxer
+    no longer reads the old 'rotate' tag, so it goes straight into the file.
+    """
+    with open(path, 'r+b') as f:
+        data = f.read()
+        for kind, start, end in _boxes(data, 0, len(data)):
+            if kind != b'moov':
+                continue
+            for kind, trak, trak_end in _boxes(data, start, end):
+                if kind != b'trak':
+                    continue
+                children = {kind: start for kind, start, _ in _boxes(data, trak, trak_end)}
+                mdia = {kind: start for kind, start, _ in
+                        _boxes(data, children[b'mdia'], trak_end)}
+                # hdlr: version and flags, pre_defined, then the handler type
+                if data[mdia[b'hdlr'] + 8:mdia[b'hdlr'] + 12] != b'vide':
+                    continue
+                tkhd = children[b'tkhd']
+                # Times are 32 bits in a version 0 tkhd and 64 in version 1, then come
+                # reserved, layer, alternate group, volume and reserved before the matrix
+                matrix = tkhd + 4 + (32 if data[tkhd] == 1 else 20) + 16
+                theta = math.radians(degrees)
+                cos = round(math.cos(theta) * 65536)
+                sin = round(math.sin(theta) * 65536)
+                f.seek(matrix)
+                f.write(struct.pack('>9i', cos, -sin, 0, sin, cos, 0, 0, 0, 1 << 30))
+                return
+    raise ValueError(f"No video track in {path}")
+
+
+def make_clip(width=1920, height=1080, seconds=5, fps=30, codec='libx264', gop=48,
+              bframes=2, slices=0, audio=False, rotation=0, vfr=False, directory=MEDIA_DIR):
+    """Path of a synthetic clip with these settings, encoding it first if needed.
+
+    slices > 0 splits every frame into that many slices, which is what slice
+    threading needs to do anything. audio adds a 48 kHz AAC sine tone, in one of
+    AUDIO_LAYOUTS (True means stereo). rotation sets a display matrix of 90, 180 or 270
+    degrees. vfr varies each frame's duration around 1 / fps.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, clip_name(width, height, seconds, fps, codec, gop,
+                                             bframes, slices, audio, rotation, vfr))
+    if os.path.exists(path):
+        return path
+
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 64, (height, width * 2, 1), dtype=np.uint8)
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :, None]
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None, None]
+
+    tmp_path = path + '.tmp'
+    output = av.open(tmp_path, 'w', format='mp4')
+    try:
+        stream = output.add_stream(codec, rate=fps)
+        stream.width = width
+        stream.height = height
+        stream.pix_fmt = 'yuv420p'
+        stream.codec_context.gop_size = gop
+        stream.codec_context.max_b_frames = bframes
+        stream.options = _encoder_options(codec, slices)
+        # Frame times in quarter intervals, so variable durations are whole ticks. The
+        # muxer picks its own stream time base once it writes the header.
+        time_base = Fraction(1, fps * 4)
+        stream.time_base = time_base
+        stream.codec_context.time_base = time_base
+
+        audio_stream = None
+        channels = 0
+        if audio:
+            layout = _audio_layout(audio)
+            audio_stream = output.add_stream('aac', rate=48000)
+            audio_stream.layout = layout
+            channels = av.AudioLayout(layout).nb_channels
+        audio_written = 0
+
+        pts = 0
+        for i in range(seconds * fps):
+            t = pts / (fps * 4)
+            shift = (i * 8) % width
+            base = np.concatenate(np.broadcast_arrays(x, y, (x + y + t) % 1.0), axis=2)
+            base = (base * 191).astype(np.uint8)
+            image = base + noise[:, shift:shift + width]
+            frame = av.VideoFrame.from_ndarray(image, format='rgb24')
+            frame.pts = pts
+            frame.time_base = time_base
+            pts += _VFR_PATTERN[i % len(_VFR_PATTERN)] if vfr else 4
+            for packet in stream.encode(frame):
+                output.mux(packet)
+
+            if audio_stream is not None:
+                # Audio up to the end of this frame, whatever its duration
+                n = np.arange(audio_written, pts * 48000 // (fps * 4))
+                tone = (0.2 * np.sin(2 * np.pi * 440 * n / 48000)).astype(np.float32)
+                samples = np.repeat(tone, channels)[None, :]
+                audio_frame = av.AudioFrame.from_ndarray(samples, format='flt', layout=layout)
+                audio_frame.sample_rate = 48000
+                audio_frame.pts = audio_written
+                audio_written += len(n)
+                for packet in audio_stream.encode(audio_frame):
+                    output.mux(packet)
+
+        for packet in stream.encode(None):
+            output.mux(packet)
+        if audio_stream is not None:
+            for packet in audio_stream.encode(None):
+                output.mux(packet)
+    finally:
+        output.close()
+    if rotation:
+        set_rotation(tmp_path, rotation)
+    os.replace(tmp_path, path)
+    return path
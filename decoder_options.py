@@ -0,0 +1,39 @@
+import av
+
+THREAD_TYPES = ('NONE', 'SLICE', 'FRAME', 'AUTO')
+
+
+class DecoderOptions:
+    """Threading for the video decoder: thread_type is 'FRAME', 'SLICE', 'AUTO' or
+    'NONE', thread_count 0 lets FFmpeg pick one per core.
+
+    FRAME decodes several frames at once and works for any H.264/HEVC stream, but holds
+    thread_count frames back, which every seek pays for. SLICE splits each frame and
+    adds no delay, but only helps streams encoded with several slices. AUTO uses both.
+    FFmpeg only reads these when the codec opens, so they have to be set straight
+    after the container is opened; open_video() does that.
+    """
+
+    def __init__(self, thread_type='AUTO', thread_count=0):
+        thread_type = thread_type.upper()
+        if thread_type not in THREAD_TYPES:
+            raise ValueError(f"thread_type must be one of {', '.join(THREAD_TYPES)}, not {thread_type!r}")
+        if thread_count < 0:
+            raise ValueError(f"thread_count must be >= 0, not {thread_count}")
+        self.thread_type = thread_type
+        self.thread_count = thread_count
+
+    def __repr__(self):
+        return f"DecoderOptions({self.thread_type!r}, {self.thread_count})"
+
+    def apply(self, stream):
+        stream.thread_type = self.thread_type
+        stream.codec_context.thread_count = self.thread_count
+
+
+def open_video(path, options=None):
+    """Open path with options applied to its first video stream. Returns the container."""
+    container = av.open(path)
+    if container.streams.video:
+        (options or DecoderOptions()).apply(container.streams.video[0])
+    return container
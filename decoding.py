@@ -0,0 +1,64 @@
+import itertools
+import numpy as np
+
+
+def _seek_to_keyframe(container, stream, index, key):
+    """Seek so that demuxing starts on keyframe key, or failing that an earlier one.
+    Returns the packets from there on.
+
+    The mp4 and Matroska demuxers seek on presentation times, so the keyframe's PTS
+    lands right on it where its DTS would land a whole GOP early. MPEG-TS seeks on
+    decode times and stops at the first packet after them, keyframe or not, so when
+    the PTS overshoots like that it seeks again to the DTS.
+    """
+    key_pts = int(index.pts[key])
+    for timestamp in (key_pts, int(index.dts[key])):
+        container.seek(timestamp, stream=stream)
+        packets = container.demux(stream)
+        first = next(packets, None)
+        if first is None or (first.is_keyframe and (first.pts is None or first.pts <= key_pts)):
+            break
+    return itertools.chain([first] if first is not None else [], packets)
+
+
+def decode_from(container, stream, index, target):
+    """Decoded frames of stream from the keyframe before frame number target onwards.
+
+    Seeks to the keyframe (see _seek_to_keyframe) and decodes forward, so the first
+    frames are the ones leading up to target. If the demuxer lands past the target
+    anyway, it starts over from the keyframe before, leaving out the frames it has
+    already yielded. Runs to the end of the stream; callers stop iterating when they
+    have what they need. Frames without a PTS are skipped.
+    """
+    target_pts = int(index.pts[target])
+    key = index.keyframe_for(target)
+    last_pts = None
+    while key is not None:
+        reached = False
+        for packet in _seek_to_keyframe(container, stream, index, key):
+            for frame in packet.decode():
+                if frame.pts is None or (last_pts is not None and frame.pts <= last_pts):
+                    continue
+                if not reached:
+                    if frame.pts > target_pts and key > 0:
+                        break
+                    reached = frame.pts >= target_pts
+                last_pts = frame.pts
+                yield frame
+            else:
+                continue
+            break
+        else:
+            return
+        key = index.previous_keyframe(key) if key > 0 else None
+
+
+def rgb_into(frame, out, interpolation=None):
+    """Convert frame to rgb24 at out's (H, W) and copy it into out, without allocating
+    an intermediate array"""
+    height, width = out.shape[:2]
+    rgb = frame.reformat(width=width, height=height, format='rgb24', interpolation=interpolation)
+    plane = rgb.planes[0]
+    rows = np.frombuffer(plane, dtype=np.uint8, count=plane.line_size * height)
+    out[:] = rows.reshape(height, plane.line_size)[:, :width * 3].reshape(height, width, 3)
+    return out
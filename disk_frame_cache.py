@@ -0,0 +1,273 @@
+"""Decoded frames kept on disk between sessions, for clips that get reviewed over and over.
+
+Each video gets a data file of fixed-size frame slots, memory mapped, and a small .npz
+saying which frame number is in which slot. A cached frame comes back as a view onto
+the mapping, so seeking to it is a page-cache read instead of a decode. Every video
+shares one directory and one byte budget; when a data file has to grow past it, whole
+videos are dropped, least recently used first. A video's frames are thrown away once
+its size or modification time changes.
+
+Frames are copied in by a background thread, so storing them never holds up the seek
+or decode that produced them; when it falls behind, frames are skipped rather than
+queued without bound. Slots are only ever appended, so the .npz saved at close()
+always describes slots that were completely written, even if the process dies before
+saving the next one. One process at a time should write a given video's entry.
+"""
+import hashlib
+import os
+import threading
+from collections import deque
+import numpy as np
+from planar_frame import PlanarFrame
+
+CACHE_VERSION = 1
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                         'video-playground', 'frames')
+# Slots a data file grows by at a time
+GROW_SLOTS = 32
+# Frames waiting on the writer thread before put() starts skipping them
+MAX_PENDING = 16
+KINDS = ('yuv420p', 'rgb24')
+
+
+def _entries(directory):
+    """(last used, bytes, data path) of every video cached in directory. Data files are
+    written whenever frames are added and touched whenever they are opened, so their
+    modification time is when they were last used."""
+    entries = []
+    for name in os.listdir(directory):
+        if not name.endswith('.frames'):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    return entries
+
+
+def _remove(data_path):
+    for path in (data_path, data_path[:-len('.frames')] + '.npz'):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class DiskFrameCache:
+    """Full-resolution frames of one video, by frame number, in the shared disk cache.
+
+    kind is 'yuv420p' for PlanarFrames or 'rgb24' for (H, W, 3) arrays, the two forms
+    the player converts to. Frames of any other size are not stored.
+    """
+
+    def __init__(self, video_path, kind, width, height, max_bytes, directory=CACHE_DIR):
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of {', '.join(KINDS)}, not {kind!r}")
+        self.kind = kind
+        self.width = width
+        self.height = height
+        if kind == 'yuv420p':
+            chroma = ((height + 1) // 2, (width + 1) // 2)
+            self.plane_shapes = [(height, width), chroma, chroma]
+        else:
+            self.plane_shapes = [(height, width, 3)]
+        self.slot_bytes = sum(int(np.prod(shape)) for shape in self.plane_shapes)
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        # Set once the budget can't fit another slot, nothing more gets stored
+        self.full = False
+
+        source = os.path.abspath(video_path)
+        st = os.stat(source)
+        self._source = (source, st.st_size, st.st_mtime_ns)
+        key = hashlib.sha1(f"{source}:{kind}:{width}x{height}".encode()).hexdigest()[:24]
+        os.makedirs(directory, exist_ok=True)
+        self.data_path = os.path.join(directory, key + '.frames')
+        self.meta_path = os.path.join(directory, key + '.npz')
+
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._saved = 0
+        self.matrix = 'bt709'
+        self.full_range = False
+        self._load()
+        if not self._slots:
+            _remove(self.data_path)
+        with open(self.data_path, 'ab'):
+            pass
+        # Touched so it counts as just used, then made room for as it stands
+        os.utime(self.data_path)
+        self._capacity = os.path.getsize(self.data_path) // self.slot_bytes
+        self._data = None
+        if self._capacity:
+            self._data = np.memmap(self.data_path, dtype=np.uint8, mode='r+',
+                                   shape=(self._capacity, self.slot_bytes))
+        self.full = not self._make_room(self._capacity * self.slot_bytes)
+
+        self._pending = deque()
+        self._queued = set()
+        self._cond = threading.Condition()
+        self._running = True
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _load(self):
+        """Slot table from the .npz, unless the video or the cache format changed"""
+        if not os.path.exists(self.meta_path):
+            return
+        try:
+            with np.load(self.meta_path) as data:
+                source, size, mtime_ns = self._source
+                if (int(data['version']) != CACHE_VERSION or str(data['source']) != source or
+                        int(data['size']) != size or int(data['mtime_ns']) != mtime_ns):
+                    print(f"Frame cache for {source} is stale, starting over")
+                    return
+                frames, slots = data['frames'], data['slots']
+                if len(slots) and (int(slots.max()) + 1) * self.slot_bytes > os.path.getsize(self.data_path):
+                    return
+                self._slots = dict(zip(frames.tolist(), slots.tolist()))
+                self._saved = len(self._slots)
+                self.matrix = str(data['matrix'])
+                self.full_range = bool(data['full_range'])
+        except Exception as e:
+            print(f"Error loading frame cache {self.meta_path}: {e}")
+
+    def _make_room(self, nbytes):
+        """Drop other videos, least recently used first, until this one can take up
+        nbytes. False if it can't even with all of them gone."""
+        entries = sorted(entry for entry in _entries(self.directory) if entry[2] != self.data_path)
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total + nbytes <= self.max_bytes:
+                break
+            _remove(path)
+            total -= size
+        return total + nbytes <= self.max_bytes
+
+    def _grow(self):
+        capacity = self._capacity + GROW_SLOTS
+        if not self._make_room(capacity * self.slot_bytes):
+            self.full = True
+            return False
+        with open(self.data_path, 'r+b') as f:
+            f.truncate(capacity * self.slot_bytes)
+        # Views handed out earlier keep the old mapping alive
+        self._data = np.memmap(self.data_path, dtype=np.uint8, mode='r+',
+                               shape=(capacity, self.slot_bytes))
+        self._capacity = capacity
+        return True
+
+    def _planes(self, slot):
+        row = self._data[slot]
+        planes = []
+        offset = 0
+        for shape in self.plane_shapes:
+            size = int(np.prod(shape))
+            planes.append(row[offset:offset + size].reshape(shape))
+            offset += size
+        return planes
+
+    def __contains__(self, frame_number):
+        return frame_number in self._slots
+
+    def __len__(self):
+        return len(self._slots)
+
+    @property
+    def nbytes(self):
+        return len(self._slots) * self.slot_bytes
+
+    def get(self, frame_number):
+        """The frame as a view onto the cache file, or None if it isn't cached"""
+        with self._lock:
+            slot = self._slots.get(frame_number)
+            if slot is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            planes = self._planes(slot)
+        if self.kind == 'rgb24':
+            return planes[0]
+        widths = [shape[1] for shape in self.plane_shapes]
+        return PlanarFrame(planes, widths, self.width, self.height, self.matrix, self.full_range)
+
+    def put(self, frame_number, frame):
+        """Queue a full-resolution frame to be stored, unless it is already stored, the
+        budget is spent or the writer is too far behind. The frame must not change after."""
+        if frame.shape[:2] != (self.height, self.width) or isinstance(frame, PlanarFrame) != (self.kind == 'yuv420p'):
+            return
+        with self._cond:
+            if (frame_number in self._slots or frame_number in self._queued or self.full or
+                    len(self._pending) >= MAX_PENDING or not self._running):
+                return
+            self._pending.append((frame_number, frame))
+            self._queued.add(frame_number)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or not self._running)
+                if not self._pending:
+                    return
+                frame_number, frame = self._pending[0]
+            try:
+                self._write(frame_number, frame)
+            except Exception as e:
+                print(f"Frame cache write error: {e}")
+            with self._cond:
+                self._pending.popleft()
+                self._queued.discard(frame_number)
+
+    def _write(self, frame_number, frame):
+        with self._lock:
+            if frame_number in self._slots or self.full:
+                return
+            slot = len(self._slots)
+            if slot >= self._capacity and not self._grow():
+                return
+            planes = self._planes(slot)
+            if self.kind == 'rgb24':
+                planes[0][:] = frame
+            else:
+                # Planes from the decoder are padded out to their line size
+                for plane, source in zip(planes, frame.planes):
+                    plane[:] = source[:plane.shape[0], :plane.shape[1]]
+                self.matrix = frame.matrix
+                self.full_range = frame.full_range
+            self._slots[frame_number] = slot
+
+    def save(self):
+        """Write the slot table, if frames were added since it was last written"""
+        with self._lock:
+            if len(self._slots) == self._saved:
+                return
+            frames = np.fromiter(self._slots.keys(), dtype=np.int64, count=len(self._slots))
+            slots = np.fromiter(self._slots.values(), dtype=np.int64, count=len(self._slots))
+            if self._data is not None:
+                self._data.flush()
+            source, size, mtime_ns = self._source
+            tmp_path = self.meta_path + '.tmp'
+            try:
+                with open(tmp_path, 'wb') as f:
+                    np.savez(f, version=CACHE_VERSION, source=source, size=size, mtime_ns=mtime_ns,
+                             frames=frames, slots=slots, matrix=self.matrix,
+                             full_range=self.full_range)
+                os.replace(tmp_path, self.meta_path)
+                self._saved = len(frames)
+            except OSError as e:
+                print(f"Error saving frame cache {self.meta_path}: {e}")
+
+    def close(self):
+        """Finish writing whatever is queued, then save"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self.thread.join()
+        self.save()
+        self._data = None
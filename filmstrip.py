@@ -0,0 +1,141 @@
+import threading
+import av
+import numpy as np
+from decoder_options import open_video
+from sidecar import load_sidecar, save_sidecar
+
+FILMSTRIP_VERSION = 1
+
+
+def filmstrip_path_for(video_path):
+    return video_path + '.filmstrip.npz'
+
+
+class Filmstrip:
+    """Keyframe thumbnails packed into one RGB atlas image, for drawing under the slider.
+
+    A background thread decodes with the decoder set to skip every non-key frame, so it
+    never pays for the frames in between, and fills the atlas slot by slot; `version`
+    goes up with each thumbnail so the GUI knows when to upload it again. Thumbnails
+    are at least duration / max_thumbs apart. The finished atlas is cached next to the
+    video and reused while the video's size and mtime match.
+    """
+
+    def __init__(self, video_path, thumb_height=54, max_thumbs=256, columns=16,
+                 decoder_options=None):
+        self.video_path = video_path
+        self.thumb_height = thumb_height
+        self.thumb_width = 0
+        self.max_thumbs = max_thumbs
+        self.columns = columns
+        self.decoder_options = decoder_options
+        self.atlas = None
+        self.times = np.zeros(max_thumbs, dtype=np.float64)
+        self.count = 0
+        self.version = 0
+        self.done = False
+        self._running = True
+        self.thread = None
+        if not self._load():
+            self.thread = threading.Thread(target=self._run)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def thumb_for(self, timestamp):
+        """Slot of the last thumbnail at or before timestamp, or None if there is none yet"""
+        count = self.count
+        if count == 0:
+            return None
+        slot = int(np.searchsorted(self.times[:count], timestamp, side='right')) - 1
+        return max(slot, 0)
+
+    def uv_rect(self, slot):
+        """(u0, v0, u1, v1) of a slot within the atlas"""
+        rows = self.atlas.shape[0] // self.thumb_height
+        row, column = divmod(slot, self.columns)
+        return (column / self.columns, row / rows,
+                (column + 1) / self.columns, (row + 1) / rows)
+
+    def stop(self):
+        self._running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+
+    def _allocate(self, thumb_width):
+        rows = -(-self.max_thumbs // self.columns)
+        self.thumb_width = thumb_width
+        self.atlas = np.zeros((rows * self.thumb_height, self.columns * thumb_width, 3), dtype=np.uint8)
+
+    def _run(self):
+        try:
+            container = open_video(self.video_path, self.decoder_options)
+        except Exception as e:
+            print(f"Filmstrip error: {e}")
+            self.done = True
+            return
+        try:
+            stream = container.streams.video[0]
+            # The decoder drops everything but keyframes before doing any work on them
+            stream.codec_context.skip_frame = 'NONKEY'
+            thumb_width = max(2, round(stream.width * self.thumb_height / stream.height / 2) * 2)
+            self._allocate(thumb_width)
+            duration = 0.0
+            if stream.duration:
+                duration = float(stream.duration * stream.time_base)
+            elif container.duration:
+                duration = container.duration / av.time_base
+            spacing = duration / self.max_thumbs
+
+            for frame in container.decode(stream):
+                if not self._running:
+                    return
+                if frame.pts is None:
+                    continue
+                timestamp = float(frame.pts * frame.time_base)
+                if self.count and timestamp - self.times[self.count - 1] < spacing:
+                    continue
+                if self.count == self.max_thumbs:
+                    break
+                thumb = frame.to_ndarray(width=self.thumb_width, height=self.thumb_height,
+                                         format='rgb24', interpolation='AREA')
+                row, column = divmod(self.count, self.columns)
+                self.atlas[row * self.thumb_height:(row + 1) * self.thumb_height,
+                           column * self.thumb_width:(column + 1) * self.thumb_width] = thumb
+                # Publish the time only once the pixels are in place
+                self.times[self.count] = timestamp
+                self.count += 1
+                self.version += 1
+            self._save()
+        except Exception as e:
+            print(f"Filmstrip error: {e}")
+        finally:
+            container.close()
+            self.done = True
+            self.version += 1
+
+    def _load(self):
+        data = load_sidecar(filmstrip_path_for(self.video_path), self.video_path, FILMSTRIP_VERSION,
+                            thumb_height=self.thumb_height, columns=self.columns)
+        if data is None or len(data['times']) > self.max_thumbs:
+            return False
+        self._allocate(int(data['thumb_width']))
+        atlas = data['atlas']
+        self.atlas[:atlas.shape[0]] = atlas
+        self.count = len(data['times'])
+        self.times[:self.count] = data['times']
+        self.done = True
+        self.version += 1
+        return True
+
+    def _save(self):
+        rows = -(-self.count // self.columns)
+        save_sidecar(
+            filmstrip_path_for(self.video_path), self.video_path, FILMSTRIP_VERSION,
+            compressed=True,
+            thumb_width=self.thumb_width,
+            thumb_height=self.thumb_height,
+            columns=self.columns,
+            times=self.times[:self.count],
+            # Only the rows in use, the rest of the atlas is empty
+            atlas=self.atlas[:rows * self.thumb_height],
+        )
@@ -0,0 +1,48 @@
+import threading
+from collections import OrderedDict
+
+
+class FrameCache:
+    """LRU cache of decoded frames keyed by PTS, bounded by total bytes"""
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pts):
+        with self._lock:
+            frame = self._frames.get(pts)
+            if frame is None:
+                self.misses += 1
+                return None
+            self._frames.move_to_end(pts)
+            self.hits += 1
+            return frame
+
+    def put(self, pts, frame):
+        if frame.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._frames.pop(pts, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._frames[pts] = frame
+            self.nbytes += frame.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._frames.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.nbytes = 0
+
+    def __contains__(self, pts):
+        return pts in self._frames
+
+    def __len__(self):
+        return len(self._frames)
@@ -0,0 +1,82 @@
+import threading
+from collections import deque
+
+
+class FrameQueue:
+    """Bounded lookahead of decoded frames between the decode thread and the renderer.
+
+    The queue is full once it holds max_frames frames or, if max_bytes is set, once the
+    next frame would push it past max_bytes. put() sleeps on a condition variable while
+    full, so a decoder that is far enough ahead costs no CPU. The renderer side never
+    blocks.
+    """
+
+    def __init__(self, max_frames=8, max_bytes=None):
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._frames = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def _is_full(self, nbytes):
+        if not self._frames:
+            return False
+        if len(self._frames) >= self.max_frames:
+            return True
+        return self.max_bytes is not None and self.nbytes + nbytes > self.max_bytes
+
+    def put(self, pts, frame):
+        """Queue a frame, waiting for room. Returns False if the queue was closed."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._closed or not self._is_full(frame.nbytes))
+            if self._closed:
+                return False
+            self._frames.append((pts, frame))
+            self.nbytes += frame.nbytes
+            self._cond.notify_all()
+            return True
+
+    def peek(self):
+        """Oldest (pts, frame) without removing it, or None"""
+        with self._cond:
+            return self._frames[0] if self._frames else None
+
+    def newest_due(self, timestamp):
+        """Time of the newest frame queued for timestamp or earlier, or None"""
+        with self._cond:
+            due = None
+            for pts, _ in self._frames:
+                if pts > timestamp:
+                    break
+                due = pts
+            return due
+
+    def pop(self):
+        """Remove and return the oldest (pts, frame), or None if empty"""
+        with self._cond:
+            if not self._frames:
+                return None
+            item = self._frames.popleft()
+            self.nbytes -= item[1].nbytes
+            self._cond.notify_all()
+            return item
+
+    def clear(self):
+        with self._cond:
+            self._frames.clear()
+            self.nbytes = 0
+            self._cond.notify_all()
+
+    def close(self):
+        """Wake and turn away the producer, e.g. on pause"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def reopen(self):
+        with self._cond:
+            self._closed = False
+
+    def __len__(self):
+        return len(self._frames)
@@ -0,0 +1,204 @@
+import queue
+import threading
+import numpy as np
+from decoder_options import open_video
+from decoding import decode_from, rgb_into
+from video_index import VideoIndex
+
+
+class FrameReader:
+    """Frames of a video as (N, H, W, 3) uint8 RGB batches, with no GL or display needed.
+
+    Frames come from [start, end) seconds: every stride-th one, or with fps the frame on
+    screen at each 1/fps step from start. size=(width, height) scales them during the
+    rgb24 conversion. A background thread decodes up to prefetch batches ahead into a
+    fixed set of preallocated buffers, so iterating allocates no frame memory.
+
+    Iterating yields (frames, times). frames is a view of one of those buffers and is
+    only valid until the next batch is requested, so copy it to keep it. The last batch
+    may be shorter. Seeks use the same keyframe index as the player, and gaps longer than
+    a GOP are skipped by seeking rather than decoded through.
+
+        with FrameReader('clip.mp4', batch_size=64, fps=2, size=(224, 224)) as reader:
+            for frames, times in reader:
+                model(frames)
+    """
+
+    def __init__(self, video_path, batch_size=32, start=0.0, end=None, stride=1, fps=None,
+                 size=None, prefetch=2, decoder_options=None, interpolation=None):
+        self.video_path = video_path
+        self.batch_size = batch_size
+        self.interpolation = interpolation
+        self.index = VideoIndex.open(video_path)
+        self.container = open_video(video_path, decoder_options)
+        self.stream = self.container.streams.video[0]
+        self.width, self.height = size or (self.stream.width, self.stream.height)
+        self.frame_numbers = self._select(start, end, stride, fps)
+
+        self._buffers = [(np.empty((batch_size, self.height, self.width, 3), dtype=np.uint8),
+                          np.empty(batch_size, dtype=np.float64))
+                         for _ in range(prefetch + 2)]
+        # Slots free to fill, and (slot, count) of full ones in order; None ends the stream
+        self._free = queue.Queue()
+        for slot in range(len(self._buffers)):
+            self._free.put(slot)
+        self._ready = queue.Queue(maxsize=prefetch)
+        self._running = True
+        self.thread = None
+
+    def _select(self, start, end, stride, fps):
+        """Frame numbers (rows of the index) to read, in order"""
+        index = self.index
+        if len(index) == 0:
+            return np.zeros(0, dtype=np.int64)
+        end = index.duration if end is None else min(end, index.duration)
+        tb = index.time_base
+        if fps:
+            times = start + np.arange(max(0, int(np.ceil((end - start) * fps)))) / fps
+            ticks = np.round(times / float(tb)).astype(np.int64)
+            numbers = np.searchsorted(index.pts, ticks, side='right') - 1
+            return np.clip(numbers, 0, len(index) - 1)
+        first = int(np.searchsorted(index.pts, int(np.ceil(start / tb)), side='left'))
+        last = int(np.searchsorted(index.pts, int(np.ceil(end / tb)), side='left'))
+        return np.arange(first, last, stride, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.frame_numbers)
+
+    def __iter__(self):
+        if self.thread is not None:
+            raise RuntimeError("FrameReader can only be iterated once")
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        held = None
+        while True:
+            # Asking for the next batch hands the previous buffer back to the decoder
+            if held is not None:
+                self._free.put(held)
+                held = None
+            item = self._ready.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            held, count = item
+            frames, times = self._buffers[held]
+            yield frames[:count], times[:count]
+
+    def close(self):
+        self._running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+        self.container.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _put(self, item):
+        while self._running:
+            try:
+                self._ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _take_slot(self):
+        while self._running:
+            try:
+                return self._free.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return None
+
+    def _run(self):
+        index = self.index
+        numbers = self.frame_numbers
+        i = 0
+        slot = None
+        fill = 0
+        try:
+            while i < len(numbers) and self._running:
+                progressed = False
+                for frame in decode_from(self.container, self.stream, index, int(numbers[i])):
+                    if not self._running:
+                        return
+                    n = int(np.searchsorted(index.pts, frame.pts, side='left'))
+                    # Frames the index doesn't have (shouldn't happen) are skipped over
+                    while i < len(numbers) and numbers[i] < n:
+                        i += 1
+                    # With fps above the source rate one frame fills several samples
+                    while i < len(numbers) and numbers[i] == n:
+                        if slot is None:
+                            slot = self._take_slot()
+                            if slot is None:
+                                return
+                        frames, times = self._buffers[slot]
+                        rgb_into(frame, frames[fill], self.interpolation)
+                        times[fill] = index.time_of(n)
+                        fill += 1
+                        i += 1
+                        progressed = True
+                        if fill == self.batch_size:
+                            if not self._put((slot, fill)):
+                                return
+                            slot = None
+                            fill = 0
+                    if i == len(numbers):
+                        break
+                    # Next wanted frame is in a later GOP, seeking there is cheaper. Only once
+                    # this pass got somewhere, the seek may have landed before its target.
+                    if progressed and index.keyframe_for(int(numbers[i])) > n + 1:
+                        break
+                else:
+                    # Ran out of stream before every selected frame turned up
+                    break
+            if fill:
+                self._put((slot, fill))
+        except Exception as e:
+            self._put(e)
+        finally:
+            self._put(None)
+
+
+def main():
+    """Read a video through FrameReader and compare with decoding alone:
+
+        python frame_reader.py video.mp4 [--batch 32] [--size 224x224] [--fps 5] [--stride 1]
+    """
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('video')
+    parser.add_argument('--batch', type=int, default=32)
+    parser.add_argument('--size', default=None)
+    parser.add_argument('--fps', type=float, default=None)
+    parser.add_argument('--stride', type=int, default=1)
+    args = parser.parse_args()
+    size = tuple(int(v) for v in args.size.split('x')) if args.size else None
+
+    container = open_video(args.video)
+    start = time.perf_counter()
+    decoded = sum(1 for _ in container.decode(container.streams.video[0]))
+    decode_seconds = time.perf_counter() - start
+    container.close()
+    print(f"decode only: {decoded / decode_seconds:.1f} fps ({decoded} frames)")
+
+    with FrameReader(args.video, batch_size=args.batch, size=size, fps=args.fps,
+                     stride=args.stride) as reader:
+        start = time.perf_counter()
+        frames = 0
+        for batch, times in reader:
+            frames += len(batch)
+        seconds = time.perf_counter() - start
+    print(f"FrameReader: {frames / seconds:.1f} fps ({frames} frames of "
+          f"{reader.width}x{reader.height}, batches of {args.batch})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""Decoded frames shared with other processes through a ring of fixed-size slots.
+
+One producer (the player's decode thread, or any decode loop) publishes RGB frames;
+consumers in other processes attach by name and get numpy views straight onto the
+slots, so nothing is pickled or copied. Consumers can post overlays (boxes with
+scores and labels) keyed by frame PTS, which the player draws over those frames.
+
+Shared memory layout, all little-endian:
+
+    ring header     160 bytes, including each attached consumer's pid and ack
+    slot headers    64 bytes per slot: seq, pts, time, height, width, channels, rotation
+    overlay table   fixed-size records: seq, pts, count, boxes, scores, labels
+    slot data       height * width * channels bytes per slot, 64-byte aligned
+
+A slot's seq is zeroed while it is being written and set last, so readers can tell
+a finished frame from one being overwritten (check is_current() after using a view).
+Each consumer only ever writes its own ack, so no two processes race on a field.
+"""
+import os
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from decoding import rgb_into
+
+RING_MAGIC = 0x474E4952
+RING_VERSION = 2
+MAX_BOXES = 32
+MAX_CONSUMERS = 8
+
+# With BLOCK the producer waits for the slowest attached consumer to ack() before
+# reusing a slot; with DROP_OLDEST it always writes and consumers that fall behind
+# skip ahead
+BLOCK = 0
+DROP_OLDEST = 1
+_POLICIES = {'block': BLOCK, 'drop_oldest': DROP_OLDEST}
+
+_RING_HEADER = np.dtype([
+    ('magic', '<u4'), ('version', '<u4'), ('slots', '<u4'), ('overlay_slots', '<u4'),
+    ('height', '<u4'), ('width', '<u4'), ('channels', '<u4'), ('policy', '<u4'),
+    ('write_seq', '<u8'), ('overlay_seq', '<u8'), ('dropped', '<u8'), ('reserved', '<u8'),
+    # pid of the consumer in each entry, 0 for a free one, and the last seq it acked
+    ('consumers', '<i4', (MAX_CONSUMERS,)), ('acks', '<u8', (MAX_CONSUMERS,)),
+])
+_SLOT_HEADER = np.dtype({
+    'names': ['seq', 'pts', 'time', 'height', 'width', 'channels', 'rotation'],
+    'formats': ['<u8', '<i8', '<f8', '<u4', '<u4', '<u4', '<i4'],
+    'itemsize': 64,
+})
+_OVERLAY = np.dtype([
+    ('seq', '<u8'), ('pts', '<i8'), ('count', '<u4'), ('reserved', '<u4'),
+    ('boxes', '<f4', (MAX_BOXES, 4)), ('scores', '<f4', (MAX_BOXES,)), ('labels', '<i4', (MAX_BOXES,)),
+])
+
+
+def _align(n, to=64):
+    return (n + to - 1) // to * to
+
+
+class RingFrame:
+    """One frame read from the ring. `image` is a view onto shared memory."""
+
+    __slots__ = ('seq', 'pts', 'time', 'rotation', 'image')
+
+    def __init__(self, seq, pts, time, rotation, image):
+        self.seq = seq
+        self.pts = pts
+        self.time = time
+        self.rotation = rotation
+        self.image = image
+
+
+class FrameRing:
+    """Producer and consumer side of a shared-memory frame ring, see the module docstring.
+
+    FrameRing.create() makes a new ring (and unlinks it on close), FrameRing.attach()
+    opens an existing one by name and takes one of MAX_CONSUMERS consumer entries until
+    close(). One process publishes; consumers each keep their own cursor and ack. Under
+    the block policy read_next() acks the previous frame by default, and the producer
+    waits on the lowest ack of the consumers attached, never on none.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.name = shm.name
+        self.owner = owner
+        self.consumer = None
+        self.header = np.ndarray((), dtype=_RING_HEADER, buffer=shm.buf)
+        if self.header['magic'] != RING_MAGIC or self.header['version'] != RING_VERSION:
+            raise ValueError(f"{shm.name} is not a version {RING_VERSION} frame ring")
+        self.slots = int(self.header['slots'])
+        self.slot_shape = (int(self.header['height']), int(self.header['width']),
+                           int(self.header['channels']))
+        self.slot_bytes = _align(int(np.prod(self.slot_shape)))
+        offset = _RING_HEADER.itemsize
+        self.slot_headers = np.ndarray(self.slots, dtype=_SLOT_HEADER, buffer=shm.buf, offset=offset)
+        offset += self.slots * _SLOT_HEADER.itemsize
+        self.overlays = np.ndarray(int(self.header['overlay_slots']), dtype=_OVERLAY,
+                                   buffer=shm.buf, offset=offset)
+        self.data_offset = _align(offset + self.overlays.nbytes)
+        self.cursor = 0
+        self.skipped = 0
+
+    @staticmethod
+    def _size(slots, overlay_slots, shape):
+        headers = _RING_HEADER.itemsize + slots * _SLOT_HEADER.itemsize + overlay_slots * _OVERLAY.itemsize
+        return _align(headers) + slots * _align(int(np.prod(shape)))
+
+    @classmethod
+    def create(cls, name=None, slots=8, max_shape=(1080, 1920, 3), policy='drop_oldest',
+               overlay_slots=64):
+        if policy not in _POLICIES:
+            raise ValueError(f"policy must be one of {', '.join(_POLICIES)}, not {policy!r}")
+        shm = shared_memory.SharedMemory(name=name, create=True,
+                                         size=cls._size(slots, overlay_slots, max_shape))
+        header = np.ndarray((), dtype=_RING_HEADER, buffer=shm.buf)
+        header[()] = np.zeros((), dtype=_RING_HEADER)
+        header['magic'], header['version'] = RING_MAGIC, RING_VERSION
+        header['slots'], header['overlay_slots'] = slots, overlay_slots
+        header['height'], header['width'], header['channels'] = max_shape
+        header['policy'] = _POLICIES[policy]
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name, consumer=None):
+        """Attach as a consumer, in entry `consumer` or the first free one. Two consumers
+        attaching at the same moment could pick the same free entry; give them each
+        their own index if they might."""
+        ring = cls(shared_memory.SharedMemory(name=name, track=False), owner=False)
+        try:
+            ring._claim(consumer)
+        except ValueError:
+            ring.close()
+            raise
+        return ring
+
+    def _claim(self, consumer):
+        header = self.header
+        self._release_dead()
+        if consumer is None:
+            free = np.flatnonzero(header['consumers'] == 0)
+            if len(free) == 0:
+                raise ValueError(f"{self.name} already has {MAX_CONSUMERS} consumers attached")
+            consumer = int(free[0])
+        elif header['consumers'][consumer] != 0:
+            raise ValueError(f"Consumer {consumer} of {self.name} is already attached")
+        # Starts out having acked everything it could no longer read
+        header['acks'][consumer] = max(0, int(header['write_seq']) - self.slots)
+        header['consumers'][consumer] = os.getpid()
+        self.consumer = consumer
+
+    def _release_dead(self):
+        """Free the entries of consumers that exited without close()"""
+        for consumer, pid in enumerate(self.header['consumers'].tolist()):
+            if pid == 0:
+                continue
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                self.header['consumers'][consumer] = 0
+            except OSError:
+                pass
+
+    def _slowest_ack(self):
+        """Lowest ack of the attached consumers, None if none are attached"""
+        header = self.header
+        attached = header['consumers'] != 0
+        if not attached.any():
+            return None
+        return int(header['acks'][attached].min())
+
+    def _slot_image(self, slot, shape):
+        start = self.data_offset + slot * self.slot_bytes
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=start)
+
+    # Producer
+
+    def publish(self, image, pts, timestamp=0.0, rotation=0, timeout=None):
+        """Write a frame into the next slot and return its seq.
+
+        image is an (H, W, C) uint8 array, copied in, or a decoded av.VideoFrame,
+        converted to rgb24 straight into the slot. Under the block policy this waits up
+        to timeout seconds (forever if None) for the slowest consumer to free a slot
+        and returns None if none came free; the frame is then counted in `dropped`.
+        """
+        header = self.header
+        seq = int(header['write_seq']) + 1
+        if header['policy'] == BLOCK:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            slowest = self._slowest_ack()
+            if slowest is not None and seq - slowest > self.slots:
+                self._release_dead()
+                slowest = self._slowest_ack()
+            while slowest is not None and seq - slowest > self.slots:
+                if deadline is not None and time.monotonic() >= deadline:
+                    header['dropped'] += 1
+                    return None
+                time.sleep(0.001)
+                slowest = self._slowest_ack()
+
+        if isinstance(image, np.ndarray):
+            shape = image.shape if image.ndim == 3 else image.shape + (1,)
+        else:
+            shape = (image.height, image.width, 3)
+        if shape[0] > self.slot_shape[0] or shape[1] > self.slot_shape[1] or shape[2] > self.slot_shape[2]:
+            raise ValueError(f"Frame {shape} doesn't fit the ring's {self.slot_shape} slots")
+
+        slot = (seq - 1) % self.slots
+        slot_header = self.slot_headers[slot]
+        slot_header['seq'] = 0
+        target = self._slot_image(slot, shape)
+        if isinstance(image, np.ndarray):
+            target[:] = image.reshape(shape)
+        else:
+            rgb_into(image, target)
+        slot_header['pts'] = pts
+        slot_header['time'] = timestamp
+        slot_header['height'], slot_header['width'], slot_header['channels'] = shape
+        slot_header['rotation'] = rotation
+        slot_header['seq'] = seq
+        header['write_seq'] = seq
+        return seq
+
+    # Consumers
+
+    def read_next(self, timeout=None, ack=True):
+        """The frame after the last one this reader returned, or None on timeout.
+
+        Frames the producer already overwrote are skipped (counted in `skipped`).
+        With ack, handing out the next frame releases the previous one.
+        """
+        header = self.header
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            write_seq = int(header['write_seq'])
+            if write_seq > self.cursor:
+                wanted = max(self.cursor + 1, write_seq - self.slots + 1)
+                slot_header = self.slot_headers[(wanted - 1) % self.slots]
+                if int(slot_header['seq']) == wanted:
+                    if ack and self.cursor:
+                        self.ack(self.cursor)
+                    self.skipped += wanted - self.cursor - 1
+                    self.cursor = wanted
+                    shape = (int(slot_header['height']), int(slot_header['width']),
+                             int(slot_header['channels']))
+                    return RingFrame(wanted, int(slot_header['pts']), float(slot_header['time']),
+                                     int(slot_header['rotation']),
+                                     self._slot_image((wanted - 1) % self.slots, shape))
+                # Being overwritten right now, look again
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(0.001)
+
+    def is_current(self, frame):
+        """False if the producer has started overwriting frame's slot since it was read"""
+        return int(self.slot_headers[(frame.seq - 1) % self.slots]['seq']) == frame.seq
+
+    def ack(self, seq):
+        """Done with every frame up to seq, the producer may reuse their slots once the
+        other consumers are too"""
+        if self.consumer is not None and seq > int(self.header['acks'][self.consumer]):
+            self.header['acks'][self.consumer] = seq
+
+    def post_overlay(self, pts, boxes, scores=None, labels=None):
+        """Publish boxes for the frame with this PTS: (N, 4) x0, y0, x1, y1 in 0-1 units
+        of the unrotated frame. At most MAX_BOXES are kept. One consumer posts."""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)[:MAX_BOXES]
+        count = len(boxes)
+        seq = int(self.header['overlay_seq']) + 1
+        record = self.overlays[seq % len(self.overlays)]
+        record['seq'] = 0
+        record['pts'] = pts
+        record['count'] = count
+        record['boxes'][:count] = boxes
+        record['scores'][:count] = scores[:count] if scores is not None else 1.0
+        record['labels'][:count] = labels[:count] if labels is not None else 0
+        record['seq'] = seq
+        self.header['overlay_seq'] = seq
+
+    # Player side
+
+    def overlay_for(self, pts, max_lag=0):
+        """(boxes, scores, labels) posted for pts, or for the newest earlier frame no more
+        than max_lag PTS units before it; None if there is none"""
+        valid = self.overlays[self.overlays['seq'] > 0]
+        candidates = valid[(valid['pts'] <= pts) & (valid['pts'] >= pts - max_lag)]
+        if len(candidates) == 0:
+            return None
+        best = candidates[np.argmax(candidates['pts'])]
+        count = int(best['count'])
+        return best['boxes'][:count].copy(), best['scores'][:count].copy(), best['labels'][:count].copy()
+
+    def close(self):
+        if self.consumer is not None:
+            self.header['consumers'][self.consumer] = 0
+            self.consumer = None
+        del self.header, self.slot_headers, self.overlays
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def main():
+    """Example consumer: attach to a player's ring and outline the bright part of each frame
+
+        python user_interface.py video.mp4 --frame-ring=playground
+        python frame_ring.py playground
+    """
+    import sys
+
+    ring = FrameRing.attach(sys.argv[1])
+    print(f"Attached to {ring.name}: {ring.slots} slots of {ring.slot_shape}")
+    try:
+        while True:
+            frame = ring.read_next(timeout=1.0)
+            if frame is None:
+                continue
+            luma = frame.image[::4, ::4].mean(axis=2)
+            ys, xs = np.nonzero(luma >= np.percentile(luma, 95))
+            if ring.is_current(frame) and len(xs):
+                h, w = luma.shape
+                ring.post_overlay(frame.pts, [[xs.min() / w, ys.min() / h,
+                                               (xs.max() + 1) / w, (ys.max() + 1) / h]])
+            if frame.seq % 100 == 0:
+                print(f"seq {frame.seq}, skipped {ring.skipped}, dropped {int(ring.header['dropped'])}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+
+if __name__ == "__main__":
+    main()
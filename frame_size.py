@@ -0,0 +1,61 @@
+import time
+import av
+from imgui_bundle import imgui
+from planar_frame import PlanarFrame
+
+
+def stream_duration(container, stream):
+    """Length of the video in seconds from the stream's header, then the container's,
+    or 0.0 if neither says"""
+    if stream.duration:
+        return float(stream.duration * stream.time_base)
+    if container.duration:
+        return container.duration / av.time_base
+    return 0.0
+
+
+def convert_frame(frame, yuv_display, size=None):
+    """Decoded frame as a PlanarFrame when yuv_display or an RGB array otherwise, scaled
+    to size (width, height) during the conversion if given"""
+    width, height = size or (None, None)
+    if yuv_display:
+        return PlanarFrame.from_av(frame, width, height)
+    if width is not None:
+        return frame.to_ndarray(width=width, height=height, format='rgb24')
+    return frame.to_ndarray(format='rgb24')
+
+
+class DisplaySize:
+    """The size a video is drawn at on screen, in framebuffer pixels and unrotated, to
+    convert frames to instead of their full resolution.
+
+    update() is given the drawn size every frame; size only changes once the new one
+    has held for settle_seconds, so dragging a window edge doesn't rescale every frame.
+    It is None while the video is drawn at full resolution or bigger.
+    """
+
+    def __init__(self, width, height, settle_seconds=0.25):
+        self.width = width
+        self.height = height
+        self.settle_seconds = settle_seconds
+        self.size = None
+        self._pending = None
+        self._pending_since = 0.0
+
+    def update(self, width, height, rotation=0):
+        """Take the drawn width and height, in points; returns size"""
+        scale = imgui.get_io().display_framebuffer_scale
+        width, height = width * scale.x, height * scale.y
+        if rotation in (90, 270):
+            width, height = height, width
+        if width >= self.width or height >= self.height:
+            size = None
+        else:
+            size = (max(2, int(width) // 2 * 2), max(2, int(height) // 2 * 2))
+        now = time.monotonic()
+        if size != self._pending:
+            self._pending = size
+            self._pending_since = now
+        elif size != self.size and now - self._pending_since >= self.settle_seconds:
+            self.size = size
+        return self.size
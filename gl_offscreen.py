@@ -0,0 +1,81 @@
+"""Windowless GL contexts for checking the GL code without a display.
+
+Pick the backend through PyOpenGL's own switch before anything imports OpenGL.GL:
+
+    PYOPENGL_PLATFORM=osmesa python gl_texture.py
+    PYOPENGL_PLATFORM=egl EGL_PLATFORM=surfaceless python gl_texture.py
+
+Both give a 3.3 core context on Mesa's software rasterizer, the same profile
+hello_imgui asks for.
+"""
+import ctypes
+import os
+
+
+def create_context(width=64, height=64):
+    platform = os.environ.get('PYOPENGL_PLATFORM')
+    if platform == 'osmesa':
+        return _create_osmesa_context(width, height)
+    if platform == 'egl':
+        return _create_egl_context(width, height)
+    raise RuntimeError("Set PYOPENGL_PLATFORM to 'osmesa' or 'egl' for an offscreen context")
+
+
+def _create_osmesa_context(width, height):
+    from OpenGL import GL as gl
+    from OpenGL import arrays
+    from OpenGL import osmesa
+
+    attrs = arrays.GLintArray.asArray([
+        osmesa.OSMESA_FORMAT, osmesa.OSMESA_RGBA,
+        osmesa.OSMESA_DEPTH_BITS, 0,
+        osmesa.OSMESA_PROFILE, osmesa.OSMESA_CORE_PROFILE,
+        osmesa.OSMESA_CONTEXT_MAJOR_VERSION, 3,
+        osmesa.OSMESA_CONTEXT_MINOR_VERSION, 3,
+        0,
+    ])
+    context = osmesa.OSMesaCreateContextAttribs(attrs, None)
+    if not context:
+        raise RuntimeError("OSMesaCreateContextAttribs failed")
+    buffer = arrays.GLubyteArray.zeros((height, width, 4))
+    if not osmesa.OSMesaMakeCurrent(context, buffer, gl.GL_UNSIGNED_BYTE, width, height):
+        raise RuntimeError("OSMesaMakeCurrent failed")
+    # Keep the color buffer alive alongside the context
+    return context, buffer
+
+
+def _create_egl_context(width, height):
+    from OpenGL import EGL
+
+    display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    major, minor = EGL.EGLint(), EGL.EGLint()
+    if not EGL.eglInitialize(display, ctypes.pointer(major), ctypes.pointer(minor)):
+        raise RuntimeError("eglInitialize failed")
+
+    config_attrs = [
+        EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+        EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+        EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8,
+        EGL.EGL_NONE,
+    ]
+    config = EGL.EGLConfig()
+    count = EGL.EGLint()
+    if not EGL.eglChooseConfig(display, (EGL.EGLint * len(config_attrs))(*config_attrs),
+                               ctypes.pointer(config), 1, ctypes.pointer(count)) or not count.value:
+        raise RuntimeError("eglChooseConfig found no pbuffer config")
+
+    surface_attrs = [EGL.EGL_WIDTH, width, EGL.EGL_HEIGHT, height, EGL.EGL_NONE]
+    surface = EGL.eglCreatePbufferSurface(display, config,
+                                          (EGL.EGLint * len(surface_attrs))(*surface_attrs))
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context_attrs = [
+        EGL.EGL_CONTEXT_MAJOR_VERSION, 3,
+        EGL.EGL_CONTEXT_MINOR_VERSION, 3,
+        EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT,
+        EGL.EGL_NONE,
+    ]
+    context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT,
+                                   (EGL.EGLint * len(context_attrs))(*context_attrs))
+    if not EGL.eglMakeCurrent(display, surface, surface, context):
+        raise RuntimeError("eglMakeCurrent failed")
+    return display, surface, context
@@ -0,0 +1,138 @@
+import ctypes
+import time
+import numpy as np
+import OpenGL.GL as gl
+
+
+# Internal and upload formats for 1-channel (planes) and 3-channel (RGB) textures
+_FORMATS = {
+    1: (gl.GL_R8, gl.GL_RED),
+    3: (gl.GL_RGB8, gl.GL_RGB),
+}
+
+
+class StreamingTexture:
+    """RGB (or single-plane) texture for video frames, allocated once and refreshed
+    through two PBOs.
+
+    Storage is only (re)allocated when the frame size changes. Each upload() copies the
+    frame into the next of two pixel buffer objects and issues glTexSubImage2D from it;
+    the driver moves that buffer to the GPU asynchronously while the following frame is
+    being decoded, and the next upload writes the other PBO so it never waits on the
+    transfer still in flight.
+    """
+
+    def __init__(self, channels=3):
+        self.channels = channels
+        self.internal_format, self.format = _FORMATS[channels]
+        self.texture_id = gl.glGenTextures(1)
+        self.pbos = gl.glGenBuffers(2)
+        self.width = 0
+        self.height = 0
+        self.pbo_size = 0
+        self.next_pbo = 0
+        # Time spent in upload(), i.e. what the render thread pays per frame
+        self.last_upload_ms = 0.0
+        self.avg_upload_ms = 0.0
+
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_id)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)
+
+    def _allocate(self, width, height):
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_id)
+        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, self.internal_format, width, height,
+                        0, self.format, gl.GL_UNSIGNED_BYTE, None)
+        self.width = width
+        self.height = height
+
+    def _allocate_pbos(self, size):
+        for pbo in self.pbos:
+            gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, pbo)
+            gl.glBufferData(gl.GL_PIXEL_UNPACK_BUFFER, size, None, gl.GL_STREAM_DRAW)
+        gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, 0)
+        self.pbo_size = size
+
+    def upload(self, frame, width=None):
+        """Upload an (H, W, channels) uint8 frame.
+        
+        For a plane padded to its line size, pass the (H, line_size) buffer and the real
+        width; the padding is skipped by GL_UNPACK_ROW_LENGTH rather than copied out.
+        """
+        start = time.perf_counter()
+        height = frame.shape[0]
+        row_length = frame.shape[1]
+        if width is None:
+            width = row_length
+        if (width, height) != (self.width, self.height):
+            self._allocate(width, height)
+        frame = np.ascontiguousarray(frame)
+        size = frame.nbytes
+        if size != self.pbo_size:
+            self._allocate_pbos(size)
+
+        pbo = self.pbos[self.next_pbo]
+        self.next_pbo ^= 1
+        gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, pbo)
+        # Invalidating lets the driver hand back fresh memory if the GPU still reads the old
+        ptr = gl.glMapBufferRange(gl.GL_PIXEL_UNPACK_BUFFER, 0, size,
+                                  gl.GL_MAP_WRITE_BIT | gl.GL_MAP_INVALIDATE_BUFFER_BIT)
+        if ptr:
+            ctypes.memmove(ptr, frame.ctypes.data, size)
+            gl.glUnmapBuffer(gl.GL_PIXEL_UNPACK_BUFFER)
+            pixels = ctypes.c_void_p(0)
+        else:
+            # Mapping failed, fall back to a plain client-memory upload
+            gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, 0)
+            pixels = frame
+
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_id)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+        gl.glPixelStorei(gl.GL_UNPACK_ROW_LENGTH, row_length if row_length != width else 0)
+        gl.glTexSubImage2D(gl.GL_TEXTURE_2D, 0, 0, 0, width, height,
+                           self.format, gl.GL_UNSIGNED_BYTE, pixels)
+        gl.glPixelStorei(gl.GL_UNPACK_ROW_LENGTH, 0)
+        gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, 0)
+
+        self.last_upload_ms = (time.perf_counter() - start) * 1000
+        self.avg_upload_ms += (self.last_upload_ms - self.avg_upload_ms) * 0.05
+
+    def delete(self):
+        gl.glDeleteBuffers(2, self.pbos)
+        gl.glDeleteTextures([self.texture_id])
+
+
+def main():
+    """Upload frames under an offscreen context, check them and report the cost"""
+    import sys
+    from gl_offscreen import create_context
+
+    width, height = (int(x) for x in (sys.argv[1:3] if len(sys.argv) >= 3 else (3840, 2160)))
+    create_context()
+    print(f"{gl.glGetString(gl.GL_RENDERER).decode()} / {gl.glGetString(gl.GL_VERSION).decode()}")
+
+    texture = StreamingTexture()
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(3)]
+    times = []
+    for i in range(30):
+        texture.upload(frames[i % len(frames)])
+        times.append(texture.last_upload_ms)
+
+    gl.glFinish()
+    gl.glBindTexture(gl.GL_TEXTURE_2D, texture.texture_id)
+    gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+    readback = gl.glGetTexImage(gl.GL_TEXTURE_2D, 0, gl.GL_RGB, gl.GL_UNSIGNED_BYTE)
+    readback = np.frombuffer(readback, dtype=np.uint8).reshape(height, width, 3)
+    ok = np.array_equal(readback, frames[29 % len(frames)])
+    texture.delete()
+
+    print(f"{width}x{height}: upload {np.median(times):.2f} ms median, {max(times):.2f} ms max, "
+          f"readback {'matches' if ok else 'DOES NOT MATCH'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
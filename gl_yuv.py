@@ -0,0 +1,205 @@
+import time
+import numpy as np
+import OpenGL.GL as gl
+from OpenGL.GL import shaders
+from gl_texture import StreamingTexture
+
+_VERTEX_SHADER = """
+#version 330 core
+out vec2 uv;
+void main() {
+    // One triangle covering the viewport, no vertex buffer needed
+    vec2 p = vec2((gl_VertexID << 1) & 2, gl_VertexID & 2);
+    uv = p;
+    gl_Position = vec4(p * 2.0 - 1.0, 0.0, 1.0);
+}
+"""
+
+_FRAGMENT_SHADER = """
+#version 330 core
+in vec2 uv;
+out vec4 color;
+uniform sampler2D y_plane;
+uniform sampler2D u_plane;
+uniform sampler2D v_plane;
+uniform mat3 yuv_to_rgb;
+uniform vec3 yuv_offset;
+void main() {
+    vec3 yuv = vec3(texture(y_plane, uv).r, texture(u_plane, uv).r, texture(v_plane, uv).r);
+    color = vec4(clamp(yuv_to_rgb * (yuv - yuv_offset), 0.0, 1.0), 1.0);
+}
+"""
+
+# Luma coefficients (Kr, Kb) per matrix
+_KR_KB = {
+    'bt601': (0.299, 0.114),
+    'bt709': (0.2126, 0.0722),
+    'bt2020': (0.2627, 0.0593),
+}
+
+
+def yuv_to_rgb_matrix(matrix, full_range):
+    """(3x3 matrix, offset) so that rgb = M @ (yuv - offset), all in normalized 0-1 units"""
+    kr, kb = _KR_KB[matrix]
+    kg = 1.0 - kr - kb
+    m = np.array([
+        [1.0, 0.0, 2.0 * (1.0 - kr)],
+        [1.0, -2.0 * kb * (1.0 - kb) / kg, -2.0 * kr * (1.0 - kr) / kg],
+        [1.0, 2.0 * (1.0 - kb), 0.0],
+    ])
+    if full_range:
+        scale = np.diag([1.0, 1.0, 1.0])
+        offset = np.array([0.0, 128.0, 128.0]) / 255.0
+    else:
+        # Limited range: luma 16-235, chroma 16-240
+        scale = np.diag([255.0 / 219.0, 255.0 / 224.0, 255.0 / 224.0])
+        offset = np.array([16.0, 128.0, 128.0]) / 255.0
+    return (m @ scale).astype(np.float32), offset.astype(np.float32)
+
+
+class YUVTexture:
+    """Displays PlanarFrames: the three planes are uploaded as R8 textures and a fragment
+    shader converts them into an RGB texture that imgui draws like any other.
+
+    Uploads go through StreamingTexture, so each plane keeps its storage and PBOs.
+    texture_id is the RGB result and stays the same for the life of the object.
+    """
+
+    def __init__(self):
+        self.planes = [StreamingTexture(channels=1) for _ in range(3)]
+        self.texture_id = gl.glGenTextures(1)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_id)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)
+        self.framebuffer = gl.glGenFramebuffers(1)
+        self.vertex_array = gl.glGenVertexArrays(1)
+        self.program = shaders.compileProgram(
+            shaders.compileShader(_VERTEX_SHADER, gl.GL_VERTEX_SHADER),
+            shaders.compileShader(_FRAGMENT_SHADER, gl.GL_FRAGMENT_SHADER),
+            validate=False,
+        )
+        self.uniforms = {name: gl.glGetUniformLocation(self.program, name)
+                         for name in ('y_plane', 'u_plane', 'v_plane', 'yuv_to_rgb', 'yuv_offset')}
+        self.width = 0
+        self.height = 0
+        self.colors = None
+        self.last_upload_ms = 0.0
+        self.avg_upload_ms = 0.0
+
+    def _allocate(self, width, height):
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_id)
+        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGB8, width, height,
+                        0, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, None)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.framebuffer)
+        gl.glFramebufferTexture2D(gl.GL_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT0,
+                                  gl.GL_TEXTURE_2D, self.texture_id, 0)
+        status = gl.glCheckFramebufferStatus(gl.GL_FRAMEBUFFER)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+        if status != gl.GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError(f"YUV framebuffer incomplete: {status:#x}")
+        self.width = width
+        self.height = height
+
+    def upload(self, frame):
+        start = time.perf_counter()
+        if (frame.width, frame.height) != (self.width, self.height):
+            self._allocate(frame.width, frame.height)
+        for texture, plane, width in zip(self.planes, frame.planes, frame.widths):
+            texture.upload(plane, width)
+        self._convert(frame)
+        self.last_upload_ms = (time.perf_counter() - start) * 1000
+        self.avg_upload_ms += (self.last_upload_ms - self.avg_upload_ms) * 0.05
+
+    def _convert(self, frame):
+        # This runs in the middle of an imgui frame, so put back what we touch
+        previous_framebuffer = gl.glGetIntegerv(gl.GL_FRAMEBUFFER_BINDING)
+        previous_viewport = gl.glGetIntegerv(gl.GL_VIEWPORT)
+        previous_program = gl.glGetIntegerv(gl.GL_CURRENT_PROGRAM)
+        previous_vertex_array = gl.glGetIntegerv(gl.GL_VERTEX_ARRAY_BINDING)
+        previous_texture_unit = gl.glGetIntegerv(gl.GL_ACTIVE_TEXTURE)
+        enabled = {cap: gl.glIsEnabled(cap) for cap in
+                   (gl.GL_BLEND, gl.GL_SCISSOR_TEST, gl.GL_DEPTH_TEST, gl.GL_CULL_FACE)}
+        try:
+            gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.framebuffer)
+            gl.glViewport(0, 0, self.width, self.height)
+            for cap in enabled:
+                gl.glDisable(cap)
+            gl.glUseProgram(self.program)
+            if self.colors != (frame.matrix, frame.full_range):
+                matrix, offset = yuv_to_rgb_matrix(frame.matrix, frame.full_range)
+                gl.glUniformMatrix3fv(self.uniforms['yuv_to_rgb'], 1, gl.GL_TRUE, matrix)
+                gl.glUniform3fv(self.uniforms['yuv_offset'], 1, offset)
+                self.colors = (frame.matrix, frame.full_range)
+            for unit, (name, texture) in enumerate(zip(('y_plane', 'u_plane', 'v_plane'), self.planes)):
+                gl.glActiveTexture(gl.GL_TEXTURE0 + unit)
+                gl.glBindTexture(gl.GL_TEXTURE_2D, texture.texture_id)
+                gl.glUniform1i(self.uniforms[name], unit)
+            gl.glBindVertexArray(self.vertex_array)
+            gl.glDrawArrays(gl.GL_TRIANGLES, 0, 3)
+        finally:
+            gl.glBindVertexArray(previous_vertex_array)
+            gl.glUseProgram(previous_program)
+            gl.glActiveTexture(previous_texture_unit)
+            gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, previous_framebuffer)
+            gl.glViewport(*previous_viewport)
+            for cap, was_enabled in enabled.items():
+                if was_enabled:
+                    gl.glEnable(cap)
+
+    def delete(self):
+        for texture in self.planes:
+            texture.delete()
+        gl.glDeleteFramebuffers(1, [self.framebuffer])
+        gl.glDeleteVertexArrays(1, [self.vertex_array])
+        gl.glDeleteProgram(self.program)
+        gl.glDeleteTextures([self.texture_id])
+
+
+def main():
+    """Convert test frames under an offscreen context and compare them with the source"""
+    import sys
+    import av
+    from gl_offscreen import create_context
+    from planar_frame import PlanarFrame
+
+    create_context()
+    print(f"{gl.glGetString(gl.GL_RENDERER).decode()} / {gl.glGetString(gl.GL_VERSION).decode()}")
+
+    width, height = 1280, 720
+    # Smooth gradients, so chroma subsampling doesn't dominate the error
+    x = np.linspace(0, 1, width)[None, :]
+    y = np.linspace(0, 1, height)[:, None]
+    rgb = np.stack([x + 0 * y, y + 0 * x, (1 - x) * y], axis=-1)
+    rgb = (rgb * 255).round().astype(np.uint8)
+
+    texture = YUVTexture()
+    failures = 0
+    for colorspace, matrix in ((5, 'bt601'), (1, 'bt709')):
+        for color_range in (1, 2):
+            yuv = av.VideoFrame.from_ndarray(rgb, format='rgb24').reformat(
+                format='yuv420p', dst_colorspace=colorspace, dst_color_range=color_range)
+            yuv.colorspace = colorspace
+            yuv.color_range = color_range
+
+            frame = PlanarFrame.from_av(yuv)
+            texture.upload(frame)
+            gl.glFinish()
+            gl.glBindTexture(gl.GL_TEXTURE_2D, texture.texture_id)
+            gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+            readback = gl.glGetTexImage(gl.GL_TEXTURE_2D, 0, gl.GL_RGB, gl.GL_UNSIGNED_BYTE)
+            readback = np.frombuffer(readback, dtype=np.uint8).reshape(height, width, 3)
+
+            error = np.abs(readback.astype(np.int16) - rgb.astype(np.int16))
+            ok = frame.matrix == matrix and error.mean() < 1.0 and np.percentile(error, 99) <= 4
+            failures += not ok
+            print(f"{matrix} {'full' if color_range == 2 else 'limited'}: mean error "
+                  f"{error.mean():.2f}, p99 {np.percentile(error, 99):.0f}, "
+                  f"upload+convert {texture.last_upload_ms:.2f} ms {'ok' if ok else 'FAIL'}")
+    texture.delete()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from decoder_options import open_video
+from decoding import decode_from
+
+# Full resolution GOPs kept: the one being stepped through and the one prefetched next to it
+FULL_RES_GOPS = 2
+
+
+class GopCache:
+    """Whole GOPs decoded once each on a background thread, for stepping a frame at a
+    time and playing backwards.
+
+    A GOP here is the frames from one keyframe up to the next in presentation order,
+    which is the stretch that decoding any one of them has to go through anyway. get()
+    never blocks: it returns the frame if its GOP is in, and otherwise asks for that GOP
+    ahead of any prefetch. prefetch() queues a GOP to decode when nothing is wanted,
+    so reverse playback can decode the GOP before the one it is showing in the
+    meantime. It has its own container, so it never waits on the player's decode
+    thread or the seek worker.
+
+    convert(frame, full_res) turns decoded frames into whatever gets shown. GOPs
+    converted at full resolution serve any request, the others only requests that
+    don't need full resolution. Only the FULL_RES_GOPS full resolution GOPs used most
+    recently are kept, so a step prefetching the next GOP doesn't push out the one
+    being stepped through. GOPs used longest ago are dropped to stay within max_bytes,
+    though never the latest one, so one long GOP can go over.
+    """
+
+    def __init__(self, video_path, index, convert, max_bytes=256 * 1024 * 1024, decoder_options=None,
+                 stats=None):
+        self.index = index
+        self.convert = convert
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.stats = stats
+        self._wanted = None
+        self._prefetch = None
+        self._decoding = None
+        # First frame number: (full_res, {frame number: frame}, bytes), oldest used first
+        self._gops = OrderedDict()
+        self._cond = threading.Condition()
+        self._running = True
+        self.container = open_video(video_path, decoder_options)
+        self.stream = self.container.streams.video[0]
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def gop_of(self, frame_number):
+        """(first, end) frame numbers of the GOP frame_number is in"""
+        key_frames = self.index.key_frames
+        first = self.index.keyframe_for(frame_number)
+        i = int(np.searchsorted(key_frames, first, side='right'))
+        return first, int(key_frames[i]) if i < len(key_frames) else len(self.index)
+
+    def _cached(self, first, full_res):
+        gop = self._gops.get(first)
+        if gop is None or (full_res and not gop[0]):
+            return None
+        return gop[1]
+
+    def get(self, frame_number, full_res=True):
+        """The converted frame, or None while its GOP is still being decoded"""
+        first, _ = self.gop_of(frame_number)
+        with self._cond:
+            frames = self._cached(first, full_res)
+            if frames is None:
+                if (first, full_res) not in (self._wanted, self._decoding):
+                    self._wanted = (first, full_res)
+                    self._cond.notify_all()
+                return None
+            self._gops.move_to_end(first)
+        frame = frames.get(frame_number)
+        if frame is None and frames:
+            # Damaged streams can leave a hole, show the frame before it instead
+            earlier = [n for n in frames if n <= frame_number]
+            frame = frames[max(earlier) if earlier else min(frames)]
+        return frame
+
+    def prefetch(self, frame_number, full_res=True):
+        """Decode frame_number's GOP when the thread has nothing wanted to do"""
+        first, _ = self.gop_of(frame_number)
+        with self._cond:
+            if self._cached(first, full_res) is None and self._decoding != (first, full_res):
+                self._prefetch = (first, full_res)
+                self._cond.notify_all()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self.thread.join(timeout=1.0)
+        if not self.thread.is_alive():
+            self.container.close()
+
+    def _decode(self, first, end, full_res, should_cancel):
+        """{frame number: converted frame} for every frame in [first, end), or None if
+        cancelled. Open-GOP leading frames of the next GOP come out after its keyframe,
+        so decoding goes on until every frame in the range has turned up."""
+        frames = {}
+        # Past this the rest of the range can't turn up any more
+        limit = self.gop_of(end)[1] if end < len(self.index) else len(self.index)
+        for frame in decode_from(self.container, self.stream, self.index, first):
+            if should_cancel():
+                return None
+            n = int(np.searchsorted(self.index.pts, frame.pts, side='left'))
+            if first <= n < end and n not in frames:
+                frames[n] = self.convert(frame, full_res)
+                if len(frames) == end - first:
+                    break
+            elif n >= limit:
+                break
+        return frames
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._wanted or self._prefetch or not self._running)
+                if not self._running:
+                    return
+                if self._wanted is not None:
+                    request, prefetching = self._wanted, False
+                    self._wanted = None
+                else:
+                    request, prefetching = self._prefetch, True
+                    self._prefetch = None
+                self._decoding = request
+                if self._cached(*request) is not None:
+                    self._decoding = None
+                    continue
+
+            first, full_res = request
+            # A prefetch gives way as soon as some other GOP is wanted
+            should_cancel = lambda: not self._running or (
+                prefetching and self._wanted is not None and self._wanted != request)
+            start = time.perf_counter()
+            try:
+                frames = self._decode(first, self.gop_of(first)[1], full_res, should_cancel)
+            except Exception as e:
+                print(f"GOP decode error: {e}")
+                frames = {}
+            if frames is not None and self.stats is not None:
+                self.stats.record('gop_decode', start)
+
+            with self._cond:
+                self._decoding = None
+                if frames is None:
+                    # Cancelled, try again once the wanted GOP is in
+                    if self._prefetch is None:
+                        self._prefetch = request
+                    continue
+                self._store(first, full_res, frames)
+
+    def _store(self, first, full_res, frames):
+        """Add a decoded GOP and drop others to make room. Called with _cond held."""
+        if first in self._gops:
+            self.nbytes -= self._gops.pop(first)[2]
+        if full_res:
+            # Oldest used first, so the most recently used stay
+            full = [n for n, gop in self._gops.items() if gop[0]]
+            for other in full[:max(0, len(full) - FULL_RES_GOPS + 1)]:
+                self.nbytes -= self._gops.pop(other)[2]
+        nbytes = sum(frame.nbytes for frame in frames.values())
+        self._gops[first] = (full_res, frames, nbytes)
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes and len(self._gops) > 1:
+            self.nbytes -= self._gops.popitem(last=False)[1][2]
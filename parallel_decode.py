@@ -0,0 +1,164 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+import numpy as np
+from decoder_options import DecoderOptions, open_video
+from decoding import decode_from, rgb_into
+from video_index import VideoIndex
+
+
+def split_segments(index, first, last, count):
+    """About count [start, end) frame ranges covering [first, last), each starting on a
+    keyframe except the first"""
+    bounds = [first]
+    keys = index.key_frames[(index.key_frames > first) & (index.key_frames < last)]
+    for j in range(1, count):
+        wanted = first + (last - first) * j // count
+        i = int(np.searchsorted(keys, wanted, side='left'))
+        if i < len(keys) and keys[i] > bounds[-1]:
+            bounds.append(int(keys[i]))
+    bounds.append(last)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _decode_segment(video_path, shm_name, shape, base, start, end, thread_type, interpolation):
+    """Worker: decode frames [start, end) into their rows of the shared output.
+
+    Frames are placed by their PTS row in the index, not by decode order. Open-GOP
+    leading frames that come after the next segment's keyframe in decode order still
+    belong here, so decoding runs on until every frame of the segment has turned up.
+    Returns how many distinct frames were written.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name, track=False)
+    frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    container = None
+    try:
+        index = VideoIndex.open(video_path)
+        container = open_video(video_path, DecoderOptions(thread_type))
+        stream = container.streams.video[0]
+        written = set()
+        for frame in decode_from(container, stream, index, start):
+            n = int(np.searchsorted(index.pts, frame.pts, side='left'))
+            if start <= n < end and n not in written:
+                rgb_into(frame, frames[n - base], interpolation)
+                written.add(n)
+                if len(written) == end - start:
+                    break
+        return len(written)
+    finally:
+        if container is not None:
+            container.close()
+        del frames
+        shm.close()
+
+
+class ParallelDecoder:
+    """Decodes one file in a process pool, split into GOP-aligned segments, into a single
+    (N, H, W, 3) uint8 array in shared memory.
+
+    Each segment starts on a keyframe, so workers decode independently of each other.
+    Every frame lands in its row in presentation order, whichever worker decoded it,
+    and run() checks that each segment produced all of its frames exactly once. Each
+    worker decodes single-threaded; the parallelism comes from the processes.
+    `shm_name` lets other processes attach to the result while this object is open.
+
+        with ParallelDecoder('clip.mp4', workers=8, size=(224, 224)) as decoder:
+            frames = decoder.run()
+    """
+
+    def __init__(self, video_path, workers=None, size=None, start=0.0, end=None,
+                 segments_per_worker=4, thread_type='NONE', interpolation=None):
+        self.video_path = video_path
+        self.workers = workers or os.cpu_count() or 1
+        self.thread_type = thread_type
+        self.interpolation = interpolation
+        # Built and saved here so the workers only ever load it
+        self.index = VideoIndex.open(video_path)
+        container = open_video(video_path)
+        stream = container.streams.video[0]
+        self.width, self.height = size or (stream.width, stream.height)
+        container.close()
+
+        tb = self.index.time_base
+        self.first = int(np.searchsorted(self.index.pts, int(np.ceil(start / tb)), side='left'))
+        end = self.index.duration if end is None else min(end, self.index.duration)
+        self.last = int(np.searchsorted(self.index.pts, int(np.ceil(end / tb)), side='left'))
+        self.segments = split_segments(self.index, self.first, self.last,
+                                       self.workers * segments_per_worker)
+        self.times = self.index.pts[self.first:self.last] * float(tb)
+
+        self.shape = (self.last - self.first, self.height, self.width, 3)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(self.shape))))
+        self.shm_name = self.shm.name
+        self.frames = np.ndarray(self.shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    def run(self):
+        """Decode everything and return the frames array"""
+        # spawn, so workers don't inherit the parent's decoder threads or GL state
+        with ProcessPoolExecutor(self.workers, mp_context=get_context('spawn')) as pool:
+            futures = [(start, end, pool.submit(_decode_segment, self.video_path, self.shm_name,
+                                                self.shape, self.first, start, end,
+                                                self.thread_type, self.interpolation))
+                       for start, end in self.segments]
+            for start, end, future in futures:
+                written = future.result()
+                if written != end - start:
+                    raise RuntimeError(f"Segment {start}-{end} decoded {written} of "
+                                       f"{end - start} frames")
+        return self.frames
+
+    def close(self):
+        del self.frames
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    """Decode a file in parallel, time it against one process and check they match:
+
+        python parallel_decode.py video.mp4 [--workers 8] [--size 224x224]
+    """
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('video')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--size', default=None)
+    args = parser.parse_args()
+    size = tuple(int(v) for v in args.size.split('x')) if args.size else None
+
+    with ParallelDecoder(args.video, workers=args.workers, size=size) as decoder:
+        start = time.perf_counter()
+        frames = decoder.run()
+        parallel_seconds = time.perf_counter() - start
+
+        # Reference: one process, one decode loop, same conversion
+        container = open_video(args.video, DecoderOptions('NONE'))
+        reference = np.empty_like(frames[0])
+        mismatches = 0
+        count = 0
+        start = time.perf_counter()
+        for frame in container.decode(container.streams.video[0]):
+            rgb_into(frame, reference)
+            if count >= len(frames) or not np.array_equal(reference, frames[count]):
+                mismatches += 1
+            count += 1
+        single_seconds = time.perf_counter() - start
+        container.close()
+        mismatches += abs(count - len(frames))
+
+        print(f"{len(frames)} frames, {len(decoder.segments)} segments on {decoder.workers} workers")
+        print(f"parallel {len(frames) / parallel_seconds:.1f} fps, single process "
+              f"{count / single_seconds:.1f} fps, speedup {single_seconds / parallel_seconds:.2f}x")
+        print("frame exact" if mismatches == 0 else f"{mismatches} frames differ")
+
+
+if __name__ == "__main__":
+    main()
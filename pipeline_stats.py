@@ -0,0 +1,196 @@
+"""Per-stage timing for the playback pipeline, cheap enough to leave on all the time.
+
+Each stage keeps a histogram with fixed log-spaced buckets from 10 us to about 5 s,
+allocated up front, so recording a sample is a bisect and a few integer adds. With
+tracing on, samples also go into a fixed-size ring of events that dump_trace() writes
+out as Chrome trace JSON, for chrome://tracing or ui.perfetto.dev.
+
+    start = time.perf_counter()
+    frames = packet.decode()
+    stats.record('decode', start)
+"""
+import bisect
+import itertools
+import json
+import os
+import threading
+import time
+
+# Upper bounds of the histogram buckets in seconds, four to each doubling from 10 us.
+# One more bucket past the last bound catches anything slower.
+BUCKET_BOUNDS = tuple(1e-5 * 2 ** (i / 4) for i in range(77))
+
+# Shown in this order; stages recorded under other names are added as they turn up
+STAGES = ('demux', 'decode', 'convert', 'publish', 'upload', 'present_lag', 'render',
+          'seek', 'audio_decode', 'audio_callback')
+
+# Trace events: a stage's span, a counter value (kept in dur) or an instant
+_SPAN = 0
+_COUNTER = 1
+_INSTANT = 2
+
+
+class StageHistogram:
+    """Durations recorded for one stage"""
+
+    __slots__ = ('counts', 'count', 'total', 'max', 'last')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        """Upper bound of the bucket the p-th percentile falls in, which overstates it by
+        at most a fifth; never more than the slowest sample"""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                break
+        return min(BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else self.max, self.max)
+
+
+class PipelineStats:
+    """Histograms per stage, error counts, and optionally a trace of the last
+    trace_events samples. Any thread can record; a sample lost to a race between two
+    threads recording the same stage at once only skews the statistics by one.
+    """
+
+    def __init__(self, trace_events=0):
+        self.stages = {name: StageHistogram() for name in STAGES}
+        self.errors = {}
+        self.last_error = None
+        self.started = time.perf_counter()
+
+        self._names = list(STAGES)
+        self._name_ids = {name: i for i, name in enumerate(self._names)}
+        self._threads = {}
+        # One preallocated slot per event, reused once the ring wraps
+        self._trace = [None] * trace_events if trace_events else None
+        self._trace_seq = itertools.count()
+        self._trace_written = 0
+
+    @property
+    def tracing(self):
+        return self._trace is not None
+
+    def _histogram(self, stage):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages.setdefault(stage, StageHistogram())
+        return histogram
+
+    def record(self, stage, start, end=None):
+        """Record that stage ran from start until end (or now), both perf_counter() times"""
+        if end is None:
+            end = time.perf_counter()
+        self._histogram(stage).add(end - start)
+        if self._trace is not None:
+            self._add_event(_SPAN, stage, start, end - start)
+
+    def add(self, stage, seconds):
+        """Record a duration that isn't a span of this process's time, such as how late
+        a frame was shown; it goes in the histogram but not the trace"""
+        self._histogram(stage).add(seconds)
+
+    def counter(self, name, value):
+        """Trace a sampled value such as a queue depth; only kept while tracing"""
+        if self._trace is not None:
+            self._add_event(_COUNTER, name, time.perf_counter(), value)
+
+    def mark(self, name):
+        """Trace a one-off event such as a dropped frame; only kept while tracing"""
+        if self._trace is not None:
+            self._add_event(_INSTANT, name, time.perf_counter(), 0.0)
+
+    def error(self, where, e):
+        """Print an error the way the player always has, and count it for the overlay"""
+        message = f"{where} error: {e}"
+        print(message)
+        self.errors[where] = self.errors.get(where, 0) + 1
+        self.last_error = message
+        self.mark(f"{where} error")
+
+    def _add_event(self, kind, name, start, dur):
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            # Only the first time a name turns up
+            self._names.append(name)
+            name_id = self._name_ids.setdefault(name, len(self._names) - 1)
+        thread = self._threads.get(threading.get_ident())
+        if thread is None:
+            thread = self._threads.setdefault(threading.get_ident(),
+                                              (len(self._threads), threading.current_thread().name))
+        seq = next(self._trace_seq)
+        self._trace[seq % len(self._trace)] = (kind, name_id, thread[0], start, dur)
+        self._trace_written = seq + 1
+
+    def reset(self):
+        for histogram in self.stages.values():
+            histogram.reset()
+        self.errors.clear()
+        self.last_error = None
+
+    def summary(self):
+        """{stage: {count, mean_ms, p50_ms, p99_ms, max_ms}} for the stages that ran"""
+        return {name: {'count': h.count,
+                       'mean_ms': round(h.mean() * 1000, 3),
+                       'p50_ms': round(h.percentile(50) * 1000, 3),
+                       'p99_ms': round(h.percentile(99) * 1000, 3),
+                       'max_ms': round(h.max * 1000, 3)}
+                for name, h in self.stages.items() if h.count}
+
+    def dump_trace(self, path):
+        """Write the traced events, oldest first, as Chrome trace JSON. Returns how many."""
+        if self._trace is None:
+            raise ValueError("Tracing is off, create PipelineStats with trace_events")
+        written = self._trace_written
+        size = len(self._trace)
+        if written <= size:
+            events = self._trace[:written]
+        else:
+            events = self._trace[written % size:] + self._trace[:written % size]
+        events = sorted((event for event in events if event is not None), key=lambda event: event[3])
+
+        pid = os.getpid()
+        trace = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                 for tid, name in list(self._threads.values())]
+        for kind, name_id, tid, start, dur in events:
+            event = {'name': self._names[name_id], 'pid': pid, 'tid': tid,
+                     'ts': round((start - self.started) * 1e6, 1)}
+            if kind == _SPAN:
+                event.update(ph='X', dur=round(dur * 1e6, 1), cat='stage')
+            elif kind == _COUNTER:
+                event.update(ph='C', args={'value': dur})
+            else:
+                event.update(ph='i', s='t')
+            trace.append(event)
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms',
+                       'otherData': {'stages': self.summary()}}, f)
+        os.replace(tmp_path, path)
+        return len(events)
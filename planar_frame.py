@@ -0,0 +1,65 @@
+import numpy as np
+
+# AVColorSpace values that mean BT.709 / BT.2020; everything else that is specified
+# (BT470BG, SMPTE170M, FCC, ...) uses the BT.601 coefficients
+_COLORSPACE_BT709 = 1
+_COLORSPACE_UNSPECIFIED = 2
+_COLORSPACE_BT2020 = (9, 10)
+# AVColorRange
+_RANGE_JPEG = 2
+
+
+class PlanarFrame:
+    """The Y, U and V planes of a decoded yuv420p frame, for shader-side conversion.
+
+    Planes are views straight onto the decoder's buffers, padding included, so nothing
+    is copied; `widths` gives the visible width of each. `matrix` is 'bt601', 'bt709'
+    or 'bt2020' and `full_range` says whether the samples use 0-255 rather than 16-235.
+    Half the size of the equivalent rgb24 ndarray.
+    """
+
+    __slots__ = ('planes', 'widths', 'width', 'height', 'matrix', 'full_range', 'nbytes')
+
+    def __init__(self, planes, widths, width, height, matrix, full_range):
+        self.planes = planes
+        self.widths = widths
+        self.width = width
+        self.height = height
+        self.matrix = matrix
+        self.full_range = full_range
+        self.nbytes = sum(p.nbytes for p in planes)
+
+    @property
+    def shape(self):
+        return (self.height, self.width, 3)
+
+    @classmethod
+    def from_av(cls, frame, width=None, height=None):
+        """Planes of frame, scaled to width x height on the way if given"""
+        full_range = frame.color_range == _RANGE_JPEG or frame.format.name == 'yuvj420p'
+        colorspace = frame.colorspace
+        if colorspace == _COLORSPACE_BT709:
+            matrix = 'bt709'
+        elif colorspace in _COLORSPACE_BT2020:
+            matrix = 'bt2020'
+        elif colorspace == _COLORSPACE_UNSPECIFIED or colorspace == 0:
+            # Same guess FFmpeg's players make for untagged video
+            matrix = 'bt709' if frame.height >= 720 else 'bt601'
+        else:
+            matrix = 'bt601'
+
+        # Range and colorspace carry through swscale so the tags above still hold, as
+        # long as yuvj formats (MJPEG's 4:2:2 too) aren't turned into limited range yuv420p
+        format = 'yuvj420p' if frame.format.name.startswith('yuvj') else 'yuv420p'
+        if width is not None and (width, height) != (frame.width, frame.height):
+            frame = frame.reformat(width=width, height=height, format=format)
+        elif frame.format.name != format:
+            frame = frame.reformat(format=format)
+
+        planes = []
+        widths = []
+        for plane in frame.planes:
+            planes.append(np.frombuffer(plane, dtype=np.uint8, count=plane.line_size * plane.height)
+                          .reshape(plane.height, plane.line_size))
+            widths.append(plane.width)
+        return cls(planes, widths, frame.width, frame.height, matrix, full_range)
@@ -0,0 +1,210 @@
+import os
+import threading
+from imgui_bundle import imgui
+from audio_output import AudioOutput
+from audio_ring import AudioRingBuffer, decode_audio_into
+from decoder_options import open_video
+from planar_frame import PlanarFrame
+from video_index import VideoIndex
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.m4v', '.mkv', '.webm', '.avi', '.ts')
+
+
+def playlist_paths(args):
+    """Video files named in args, with directories expanded to the videos in them, sorted"""
+    paths = []
+    for arg in args:
+        if os.path.isdir(arg):
+            paths += sorted(os.path.join(arg, name) for name in os.listdir(arg)
+                            if name.lower().endswith(VIDEO_EXTENSIONS) and not name.startswith('.'))
+        else:
+            paths.append(arg)
+    return paths
+
+
+class PreparedClip:
+    """A clip opened ahead of time, handed to VideoPlayer(prepared=...) to skip the
+    work of opening it.
+
+    Holds the open container, positioned just after the pre-rolled frames: the first
+    preroll_frames frames converted for display as (pts, frame), the raw first frame
+    (for its display matrix), the index if one was cached, and an audio ring already
+    holding the first audio_seconds of sound, which runs up to audio_preroll_end.
+    """
+
+    def __init__(self, video_path):
+        self.video_path = video_path
+        self.container = None
+        self.first_frame = None
+        self.frames = []
+        self.index = None
+        self.audio_ring = None
+        self.audio_preroll_end = None
+
+    def close(self):
+        """Close what wasn't handed on to a player"""
+        if self.container is not None:
+            self.container.close()
+            self.container = None
+
+
+def prepare_clip(video_path, decoder_options=None, yuv_display=True, preroll_frames=8,
+                 audio_seconds=0.25, audio_buffer_seconds=0.5, should_cancel=None):
+    """Open video_path and decode its first frames and audio, as VideoPlayer would on
+    startup and on play(). Meant for a background thread; returns a PreparedClip."""
+    clip = PreparedClip(video_path)
+    try:
+        clip.container = open_video(video_path, decoder_options)
+        clip.index = VideoIndex.load(video_path)
+        stream = clip.container.streams.video[0]
+        for frame in clip.container.decode(stream):
+            if frame.pts is None:
+                continue
+            if clip.first_frame is None:
+                clip.first_frame = frame
+            if yuv_display:
+                converted = PlanarFrame.from_av(frame)
+            else:
+                converted = frame.to_ndarray(format='rgb24')
+            clip.frames.append((frame.pts, converted))
+            if len(clip.frames) == preroll_frames or (should_cancel is not None and should_cancel()):
+                break
+
+        audio_streams = clip.container.streams.audio
+        if audio_streams:
+            audio = audio_streams[0]
+            channels = 2 if audio.channels >= 2 else 1
+            clip.audio_ring = AudioRingBuffer(int(audio.rate * audio_buffer_seconds), channels)
+            target = int(audio.rate * audio_seconds)
+            decode_audio_into(clip.audio_ring, video_path, 0.0, audio.rate,
+                              lambda: clip.audio_ring.available() < target and
+                              not (should_cancel is not None and should_cancel()))
+            # Samples written, not time decoded, so playback carries on from exactly here
+            clip.audio_preroll_end = clip.audio_ring.write_index / audio.rate
+    except Exception as e:
+        print(f"Error preparing {video_path}: {e}")
+        clip.close()
+    return clip
+
+
+class _Preparation:
+    """prepare_clip() running on its own thread"""
+
+    def __init__(self, video_path, prepare_options):
+        self.clip = None
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, args=(video_path, prepare_options))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self, video_path, prepare_options):
+        clip = prepare_clip(video_path, should_cancel=lambda: self.cancelled, **prepare_options)
+        with self._lock:
+            if self.cancelled:
+                clip.close()
+            else:
+                self.clip = clip
+
+    def take(self):
+        """The prepared clip, or None if it isn't ready yet. Never waits: the caller
+        is the GUI thread, and opening the clip afresh is quicker than waiting out a
+        preparation that is behind. Either way the preparation is done with after."""
+        with self._lock:
+            clip = self.clip
+            self.clip = None
+            self.cancelled = True
+        return clip
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self.clip is not None:
+                self.clip.close()
+                self.clip = None
+
+
+class Playlist:
+    """Plays clips one after another in one window, moving on by itself when a clip
+    finishes.
+
+    While one clip plays, the next max_open - 1 are opened in the background with
+    prepare_clip(), so moving on only builds the player around an open container and
+    frames that are already decoded. At most max_open clips are open at once,
+    counting the one playing. open_player(path, prepared, audio_output) makes the
+    VideoPlayer; prepared is None when the clip wasn't prepared in time. Every player
+    gets the playlist's AudioOutput, so the sound device stays open from one clip to
+    the next.
+    """
+
+    def __init__(self, paths, open_player, prepare_options=None, max_open=2):
+        if not paths:
+            raise ValueError("Playlist needs at least one clip")
+        self.paths = paths
+        self.open_player = open_player
+        self.prepare_options = prepare_options or {}
+        self.max_open = max(1, max_open)
+        self._preparing = {}
+        self.position = 0
+        self.audio_output = AudioOutput()
+        self.player = open_player(paths[0], None, self.audio_output)
+        self._prepare_ahead()
+
+    def _prepare_ahead(self):
+        wanted = range(self.position + 1, min(self.position + self.max_open, len(self.paths)))
+        for position in list(self._preparing):
+            if position not in wanted:
+                self._preparing.pop(position).cancel()
+        for position in wanted:
+            if position not in self._preparing:
+                self._preparing[position] = _Preparation(self.paths[position], self.prepare_options)
+
+    def go_to(self, position, play=None):
+        """Switch to the clip at position, playing if play (default: if playing now)"""
+        position = max(0, min(position, len(self.paths) - 1))
+        if position == self.position:
+            return
+        if play is None:
+            play = bool(self.player.shuttle_speed)
+        self.player.cleanup()
+        preparation = self._preparing.pop(position, None)
+        prepared = preparation.take() if preparation is not None else None
+        if prepared is not None and prepared.container is None:
+            prepared = None
+        self.position = position
+        self.player = self.open_player(self.paths[position], prepared, self.audio_output)
+        self._prepare_ahead()
+        if play:
+            self.player.play()
+
+    def render_gui(self):
+        player = self.player
+        if player.at_end() and self.position + 1 < len(self.paths):
+            self.go_to(self.position + 1, play=True)
+            player = self.player
+        player.render_gui()
+
+        # Where we are in the playlist, in the top right corner; Page Up/Down also move
+        viewport = imgui.get_main_viewport()
+        imgui.set_next_window_pos(imgui.ImVec2(viewport.pos.x + viewport.size.x - 8, viewport.pos.y + 8),
+                                  imgui.Cond_.always, imgui.ImVec2(1.0, 0.0))
+        imgui.set_next_window_bg_alpha(0.7)
+        flags = (imgui.WindowFlags_.no_decoration | imgui.WindowFlags_.always_auto_resize |
+                 imgui.WindowFlags_.no_saved_settings | imgui.WindowFlags_.no_focus_on_appearing |
+                 imgui.WindowFlags_.no_nav)
+        imgui.begin("Playlist", flags=flags)
+        if imgui.button("Prev") or imgui.is_key_pressed(imgui.Key.page_up, False):
+            self.go_to(self.position - 1)
+        imgui.same_line()
+        if imgui.button("Next") or imgui.is_key_pressed(imgui.Key.page_down, False):
+            self.go_to(self.position + 1)
+        imgui.same_line()
+        imgui.text(f"{self.position + 1}/{len(self.paths)}  {os.path.basename(self.paths[self.position])}")
+        imgui.end()
+
+    def cleanup(self):
+        for preparation in self._preparing.values():
+            preparation.cancel()
+        self._preparing.clear()
+        self.player.cleanup()
+        self.audio_output.close()
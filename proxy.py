@@ -0,0 +1,156 @@
+import os
+import av
+from video_index import VideoIndex
+from decoder_options import open_video
+from decoding import decode_from
+from planar_frame import PlanarFrame
+
+PROXY_HEIGHT = 360
+PROXY_GOP = 12
+
+# AVColorSpace values to tag the proxy with, so the shader picks the source's matrix
+_COLORSPACE = {'bt601': 6, 'bt709': 1, 'bt2020': 9}
+
+
+def proxy_path_for(video_path):
+    return video_path + '.proxy.mp4'
+
+
+def proxy_size(width, height, max_height=PROXY_HEIGHT):
+    """Proxy dimensions keeping the aspect ratio, even for yuv420p, or None when the
+    source is already small enough to scrub directly"""
+    if height <= max_height:
+        return None
+    scaled_width = round(width * max_height / height / 2) * 2
+    return max(scaled_width, 2), max_height
+
+
+def _signature(video_path):
+    st = os.stat(video_path)
+    return f"proxy:{st.st_size}:{st.st_mtime_ns}"
+
+
+def proxy_is_fresh(video_path):
+    """True if a proxy exists and was made from the current version of video_path"""
+    path = proxy_path_for(video_path)
+    if not os.path.exists(path):
+        return False
+    try:
+        with av.open(path) as container:
+            return container.metadata.get('comment') == _signature(video_path)
+    except Exception as e:
+        print(f"Error checking proxy {path}: {e}")
+        return False
+
+
+def build_proxy(video_path, max_height=PROXY_HEIGHT, gop=PROXY_GOP, should_cancel=None,
+                decoder_options=None):
+    """Encode a low-resolution, short-GOP copy of the video stream next to video_path.
+
+    Frames keep the source PTS, so a time in the proxy is the same time in the source.
+    Returns the proxy path, or None if the source needs no proxy or should_cancel()
+    turned true part way through.
+    """
+    path = proxy_path_for(video_path)
+    tmp_path = path + '.tmp'
+    completed = False
+    source = open_video(video_path, decoder_options)
+    try:
+        stream = source.streams.video[0]
+        size = proxy_size(stream.width, stream.height, max_height)
+        if size is None:
+            return None
+        width, height = size
+
+        output = av.open(tmp_path, 'w', format='mp4')
+        try:
+            # Written with the header, so it has to be there before the first packet
+            output.metadata['comment'] = _signature(video_path)
+            out_stream = output.add_stream('libx264', rate=stream.guessed_rate or 30)
+            out_stream.width = width
+            out_stream.height = height
+            out_stream.pix_fmt = 'yuv420p'
+            out_stream.time_base = stream.time_base
+            # No B-frames and a keyframe every few frames: any seek decodes at most gop frames
+            out_stream.codec_context.gop_size = gop
+            out_stream.codec_context.max_b_frames = 0
+            out_stream.options = {'preset': 'ultrafast', 'tune': 'fastdecode,zerolatency'}
+
+            tagged = False
+            for frame in source.decode(stream):
+                if should_cancel is not None and should_cancel():
+                    return None
+                if frame.pts is None:
+                    continue
+                if not tagged:
+                    # Resolve untagged sources here, the guess depends on the full height
+                    colors = PlanarFrame.from_av(frame)
+                    out_stream.codec_context.colorspace = _COLORSPACE[colors.matrix]
+                    out_stream.codec_context.color_range = 2 if colors.full_range else 1
+                    tagged = True
+                small = frame.reformat(width=width, height=height, format='yuv420p')
+                small.pts = frame.pts
+                small.time_base = frame.time_base
+                for packet in out_stream.encode(small):
+                    output.mux(packet)
+            for packet in out_stream.encode(None):
+                output.mux(packet)
+            completed = True
+        finally:
+            output.close()
+    finally:
+        source.close()
+        if not completed and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    os.replace(tmp_path, path)
+    VideoIndex.open(path)
+    return path
+
+
+class ProxyReader:
+    """Decodes single frames from a proxy for scrubbing. Not thread safe, whichever
+    thread scrubs owns it."""
+
+    def __init__(self, video_path, decoder_options=None):
+        self.path = proxy_path_for(video_path)
+        self.index = VideoIndex.open(self.path)
+        self.container = open_video(self.path, decoder_options)
+        self.stream = self.container.streams.video[0]
+
+    def decode_at(self, timestamp, should_cancel=None):
+        """Decoded frame on screen at timestamp, or None if cancelled"""
+        if len(self.index) == 0:
+            return None
+        target = self.index.frame_at_time(timestamp)
+        target_pts = int(self.index.pts[target])
+        for frame in decode_from(self.container, self.stream, self.index, target):
+            if should_cancel is not None and should_cancel():
+                return None
+            if frame.pts >= target_pts:
+                return frame
+        return None
+
+    def close(self):
+        self.container.close()
+
+
+def main():
+    """Build (or check) the proxy for a video: python proxy.py video.mp4"""
+    import sys
+    import time
+
+    video_path = sys.argv[1]
+    if proxy_is_fresh(video_path):
+        print(f"{proxy_path_for(video_path)} is up to date")
+        return
+    start = time.perf_counter()
+    path = build_proxy(video_path)
+    if path is None:
+        print(f"{video_path} is small enough to scrub without a proxy")
+    else:
+        print(f"Wrote {path} in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
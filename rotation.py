@@ -0,0 +1,38 @@
+import math
+import struct
+from av.sidedata.sidedata import Type as SideDataType
+from imgui_bundle import imgui
+
+
+def get_display_rotation(frame):
+    """Rotation from a decoded frame's display matrix, in degrees counterclockwise like
+    ffprobe reports it, or None if the frame carries no matrix"""
+    for side_data in frame.side_data:
+        if side_data.type == SideDataType.DISPLAYMATRIX:
+            # Same maths as av_display_rotation_get(), the matrix is 16.16 fixed point
+            m = [v / 65536.0 for v in struct.unpack('9i', bytes(side_data))]
+            scale_x = math.hypot(m[0], m[3])
+            scale_y = math.hypot(m[1], m[4])
+            if scale_x == 0 or scale_y == 0:
+                return None
+            return -math.degrees(math.atan2(m[1] / scale_y, m[0] / scale_x))
+    return None
+
+
+def snapped_rotation(frame):
+    """Rotation in degrees counterclockwise from the frame's display matrix,
+    snapped to 0, 90, 180 or 270"""
+    rotation = None
+    try:
+        rotation = get_display_rotation(frame)
+    except Exception as e:
+        print(f"Error getting rotation: {e}")
+    return int(round((rotation or 0) / 90)) * 90 % 360
+
+
+def rotated_uvs(rotation, u0=0.0, v0=0.0, u1=1.0, v1=1.0):
+    """Corner UVs (top-left, top-right, bottom-right, bottom-left) that turn the unrotated
+    texture rectangle by 0/90/180/270 degrees counterclockwise when drawn as a quad"""
+    corners = [(u0, v0), (u1, v0), (u1, v1), (u0, v1)]
+    k = rotation // 90
+    return [imgui.ImVec2(*uv) for uv in corners[k:] + corners[:k]]
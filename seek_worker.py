@@ -0,0 +1,84 @@
+import threading
+import time
+
+
+class SeekWorker:
+    """Background seeker where only the newest requested time gets decoded.
+
+    The render loop calls request() on every slider change and picks finished frames up
+    with take_result(), which never blocks. A request that arrives while a seek is
+    decoding cancels it at the next frame. Each seek may first publish an approximate
+    frame (the keyframe it started from) and then the exact one.
+    """
+
+    def __init__(self, player):
+        self.player = player
+        self.busy = False
+        self._cond = threading.Condition()
+        self._target = None
+        self._generation = 0
+        self._result = None
+        self._running = True
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def request(self, timestamp, scrub=False):
+        """Seek to timestamp. Scrub requests may be answered at lower resolution."""
+        with self._cond:
+            self._target = (timestamp, scrub)
+            self._generation += 1
+            self._cond.notify_all()
+
+    def take_result(self):
+        """Newest (time, rgb, exact) frame for the latest request, or None"""
+        with self._cond:
+            result, self._result = self._result, None
+        if result is None or result[0] != self._generation:
+            return None
+        return result[1:]
+
+    def wait_idle(self, timeout=None):
+        with self._cond:
+            return self._cond.wait_for(lambda: not self.busy and self._target is None, timeout)
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._generation += 1
+            self._cond.notify_all()
+        self.thread.join(timeout=1.0)
+
+    def _publish(self, generation, pts, rgb, exact):
+        timestamp = float(pts * self.player.stream.time_base)
+        with self._cond:
+            if generation == self._generation:
+                self._result = (generation, timestamp, rgb, exact)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._target is not None or not self._running)
+                if not self._running:
+                    return
+                (timestamp, scrub), generation = self._target, self._generation
+                self._target = None
+                self.busy = True
+
+            start = time.perf_counter()
+            try:
+                pts, rgb = self.player._seek_decode(
+                    timestamp,
+                    should_cancel=lambda: self._generation != generation,
+                    on_preview=lambda pts, rgb: self._publish(generation, pts, rgb, False),
+                    scrub=scrub,
+                )
+                if rgb is not None:
+                    self._publish(generation, pts, rgb, True)
+                    self.player.stats.record('seek', start)
+            except Exception as e:
+                self.player.stats.error("Seek worker", e)
+            finally:
+                with self._cond:
+                    self.busy = False
+                    self._cond.notify_all()
@@ -0,0 +1,38 @@
+"""Small .npz files saved next to a video, reused only while the video is unchanged."""
+import os
+import numpy as np
+
+
+def load_sidecar(path, video_path, version, **extra):
+    """The arrays save_sidecar wrote to path, as a dict. None if there are none, or they
+    were written by another version, for an older copy of video_path (going by its
+    size and mtime) or with different values for any of extra."""
+    if not os.path.exists(path):
+        return None
+    st = os.stat(video_path)
+    expected = dict(extra, version=version, size=st.st_size, mtime_ns=st.st_mtime_ns)
+    try:
+        with np.load(path) as data:
+            for key, value in expected.items():
+                if key not in data or data[key].item() != value:
+                    return None
+            return {key: data[key] for key in data.files}
+    except Exception as e:
+        print(f"Error loading {path}: {e}")
+        return None
+
+
+def save_sidecar(path, video_path, version, compressed=False, **arrays):
+    """Write arrays to path along with version and video_path's size and mtime.
+
+    Goes through a temporary file, so a reader never sees half of one.
+    """
+    st = os.stat(video_path)
+    save = np.savez_compressed if compressed else np.savez
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            save(f, version=version, size=st.st_size, mtime_ns=st.st_mtime_ns, **arrays)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Error saving {path}: {e}")
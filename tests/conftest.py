@@ -0,0 +1,14 @@
+import pytest
+from benchmarks.synthetic import make_clip
+
+
+@pytest.fixture(scope='session')
+def clip(tmp_path_factory):
+    """make_clip(), small by default, writing to a directory shared by the whole session
+    so each clip is only encoded once. Sidecars land next to the clips, not in the
+    benchmarks' media directory."""
+    directory = str(tmp_path_factory.mktemp('clips'))
+
+    def make(width=320, height=180, seconds=2, fps=30, **settings):
+        return make_clip(width, height, seconds, fps, directory=directory, **settings)
+    return make
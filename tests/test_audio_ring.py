@@ -0,0 +1,80 @@
+import threading
+import time
+import numpy as np
+from audio_ring import AudioRingBuffer, decode_audio_into
+
+
+def ramp(start, count, channels=2):
+    """count samples numbered from start, the same on every channel"""
+    return np.repeat(np.arange(start, start + count, dtype=np.float32)[:, None], channels, axis=1)
+
+
+def test_wraps_around_the_end():
+    ring = AudioRingBuffer(8, 2)
+    out = np.empty((5, 2), dtype=np.float32)
+    assert ring.write(ramp(0, 5)) == 5
+    assert ring.read_into(out) == 5
+    # Starts 3 before the end of the buffer and carries on at the front
+    assert ring.write(ramp(5, 7)) == 7
+    assert ring.available() == 7
+    out = np.empty((7, 2), dtype=np.float32)
+    assert ring.read_into(out) == 7
+    assert np.array_equal(out, ramp(5, 7))
+    assert (ring.write_index, ring.read_index) == (12, 12)
+
+
+def test_many_laps_keep_the_order():
+    ring = AudioRingBuffer(7, 1)
+    written = read = 0
+    out = np.empty((3, 1), dtype=np.float32)
+    for _ in range(50):
+        written += ring.write(ramp(written, 5, 1))
+        got = ring.read_into(out)
+        assert np.array_equal(out[:got], ramp(read, got, 1))
+        read += got
+    assert ring.underruns == 0
+
+
+def test_full_write_takes_what_fits():
+    ring = AudioRingBuffer(4, 2)
+    assert ring.write(ramp(0, 6)) == 4
+    assert ring.full_waits == 1
+    assert ring.overruns == 0
+    assert ring.space() == 0
+
+
+def test_short_read_pads_with_silence():
+    ring = AudioRingBuffer(8, 2)
+    ring.write(ramp(1, 3))
+    out = np.full((5, 2), -1, dtype=np.float32)
+    assert ring.read_into(out) == 3
+    assert np.array_equal(out[:3], ramp(1, 3))
+    assert not out[3:].any()
+    assert ring.underruns == 1
+
+
+def test_decode_waits_for_room_without_dropping(clip):
+    path = clip(audio=True, seconds=1)
+    ring = AudioRingBuffer(4096, 2)
+    samples = []
+    done = threading.Event()
+
+    def consume():
+        out = np.empty((1000, 2), dtype=np.float32)
+        while not done.is_set() or ring.available():
+            count = min(len(out), ring.available())
+            if count:
+                ring.read_into(out[:count])
+                samples.append(out[:count].copy())
+            else:
+                time.sleep(0.001)
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    assert decode_audio_into(ring, path, 0.0, 48000, lambda: True)
+    done.set()
+    consumer.join()
+    total = sum(len(s) for s in samples)
+    assert total >= 48000 * 0.95
+    assert ring.full_waits > 0
+    assert ring.overruns == 0
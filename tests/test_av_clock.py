@@ -0,0 +1,65 @@
+import av_clock
+import pytest
+from av_clock import MasterClock
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def fake_time(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(av_clock, 'time', fake)
+    return fake
+
+
+def test_runs_on_monotonic_time_at_rate(fake_time):
+    clock = MasterClock()
+    clock.start(5.0, rate=2.0)
+    fake_time.now += 1.5
+    assert clock.now() == pytest.approx(8.0)
+
+
+def test_follows_samples_played_minus_latency(fake_time):
+    clock = MasterClock()
+    clock.start(10.0, sample_rate=48000, latency=0.05)
+    # Nothing heard yet, the latency doesn't take it back before the start
+    assert clock.now() == 10.0
+    fake_time.now += 3.0
+    clock.add_samples(24000)
+    assert clock.now() == pytest.approx(10.45)
+    clock.add_samples(24000)
+    assert clock.now() == pytest.approx(10.95)
+
+
+def test_free_runs_from_where_the_audio_got_to(fake_time):
+    clock = MasterClock()
+    clock.start(0.0, sample_rate=48000)
+    clock.add_samples(48000)
+    fake_time.now += 5.0
+    clock.free_run()
+    assert clock.now() == pytest.approx(1.0)
+    fake_time.now += 0.5
+    assert clock.now() == pytest.approx(1.5)
+    # More samples no longer move it
+    clock.add_samples(48000)
+    assert clock.now() == pytest.approx(1.5)
+
+
+def test_stop_freezes_and_start_resets(fake_time):
+    clock = MasterClock()
+    clock.start(2.0)
+    fake_time.now += 1.0
+    clock.stop()
+    fake_time.now += 10.0
+    assert clock.now() == pytest.approx(3.0)
+    assert not clock.running
+    clock.start(clock.now(), sample_rate=48000)
+    assert clock.samples_played == 0
+    clock.add_samples(4800)
+    assert clock.now() == pytest.approx(3.1)
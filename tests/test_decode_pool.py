@@ -0,0 +1,95 @@
+import time
+from av_clock import MasterClock
+from pipeline_stats import PipelineStats
+from video_grid import DecodePool
+
+
+class FakeTile:
+    """Stands in for a GridTile: each turn decodes one frame of frame_seconds, or
+    serves the pending seek, until it has queued up to `until`"""
+
+    def __init__(self, name, frame_seconds, until=1.0, log=None):
+        self.name = name
+        self.frame_seconds = frame_seconds
+        self.until = until
+        self.log = log if log is not None else []
+        self.queued_until = 0.0
+        self.seek_request = None
+        self.eof = False
+        self.active = 0
+
+    def priority(self):
+        if self.seek_request is not None:
+            return (0, 0.0)
+        if not self.eof and self.queued_until < self.until:
+            return (1, self.queued_until)
+        return None
+
+    def turn(self, clock):
+        self.active += 1
+        try:
+            assert self.active == 1, f"{self.name} held by two workers"
+            time.sleep(0.001)
+            if self.seek_request is not None:
+                self.log.append((self.name, 'seek'))
+                self.seek_request = None
+            else:
+                self.queued_until += self.frame_seconds
+                self.log.append((self.name, self.queued_until))
+        finally:
+            self.active -= 1
+
+
+def run(tiles, workers, timeout=10.0):
+    stats = PipelineStats()
+    pool = DecodePool(tiles, workers, MasterClock(), stats)
+    deadline = time.monotonic() + timeout
+    while any(tile.priority() is not None for tile in tiles):
+        assert time.monotonic() < deadline, "pool never finished"
+        time.sleep(0.005)
+    assert pool.stop()
+    return stats
+
+
+def test_playing_tiles_stay_level():
+    log = []
+    # Different frame rates, so turns are worth different amounts of time
+    tiles = [FakeTile('a', 1 / 24, log=log), FakeTile('b', 1 / 30, log=log), FakeTile('c', 1 / 60, log=log)]
+    reached = {tile.name: 0.0 for tile in tiles}
+    stats = run(tiles, 1)
+    assert not stats.errors
+    for name, queued_until in log:
+        reached[name] = queued_until
+        # The tile furthest behind always goes next, so none gets more than a turn ahead
+        assert max(reached.values()) - min(reached.values()) <= 1 / 24 + 1e-9
+    assert all(tile.queued_until >= 1.0 for tile in tiles)
+
+
+def test_seeks_go_before_playback():
+    log = []
+    tiles = [FakeTile('a', 0.1, until=0.5, log=log), FakeTile('b', 0.1, until=0.5, log=log)]
+    tiles[1].queued_until = 0.5
+    tiles[1].seek_request = (1, 0.0, True)
+    run(tiles, 1)
+    assert log[0] == ('b', 'seek')
+
+
+def test_a_tile_is_only_held_by_one_worker():
+    tiles = [FakeTile(str(i), 0.01, until=0.5) for i in range(3)]
+    stats = run(tiles, 4)
+    # turn() asserts it isn't entered twice; a failure would show up as an error
+    assert not stats.errors
+    assert all(tile.queued_until >= 0.5 for tile in tiles)
+
+
+def test_a_failing_tile_is_stopped_not_the_pool():
+    good = FakeTile('good', 0.1)
+    bad = FakeTile('bad', 0.1)
+
+    def fail(clock):
+        raise RuntimeError("corrupt stream")
+    bad.turn = fail
+    stats = run([good, bad], 2)
+    assert bad.eof
+    assert stats.errors == {'Grid decode (bad)': 1}
+    assert good.queued_until >= 1.0
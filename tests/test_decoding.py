@@ -0,0 +1,70 @@
+import av
+import numpy as np
+import pytest
+from decoding import decode_from
+from video_index import VideoIndex
+
+CLIPS = [
+    dict(gop=12, bframes=0),
+    dict(gop=24, bframes=2),
+    dict(gop=48, bframes=3, vfr=True),
+    dict(gop=24, bframes=2, codec='libx265'),
+]
+
+
+def reference_frames(path):
+    """pts: luma plane of every frame, decoded start to end"""
+    with av.open(path) as container:
+        return {frame.pts: frame.to_ndarray(format='gray') for frame in container.decode(video=0)}
+
+
+def remux(path, out_path):
+    with av.open(path) as source, av.open(out_path, 'w') as output:
+        stream = output.add_stream_from_template(source.streams.video[0])
+        for packet in source.demux(source.streams.video[0]):
+            if packet.dts is None:
+                continue
+            packet.stream = stream
+            output.mux(packet)
+    return out_path
+
+
+def check_targets(path):
+    index = VideoIndex.build(path)
+    reference = reference_frames(path)
+    targets = sorted({0, 1, len(index) // 2, len(index) - 1} |
+                     {int(k) for k in index.key_frames} |
+                     {int(k) - 1 for k in index.key_frames if k > 0})
+    with av.open(path) as container:
+        stream = container.streams.video[0]
+        for target in targets:
+            target_pts = int(index.pts[target])
+            seen = []
+            for frame in decode_from(container, stream, index, target):
+                seen.append(frame.pts)
+                if frame.pts >= target_pts:
+                    break
+            assert seen[-1] == target_pts, f"frame {target}"
+            assert seen == sorted(set(seen)), f"frame {target} repeats or goes back"
+            assert np.array_equal(frame.to_ndarray(format='gray'), reference[target_pts]), f"frame {target}"
+
+
+@pytest.mark.parametrize('settings', CLIPS, ids=lambda s: '-'.join(f"{k}{v}" for k, v in s.items()))
+def test_lands_on_every_target(clip, settings):
+    check_targets(clip(**settings))
+
+
+def test_lands_on_every_target_in_mpegts(clip, tmp_path):
+    # Seeks on decode times, which is what the DTS fallback is for
+    check_targets(remux(clip(gop=24, bframes=2), str(tmp_path / 'clip.ts')))
+
+
+def test_runs_on_to_the_end(clip):
+    path = clip(gop=24, bframes=2)
+    index = VideoIndex.build(path)
+    with av.open(path) as container:
+        stream = container.streams.video[0]
+        pts = [frame.pts for frame in decode_from(container, stream, index, 30)]
+    assert pts == sorted(set(pts))
+    assert pts[-1] == int(index.pts[-1])
+    assert pts[0] == int(index.pts[index.keyframe_for(30)])
@@ -0,0 +1,113 @@
+import os
+import time
+import av
+import numpy as np
+from disk_frame_cache import GROW_SLOTS, DiskFrameCache
+from planar_frame import PlanarFrame
+
+WIDTH, HEIGHT = 16, 8
+SLOT_BYTES = WIDTH * HEIGHT * 3
+
+
+def video(tmp_path, name):
+    """Something to cache frames of; only its size and mtime matter"""
+    path = tmp_path / name
+    path.write_bytes(name.encode())
+    return str(path)
+
+
+def rgb(value):
+    return np.full((HEIGHT, WIDTH, 3), value, dtype=np.uint8)
+
+
+def fill(path, cache_dir, max_bytes, count, last_used=None):
+    cache = DiskFrameCache(path, 'rgb24', WIDTH, HEIGHT, max_bytes, directory=cache_dir)
+    for n in range(count):
+        cache.put(n, rgb(n))
+        # The writer skips frames once MAX_PENDING are waiting
+        while n in cache._queued:
+            time.sleep(0.001)
+    cache.close()
+    if last_used is not None:
+        os.utime(cache.data_path, (last_used, last_used))
+    return cache
+
+
+def test_frames_survive_reopening(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    path = video(tmp_path, 'a.mp4')
+    fill(path, cache_dir, 1 << 20, 5)
+    cache = DiskFrameCache(path, 'rgb24', WIDTH, HEIGHT, 1 << 20, directory=cache_dir)
+    try:
+        assert len(cache) == 5
+        for n in range(5):
+            assert np.array_equal(cache.get(n), rgb(n))
+        assert cache.get(5) is None
+        assert (cache.hits, cache.misses) == (5, 1)
+    finally:
+        cache.close()
+
+
+def test_changed_video_starts_over(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    path = video(tmp_path, 'a.mp4')
+    fill(path, cache_dir, 1 << 20, 3)
+    with open(path, 'ab') as f:
+        f.write(b'more')
+    cache = DiskFrameCache(path, 'rgb24', WIDTH, HEIGHT, 1 << 20, directory=cache_dir)
+    try:
+        assert len(cache) == 0
+    finally:
+        cache.close()
+
+
+def test_evicts_least_recently_used_videos(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    grown = GROW_SLOTS * SLOT_BYTES
+    # Room for two videos' first data file growth, not three
+    budget = 2 * grown + SLOT_BYTES
+    a = fill(video(tmp_path, 'a.mp4'), cache_dir, budget, 3, last_used=1000)
+    b = fill(video(tmp_path, 'b.mp4'), cache_dir, budget, 3, last_used=2000)
+    c = fill(video(tmp_path, 'c.mp4'), cache_dir, budget, 3)
+    assert not os.path.exists(a.data_path) and not os.path.exists(a.meta_path)
+    assert os.path.exists(b.data_path) and os.path.exists(c.data_path)
+    assert len(c) == 3
+    total = sum(os.path.getsize(os.path.join(cache_dir, name))
+                for name in os.listdir(cache_dir) if name.endswith('.frames'))
+    assert total <= budget
+
+
+def test_stops_storing_when_budget_is_spent(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    cache = fill(video(tmp_path, 'a.mp4'), cache_dir, GROW_SLOTS * SLOT_BYTES, GROW_SLOTS + 5)
+    assert cache.full
+    assert len(cache) == GROW_SLOTS
+    assert os.path.getsize(cache.data_path) == GROW_SLOTS * SLOT_BYTES
+
+
+def test_skips_frames_of_another_size_or_kind(tmp_path):
+    cache = DiskFrameCache(video(tmp_path, 'a.mp4'), 'rgb24', WIDTH, HEIGHT, 1 << 20,
+                           directory=str(tmp_path / 'cache'))
+    cache.put(0, np.zeros((HEIGHT * 2, WIDTH, 3), dtype=np.uint8))
+    frame = av.VideoFrame.from_ndarray(rgb(100), format='rgb24').reformat(format='yuv420p')
+    cache.put(1, PlanarFrame.from_av(frame))
+    cache.close()
+    assert len(cache) == 0
+
+
+def test_planar_frames_round_trip(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    path = video(tmp_path, 'a.mp4')
+    image = np.random.default_rng(0).integers(0, 256, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+    frame = PlanarFrame.from_av(av.VideoFrame.from_ndarray(image, format='rgb24').reformat(format='yuv420p'))
+    cache = DiskFrameCache(path, 'yuv420p', WIDTH, HEIGHT, 1 << 20, directory=cache_dir)
+    cache.put(7, frame)
+    cache.close()
+    cache = DiskFrameCache(path, 'yuv420p', WIDTH, HEIGHT, 1 << 20, directory=cache_dir)
+    try:
+        cached = cache.get(7)
+        assert (cached.matrix, cached.full_range) == (frame.matrix, frame.full_range)
+        for got, want, width in zip(cached.planes, frame.planes, frame.widths):
+            assert np.array_equal(got[:, :width], want[:got.shape[0], :width])
+    finally:
+        cache.close()
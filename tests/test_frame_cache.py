@@ -0,0 +1,54 @@
+import numpy as np
+from frame_cache import FrameCache
+
+
+def frame(nbytes, value=0):
+    return np.full(nbytes, value, dtype=np.uint8)
+
+
+def test_evicts_least_recently_used():
+    cache = FrameCache(max_bytes=300)
+    for pts in (1, 2, 3):
+        cache.put(pts, frame(100, pts))
+    # Using 1 makes 2 the oldest
+    assert cache.get(1)[0] == 1
+    cache.put(4, frame(100, 4))
+    assert 2 not in cache
+    assert [pts in cache for pts in (1, 3, 4)] == [True, True, True]
+    assert cache.nbytes == 300
+
+
+def test_evicts_as_many_as_needed():
+    cache = FrameCache(max_bytes=300)
+    for pts in (1, 2, 3):
+        cache.put(pts, frame(100))
+    cache.put(4, frame(250))
+    assert len(cache) == 1 and 4 in cache
+    assert cache.nbytes == 250
+
+
+def test_replacing_a_frame_counts_its_bytes_once():
+    cache = FrameCache(max_bytes=300)
+    cache.put(1, frame(100))
+    cache.put(1, frame(150, 7))
+    assert len(cache) == 1
+    assert cache.nbytes == 150
+    assert cache.get(1)[0] == 7
+
+
+def test_frame_bigger_than_cache_is_not_kept():
+    cache = FrameCache(max_bytes=100)
+    cache.put(1, frame(50))
+    cache.put(2, frame(101))
+    assert 2 not in cache
+    assert 1 in cache
+
+
+def test_hits_misses_and_clear():
+    cache = FrameCache(max_bytes=1000)
+    cache.put(1, frame(10))
+    assert cache.get(1) is not None
+    assert cache.get(2) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.clear()
+    assert len(cache) == 0 and cache.nbytes == 0
@@ -0,0 +1,69 @@
+import threading
+import time
+import numpy as np
+from frame_queue import FrameQueue
+
+
+def frame(nbytes=10):
+    return np.zeros(nbytes, dtype=np.uint8)
+
+
+def put_in_thread(queue, pts, item):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(queue.put(pts, item)))
+    thread.start()
+    return thread, result
+
+
+def test_put_blocks_while_full_until_a_pop():
+    queue = FrameQueue(max_frames=2)
+    assert queue.put(0.0, frame()) and queue.put(0.1, frame())
+    thread, result = put_in_thread(queue, 0.2, frame())
+    thread.join(0.1)
+    assert thread.is_alive() and len(queue) == 2
+    assert queue.pop()[0] == 0.0
+    thread.join(1.0)
+    assert result == [True]
+    assert [queue.pop()[0] for _ in range(2)] == [0.1, 0.2]
+
+
+def test_close_turns_away_a_blocked_put():
+    queue = FrameQueue(max_frames=1)
+    queue.put(0.0, frame())
+    thread, result = put_in_thread(queue, 0.1, frame())
+    thread.join(0.1)
+    assert thread.is_alive()
+    queue.close()
+    thread.join(1.0)
+    assert result == [False]
+    assert len(queue) == 1
+    assert not queue.put(0.2, frame())
+    queue.reopen()
+    queue.clear()
+    assert queue.put(0.2, frame())
+
+
+def test_bounded_by_bytes_but_always_takes_one():
+    queue = FrameQueue(max_frames=10, max_bytes=25)
+    assert queue.put(0.0, frame(20))
+    thread, result = put_in_thread(queue, 0.1, frame(10))
+    thread.join(0.1)
+    assert thread.is_alive()
+    queue.pop()
+    thread.join(1.0)
+    assert result == [True] and queue.nbytes == 10
+    queue.pop()
+    # A frame bigger than max_bytes still goes into an empty queue
+    assert queue.put(0.2, frame(100))
+    assert queue.nbytes == 100
+
+
+def test_newest_due_and_peek():
+    queue = FrameQueue(max_frames=4)
+    for pts in (1.0, 2.0, 3.0):
+        queue.put(pts, frame())
+    assert queue.peek()[0] == 1.0 and len(queue) == 3
+    assert queue.newest_due(0.5) is None
+    assert queue.newest_due(2.5) == 2.0
+    assert queue.newest_due(10.0) == 3.0
+    assert FrameQueue().pop() is None
@@ -0,0 +1,141 @@
+import av
+import numpy as np
+import pytest
+from frame_ring import FrameRing, MAX_CONSUMERS
+
+SHAPE = (8, 16, 3)
+
+
+def image(value):
+    return np.full(SHAPE, value, dtype=np.uint8)
+
+
+@pytest.fixture
+def make_ring():
+    """FrameRing.create() for one test, closed with its consumers at the end"""
+    rings = []
+
+    def make(**options):
+        ring = FrameRing.create(slots=4, max_shape=SHAPE, overlay_slots=4, **options)
+        rings.append(ring)
+        return ring
+    yield make
+    for ring in rings:
+        ring.close()
+
+
+def attach(ring, consumer=None):
+    return FrameRing.attach(ring.name, consumer)
+
+
+def test_drop_oldest_overwrites_and_readers_skip_ahead(make_ring):
+    ring = make_ring(policy='drop_oldest')
+    reader = attach(ring)
+    try:
+        for i in range(1, 7):
+            assert ring.publish(image(i), pts=i * 10) == i
+        # Slots hold 3..6 now, 1 and 2 were overwritten
+        frame = reader.read_next(timeout=1.0)
+        assert (frame.seq, frame.pts, reader.skipped) == (3, 30, 2)
+        assert np.array_equal(frame.image, image(3))
+        assert reader.is_current(frame)
+        ring.publish(image(7), pts=70)
+        ring.publish(image(8), pts=80)
+        # Its slot went to frame 7
+        assert not reader.is_current(frame)
+        assert int(ring.header['dropped']) == 0
+        del frame
+    finally:
+        reader.close()
+
+
+def test_block_waits_for_the_consumer(make_ring):
+    ring = make_ring(policy='block')
+    reader = attach(ring)
+    try:
+        for i in range(1, 5):
+            assert ring.publish(image(i), pts=i) == i
+        assert ring.publish(image(5), pts=5, timeout=0.05) is None
+        assert int(ring.header['dropped']) == 1
+        # Reading the second frame acks the first, which frees its slot
+        assert reader.read_next(timeout=1.0).seq == 1
+        assert ring.publish(image(5), pts=5, timeout=0.05) is None
+        assert reader.read_next(timeout=1.0).seq == 2
+        assert ring.publish(image(5), pts=5, timeout=0.05) == 5
+        assert reader.skipped == 0
+    finally:
+        reader.close()
+
+
+def test_block_waits_for_the_slowest_consumer(make_ring):
+    ring = make_ring(policy='block')
+    fast, slow = attach(ring), attach(ring)
+    try:
+        for i in range(1, 5):
+            ring.publish(image(i), pts=i)
+        for _ in range(4):
+            fast.read_next(timeout=1.0)
+        fast.ack(4)
+        assert ring.publish(image(5), pts=5, timeout=0.05) is None
+        slow.ack(1)
+        assert ring.publish(image(5), pts=5, timeout=0.05) == 5
+        # Once the slow one detaches only the fast one counts
+        slow.close()
+        assert ring.publish(image(6), pts=6, timeout=0.05) == 6
+    finally:
+        fast.close()
+
+
+def test_block_without_consumers_never_waits(make_ring):
+    ring = make_ring(policy='block')
+    for i in range(1, 10):
+        assert ring.publish(image(i), pts=i, timeout=0.0) == i
+
+
+def test_consumer_entries(make_ring):
+    ring = make_ring()
+    readers = [attach(ring) for _ in range(MAX_CONSUMERS)]
+    try:
+        assert [reader.consumer for reader in readers] == list(range(MAX_CONSUMERS))
+        with pytest.raises(ValueError):
+            attach(ring)
+        readers.pop(3).close()
+        readers.append(attach(ring))
+        assert readers[-1].consumer == 3
+        with pytest.raises(ValueError):
+            attach(ring, consumer=0)
+    finally:
+        for reader in readers:
+            reader.close()
+
+
+def test_publishes_video_frames_as_rgb(make_ring):
+    ring = make_ring()
+    reader = attach(ring)
+    try:
+        rgb = np.random.default_rng(0).integers(0, 256, (4, 8, 3), dtype=np.uint8)
+        ring.publish(av.VideoFrame.from_ndarray(rgb, format='rgb24'), pts=1, timestamp=0.5, rotation=90)
+        frame = reader.read_next(timeout=1.0)
+        assert frame.image.shape == (4, 8, 3)
+        assert np.array_equal(frame.image, rgb)
+        assert (frame.time, frame.rotation) == (0.5, 90)
+        del frame
+        with pytest.raises(ValueError):
+            ring.publish(np.zeros((16, 16, 3), dtype=np.uint8), pts=2)
+    finally:
+        reader.close()
+
+
+def test_overlays_by_pts(make_ring):
+    ring = make_ring()
+    reader = attach(ring)
+    try:
+        reader.post_overlay(100, [[0.1, 0.2, 0.3, 0.4]], scores=np.array([0.9]), labels=np.array([7]))
+        boxes, scores, labels = ring.overlay_for(100)
+        assert np.allclose(boxes, [[0.1, 0.2, 0.3, 0.4]])
+        assert np.allclose(scores, [0.9]) and list(labels) == [7]
+        assert ring.overlay_for(110) is None
+        assert ring.overlay_for(110, max_lag=10) is not None
+        assert ring.overlay_for(90, max_lag=100) is None
+    finally:
+        reader.close()
@@ -0,0 +1,148 @@
+import time
+import av
+import numpy as np
+from gop_cache import GopCache
+from video_index import VideoIndex
+
+
+def convert(frame, full_res):
+    """Luma plane, halved in each direction unless full_res"""
+    luma = frame.to_ndarray(format='gray')
+    return luma if full_res else luma[::2, ::2].copy()
+
+
+def wait_for(cache, frame_number, full_res=True, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        frame = cache.get(frame_number, full_res)
+        if frame is not None:
+            return frame
+        assert time.monotonic() < deadline, f"frame {frame_number} never decoded"
+        time.sleep(0.002)
+
+
+def reference(path, index):
+    frames = {}
+    with av.open(path) as container:
+        for frame in container.decode(video=0):
+            frames[int(np.searchsorted(index.pts, frame.pts))] = frame.to_ndarray(format='gray')
+    return frames
+
+
+def test_reverse_walk_is_exact(clip):
+    path = clip(gop=12, bframes=2, vfr=True)
+    index = VideoIndex.build(path)
+    expected = reference(path, index)
+    cache = GopCache(path, index, convert)
+    try:
+        for n in range(len(index) - 1, -1, -1):
+            # As reverse playback does: the GOP before is decoded while this one shows
+            first, _ = cache.gop_of(n)
+            if first > 0:
+                cache.prefetch(first - 1, full_res=False)
+            frame = wait_for(cache, n, full_res=False)
+            assert np.array_equal(frame, expected[n][::2, ::2]), f"frame {n}"
+    finally:
+        cache.stop()
+
+
+def test_gop_of_spans_keyframe_to_keyframe(clip):
+    path = clip(gop=12, bframes=0)
+    index = VideoIndex.build(path)
+    cache = GopCache(path, index, convert)
+    try:
+        keys = [int(k) for k in index.key_frames] + [len(index)]
+        for first, end in zip(keys, keys[1:]):
+            assert cache.gop_of(first) == (first, end)
+            assert cache.gop_of(end - 1) == (first, end)
+    finally:
+        cache.stop()
+
+
+def test_full_res_requests_decode_again(clip):
+    path = clip(gop=12, bframes=0)
+    index = VideoIndex.build(path)
+    cache = GopCache(path, index, convert)
+    try:
+        small = wait_for(cache, 5, full_res=False)
+        assert small.shape == (90, 160)
+        # A scaled GOP doesn't serve a full resolution request, but a full one serves both
+        assert wait_for(cache, 5).shape == (180, 320)
+        assert cache.get(5, full_res=False).shape == (180, 320)
+    finally:
+        cache.stop()
+
+
+def test_stepping_forward_decodes_each_gop_once(clip):
+    path = clip(gop=24, bframes=2)
+    index = VideoIndex.build(path)
+    cache = GopCache(path, index, convert)
+    decoded = []
+    decode = cache._decode
+
+    def counting_decode(first, end, full_res, should_cancel):
+        decoded.append(first)
+        return decode(first, end, full_res, should_cancel)
+    cache._decode = counting_decode
+    try:
+        for n in range(len(index)):
+            wait_for(cache, n)
+            # As step_frame does: the GOP the steps are heading into comes next
+            _, end = cache.gop_of(n)
+            if end < len(index):
+                cache.prefetch(end)
+            # Steps come slower than GOPs decode, let the prefetch land first
+            while cache._prefetch is not None or cache._decoding is not None:
+                time.sleep(0.002)
+        keys = [int(k) for k in index.key_frames]
+        assert sorted(decoded) == keys
+    finally:
+        cache.stop()
+
+
+def test_keeps_the_two_latest_full_res_gops(clip):
+    path = clip(gop=12, bframes=0)
+    index = VideoIndex.build(path)
+    cache = GopCache(path, index, convert)
+    try:
+        wait_for(cache, 0)
+        wait_for(cache, 13)
+        wait_for(cache, 30, full_res=False)
+        assert [(first, gop[0]) for first, gop in cache._gops.items()] == \
+            [(0, True), (12, True), (24, False)]
+        # Used again, so 0 stays and 12 goes when another full resolution GOP comes in
+        cache.get(0)
+        wait_for(cache, 30)
+        assert [(first, gop[0]) for first, gop in cache._gops.items()] == [(0, True), (24, True)]
+    finally:
+        cache.stop()
+
+
+def test_drops_least_recently_used_gops_past_max_bytes(clip):
+    path = clip(gop=12, bframes=0)
+    index = VideoIndex.build(path)
+    assert list(index.key_frames[:3]) == [0, 12, 24]
+    scaled_gop = 12 * 90 * 160
+    cache = GopCache(path, index, convert, max_bytes=3 * scaled_gop - 1)
+    try:
+        for n in (0, 12):
+            wait_for(cache, n, full_res=False)
+        # Used again, so 12 is the one to go
+        cache.get(0, full_res=False)
+        wait_for(cache, 24, full_res=False)
+        assert list(cache._gops) == [0, 24]
+        assert cache.nbytes == 2 * scaled_gop
+    finally:
+        cache.stop()
+
+
+def test_latest_gop_stays_over_budget(clip):
+    path = clip(gop=12, bframes=0)
+    index = VideoIndex.build(path)
+    cache = GopCache(path, index, convert, max_bytes=1)
+    try:
+        for n in (0, 12, 24):
+            wait_for(cache, n, full_res=False)
+            assert list(cache._gops) == [n]
+    finally:
+        cache.stop()
@@ -0,0 +1,58 @@
+import av
+import numpy as np
+import pytest
+from planar_frame import PlanarFrame
+
+_RANGE_MPEG, _RANGE_JPEG = 1, 2
+
+
+def flat_frame(format, color_range, luma=255, width=64, height=32):
+    """A frame of one luma value and neutral chroma"""
+    frame = av.VideoFrame(width, height, format)
+    for plane, value in zip(frame.planes, (luma, 128, 128)):
+        plane.update(np.full(plane.line_size * plane.height, value, dtype=np.uint8).tobytes())
+    frame.color_range = color_range
+    return frame
+
+
+def visible(planar):
+    return [plane[:planar.height if i == 0 else (planar.height + 1) // 2, :width]
+            for i, (plane, width) in enumerate(zip(planar.planes, planar.widths))]
+
+
+@pytest.mark.parametrize('format', ['yuvj420p', 'yuvj422p', 'yuvj444p'])
+@pytest.mark.parametrize('size', [None, (32, 16)], ids=['unscaled', 'scaled'])
+def test_full_range_samples_stay_full_range(format, size):
+    # MJPEG decodes to yuvj422p; its white has to stay 255 since the shader is told
+    # the samples are full range
+    planar = PlanarFrame.from_av(flat_frame(format, _RANGE_JPEG), *(size or (None, None)))
+    assert planar.full_range
+    luma, u, v = visible(planar)
+    assert luma.min() == luma.max() == 255
+    assert abs(int(u.mean()) - 128) <= 1 and abs(int(v.mean()) - 128) <= 1
+
+
+@pytest.mark.parametrize('format', ['yuv420p', 'yuv422p', 'yuv444p'])
+def test_limited_range_is_left_alone(format):
+    planar = PlanarFrame.from_av(flat_frame(format, _RANGE_MPEG, luma=235))
+    assert not planar.full_range
+    luma, _, _ = visible(planar)
+    assert luma.min() == luma.max() == 235
+
+
+def test_scaled_to_the_size_asked_for():
+    planar = PlanarFrame.from_av(flat_frame('yuv420p', _RANGE_MPEG), 32, 16)
+    assert planar.shape == (16, 32, 3)
+    assert planar.widths == [32, 16, 16]
+
+
+def test_matrix_from_colorspace_or_size():
+    frame = flat_frame('yuv420p', _RANGE_MPEG)
+    frame.colorspace = 1
+    assert PlanarFrame.from_av(frame).matrix == 'bt709'
+    frame.colorspace = 5
+    assert PlanarFrame.from_av(frame).matrix == 'bt601'
+    # Untagged: guessed from the height, like FFmpeg's players do
+    frame.colorspace = 2
+    assert PlanarFrame.from_av(frame).matrix == 'bt601'
+    assert PlanarFrame.from_av(flat_frame('yuv420p', _RANGE_MPEG, width=1280, height=720)).matrix == 'bt709'
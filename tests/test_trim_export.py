@@ -0,0 +1,74 @@
+import av
+import numpy as np
+from trim_export import TrimPlan, export_trim
+from video_index import VideoIndex
+
+
+def luma_frames(path):
+    with av.open(path) as container:
+        return [frame.to_ndarray(format='gray').astype(np.int16) for frame in container.decode(video=0)]
+
+
+def test_plan_copies_between_keyframes(clip):
+    index = VideoIndex.build(clip(gop=12, bframes=0))
+    keys = [int(k) for k in index.key_frames]
+    # x264 adds keyframes at scene cuts, so take both points a little past one
+    first, last = keys[1] - 5, keys[-2] + 3
+    assert first not in keys and last not in keys
+    plan = TrimPlan(index, index.time_of(first), index.time_of(last))
+    assert (plan.first, plan.last) == (first, last)
+    assert (plan.copy_start, plan.copy_end) == (keys[1], keys[-2])
+    assert plan.encoded == 5 + 3
+
+
+def test_plan_on_keyframes_encodes_nothing(clip):
+    index = VideoIndex.build(clip(gop=12, bframes=0))
+    plan = TrimPlan(index, index.time_of(12), index.time_of(36))
+    assert (plan.copy_start, plan.copy_end) == (12, 36)
+    assert plan.encoded == 0
+    # Running to the end copies the last GOP too
+    plan = TrimPlan(index, index.time_of(24), None)
+    assert (plan.copy_start, plan.copy_end) == (24, len(index))
+
+
+def test_plan_inside_one_gop_encodes_it_all(clip):
+    index = VideoIndex.build(clip(gop=24, bframes=2))
+    plan = TrimPlan(index, index.time_of(3), index.time_of(20))
+    assert plan.copied == 0
+    assert plan.encoded == 17
+
+
+def test_export_reencodes_only_boundary_gops(clip, tmp_path):
+    path = clip(gop=12, bframes=2, audio=True)
+    index = VideoIndex.build(path)
+    out_path = str(tmp_path / 'trim.mp4')
+    plan = export_trim(path, out_path, index.time_of(5), index.time_of(40))
+    assert plan.copied > 0 and plan.encoded > 0
+
+    source = luma_frames(path)[plan.first:plan.last]
+    trimmed = luma_frames(out_path)
+    assert len(trimmed) == plan.frames
+    for i, (got, want) in enumerate(zip(trimmed, source)):
+        if plan.copy_start <= plan.first + i < plan.copy_end:
+            # Copied packets decode to the very same pixels
+            assert np.array_equal(got, want), f"copied frame {plan.first + i}"
+        else:
+            assert np.abs(got - want).mean() < 2.0, f"re-encoded frame {plan.first + i}"
+
+    with av.open(out_path) as container:
+        assert container.streams.audio
+        duration = (plan.last - plan.first) / 30
+        audio = container.streams.audio[0]
+        assert abs(float(audio.duration * audio.time_base) - duration) < 0.05
+
+
+def test_export_on_keyframes_copies_every_packet(clip, tmp_path):
+    path = clip(gop=12, bframes=0)
+    index = VideoIndex.build(path)
+    out_path = str(tmp_path / 'trim.mp4')
+    plan = export_trim(path, out_path, index.time_of(12), index.time_of(36))
+    assert plan.encoded == 0
+    with av.open(path) as source, av.open(out_path) as output:
+        want = [bytes(p) for p in source.demux(video=0) if p.size][12:36]
+        got = [bytes(p) for p in output.demux(video=0) if p.size]
+    assert got == want
@@ -0,0 +1,79 @@
+import av
+import numpy as np
+from video_index import VideoIndex, index_path_for
+
+
+def decoded_pts(path):
+    with av.open(path) as container:
+        return [frame.pts for frame in container.decode(video=0)]
+
+
+def test_pts_sorted_in_presentation_order(clip):
+    path = clip(bframes=2)
+    index = VideoIndex.build(path)
+    assert list(index.pts) == decoded_pts(path)
+    assert index.is_key[0]
+    assert np.all(index.key_frames[1:] > 0)
+
+
+def test_vfr_frame_at_time_and_time_of(clip):
+    path = clip(vfr=True)
+    index = VideoIndex.build(path)
+    steps = np.diff(index.pts)
+    assert len(set(steps.tolist())) > 1
+
+    for n in range(len(index)):
+        t = index.time_of(n)
+        assert t == float(int(index.pts[n]) * index.time_base)
+        assert index.frame_at_time(t) == n
+        if n + 1 < len(index):
+            # Anywhere up to the next frame still shows this one
+            just_before_next = index.time_of(n + 1) - float(index.time_base)
+            assert index.frame_at_time((t + just_before_next) / 2) == n
+            assert index.frame_at_time(just_before_next) == n
+
+    assert index.frame_at_time(-1.0) == 0
+    assert index.frame_at_time(index.duration + 10) == len(index) - 1
+    last_step = int(index.pts[-1] - index.pts[-2])
+    assert index.duration == float((int(index.pts[-1]) + last_step) * index.time_base)
+
+
+def test_frame_number_only_for_exact_pts(clip):
+    index = VideoIndex.build(clip(vfr=True))
+    for n in (0, 7, len(index) - 1):
+        assert index.frame_number(int(index.pts[n])) == n
+    assert index.frame_number(int(index.pts[5]) + 1) is None
+    assert index.frame_number(int(index.pts[-1]) + 1) is None
+
+
+def test_keyframe_for(clip):
+    index = VideoIndex.build(clip(gop=12, bframes=0))
+    assert list(index.key_frames[:3]) == [0, 12, 24]
+    assert index.keyframe_for(0) == 0
+    assert index.keyframe_for(11) == 0
+    assert index.keyframe_for(12) == 12
+    assert index.keyframe_for(30) == 24
+    assert index.previous_keyframe(24) == 12
+    assert index.previous_keyframe(0) is None
+
+
+def test_sidecar_round_trip_and_staleness(clip, tmp_path):
+    source = clip(vfr=True)
+    path = str(tmp_path / 'copy.mp4')
+    with open(source, 'rb') as f, open(path, 'wb') as out:
+        out.write(f.read())
+    assert VideoIndex.load(path) is None
+
+    built = VideoIndex.open(path)
+    loaded = VideoIndex.load(path)
+    assert loaded is not None
+    assert loaded.time_base == built.time_base
+    for name in ('pts', 'dts', 'is_key', 'pos', 'key_frames'):
+        assert np.array_equal(getattr(loaded, name), getattr(built, name))
+
+    # A changed video makes the sidecar stale
+    with open(path, 'ab') as f:
+        f.write(b'\0')
+    assert VideoIndex.load(path) is None
+    assert (tmp_path / 'copy.mp4.index.npz').exists()
+    assert index_path_for(path) == str(tmp_path / 'copy.mp4.index.npz')
@@ -0,0 +1,101 @@
+import os
+import time
+import av
+import numpy as np
+import pytest
+from waveform import BASE_BIN, MAX_LEVELS, Waveform, waveform_path_for
+
+
+def finished(path, timeout=20.0):
+    waveform = Waveform(path)
+    deadline = time.monotonic() + timeout
+    while not waveform.done:
+        assert time.monotonic() < deadline, "waveform never finished"
+        time.sleep(0.01)
+    return waveform
+
+
+def mono_samples(path):
+    with av.open(path) as container:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format='flt', layout='mono', rate=stream.rate)
+        frames = [out for frame in container.decode(stream) for out in resampler.resample(frame)]
+        frames += resampler.resample(None)
+    return np.concatenate([frame.to_ndarray().reshape(-1) for frame in frames])
+
+
+def fold(peaks):
+    """One level up from peaks, a trailing unpaired peak going up on its own"""
+    if len(peaks) % 2:
+        peaks = np.concatenate((peaks, peaks[-1:]))
+    pairs = peaks.reshape(-1, 2, 3)
+    return np.stack((pairs[:, :, 0].min(axis=1), pairs[:, :, 1].max(axis=1),
+                     np.sqrt((pairs[:, :, 2] ** 2).mean(axis=1))), axis=1)
+
+
+@pytest.fixture(scope='module')
+def audio_clip(clip):
+    # Long enough for several chunks and an odd number of peaks at some level
+    return clip(seconds=3, audio='stereo')
+
+
+def check_levels(waveform, samples):
+    count = -(-len(samples) // BASE_BIN)
+    assert waveform.counts[0] == count
+    padded = np.concatenate((samples, np.full(count * BASE_BIN - len(samples), np.nan, np.float32)))
+    blocks = padded.reshape(-1, BASE_BIN)
+    base = waveform.levels[0][:count]
+    assert np.allclose(base[:, 0], np.nanmin(blocks, axis=1), atol=1e-6)
+    assert np.allclose(base[:, 1], np.nanmax(blocks, axis=1), atol=1e-6)
+    # The last peak only covers the samples it has
+    assert np.allclose(base[:, 2], np.sqrt(np.nanmean(blocks ** 2, axis=1)), atol=1e-5)
+
+    expected = base
+    for level in range(1, MAX_LEVELS):
+        expected = fold(expected)
+        assert waveform.counts[level] == len(expected), f"level {level}"
+        assert np.allclose(waveform.levels[level][:len(expected)], expected, atol=1e-5), f"level {level}"
+    assert waveform.counts[-1] == 1
+
+
+def test_pyramid_folds_every_level(audio_clip):
+    waveform = finished(audio_clip)
+    assert waveform.sample_rate == 48000
+    check_levels(waveform, mono_samples(audio_clip))
+
+
+def test_sidecar_gives_the_same_pyramid(audio_clip):
+    sidecar = waveform_path_for(audio_clip)
+    if os.path.exists(sidecar):
+        os.remove(sidecar)
+    built = finished(audio_clip)
+    assert os.path.exists(sidecar)
+    loaded = finished(audio_clip)
+    assert loaded.counts == built.counts
+    assert (loaded.sample_rate, loaded.start_time) == (built.sample_rate, built.start_time)
+    for level, count in enumerate(built.counts):
+        assert np.array_equal(loaded.levels[level][:count], built.levels[level][:count]), f"level {level}"
+
+
+def test_peaks_per_column(audio_clip):
+    waveform = finished(audio_clip)
+    samples = mono_samples(audio_clip)
+    duration = len(samples) / waveform.sample_rate
+    low, high, rms = waveform.peaks(0.0, duration, 10)
+    assert len(low) == len(high) == len(rms) == 10
+    assert np.all(low <= high)
+    # A steady tone: every column holds whole cycles of it
+    peak = np.abs(samples[len(samples) // 4:]).max()
+    assert np.allclose(high, peak, atol=0.01)
+    assert np.allclose(low, -peak, atol=0.01)
+    assert np.allclose(rms, peak / np.sqrt(2), atol=0.01)
+
+    # Outside the audio there is nothing to draw
+    low, high, rms = waveform.peaks(-1.0, duration + 1.0, 20)
+    assert np.isnan(low[0]) and np.isnan(low[-1])
+    assert not np.isnan(low[10])
+
+
+def test_no_audio_finishes_empty(clip):
+    waveform = finished(clip())
+    assert waveform.peaks(0.0, 1.0, 10) is None
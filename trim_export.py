@@ -0,0 +1,447 @@
+import heapq
+import os
+import time
+from fractions import Fraction
+import av
+import numpy as np
+from decoder_options import open_video
+from decoding import decode_from
+from video_index import VideoIndex
+
+# Boundary frames are re-encoded close to visually lossless, they sit next to copied ones
+BOUNDARY_CRF = 16
+
+
+def trim_path_for(video_path, start, end):
+    root, ext = os.path.splitext(video_path)
+    return f"{root}.trim-{start:.2f}-{end:.2f}{ext or '.mp4'}"
+
+
+class TrimPlan:
+    """Which frames (rows of the index) of a trim get re-encoded and which get copied.
+
+    Frames [first, copy_start) and [copy_end, last) are decoded and re-encoded; packets
+    of [copy_start, copy_end) are copied as they are. Copying starts and stops only at
+    clean keyframes, ones no earlier frame follows in decode order, so the copied run
+    never refers to a frame outside it. When the in and out points are both on such
+    keyframes nothing is re-encoded.
+    """
+
+    def __init__(self, index, start, end):
+        tb = index.time_base
+        end = index.duration if end is None else min(end, index.duration)
+        self.first = int(np.searchsorted(index.pts, int(np.ceil(start / tb)), side='left'))
+        self.last = int(np.searchsorted(index.pts, int(np.ceil(end / tb)), side='left'))
+        keys = index.key_frames[(index.key_frames >= self.first) & (index.key_frames <= self.last)]
+        cuts = [int(k) for k in keys if self._clean(index, int(k))]
+        if self.last == len(index) and (not cuts or cuts[-1] != self.last):
+            cuts.append(self.last)
+        if len(cuts) >= 2:
+            self.copy_start, self.copy_end = cuts[0], cuts[-1]
+        else:
+            # No keyframe to copy from, the whole range is one partial GOP
+            self.copy_start = self.copy_end = self.last
+
+    @staticmethod
+    def _clean(index, key):
+        if key == 0:
+            return True
+        if key >= len(index):
+            return True
+        # Open GOP: frames shown before the keyframe but decoded after it reference it
+        return not np.any(index.dts[:key] > index.dts[key])
+
+    @property
+    def frames(self):
+        return self.last - self.first
+
+    @property
+    def copied(self):
+        return self.copy_end - self.copy_start
+
+    @property
+    def encoded(self):
+        return self.frames - self.copied
+
+
+def _nal_units(data):
+    """NAL units of an Annex B byte string, without their start codes"""
+    data = bytes(data)
+    units = []
+    begin = data.find(b'\x00\x00\x01')
+    while begin >= 0:
+        begin += 3
+        end = data.find(b'\x00\x00\x01', begin)
+        if end < 0:
+            units.append(data[begin:])
+            break
+        # A four byte start code leaves its first zero on the end of this unit
+        units.append(data[begin:end].rstrip(b'\x00'))
+        begin = end
+    return units
+
+
+def _read_ue(data, bit):
+    """Exp-Golomb unsigned value at bit offset bit, and the offset after it"""
+    zeros = 0
+    while not (data[bit // 8] >> (7 - bit % 8)) & 1:
+        zeros += 1
+        bit += 1
+    bit += 1
+    value = 0
+    for _ in range(zeros):
+        value = value << 1 | (data[bit // 8] >> (7 - bit % 8)) & 1
+        bit += 1
+    return (1 << zeros) - 1 + value, bit
+
+
+class _AvcConfig:
+    """The avcC record MP4 keeps H.264 parameter sets in (ISO 14496-15)"""
+
+    def __init__(self, extradata):
+        data = bytes(extradata)
+        self.header = data[:5]
+        self.length_size = (data[4] & 3) + 1
+        offset = 6
+        self.sps = []
+        for _ in range(data[5] & 0x1F):
+            size = int.from_bytes(data[offset:offset + 2], 'big')
+            self.sps.append(data[offset + 2:offset + 2 + size])
+            offset += 2 + size
+        self.pps = []
+        for _ in range(data[offset]):
+            size = int.from_bytes(data[offset + 1:offset + 3], 'big')
+            self.pps.append(data[offset + 3:offset + 3 + size])
+            offset += 2 + size
+        self.trailer = data[offset + 1:]
+
+    def ids(self):
+        # SPS id follows profile, constraints and level; a PPS starts with its own id
+        return ({_read_ue(sps, 32)[0] for sps in self.sps} |
+                {_read_ue(pps, 8)[0] for pps in self.pps})
+
+    def serialize(self):
+        out = bytearray(self.header)
+        out.append(0xE0 | len(self.sps))
+        for sps in self.sps:
+            out += len(sps).to_bytes(2, 'big') + sps
+        out.append(len(self.pps))
+        for pps in self.pps:
+            out += len(pps).to_bytes(2, 'big') + pps
+        return bytes(out + self.trailer)
+
+    def to_samples(self, annex_b):
+        """Annex B packet data as length-prefixed NAL units, dropping parameter sets
+        (they live in the avcC)"""
+        out = bytearray()
+        for unit in _nal_units(annex_b):
+            if unit and unit[0] & 0x1F not in (7, 8):
+                out += len(unit).to_bytes(self.length_size, 'big') + unit
+        return bytes(out)
+
+
+class _BoundaryEncoder:
+    """libx264 set up to produce GOPs that can sit in the same track as the source's.
+
+    Its SPS and PPS get an id the source doesn't use and are added to the track's avcC
+    alongside the source's, so copied and re-encoded packets each find their own. One
+    encoder serves both ends: zerolatency gives a packet per frame straight away, no
+    B-frames keeps DTS equal to PTS, and each end starts with a forced IDR.
+    """
+
+    def __init__(self, stream, config):
+        free = sorted(set(range(32)) - config.ids())
+        if not free:
+            raise ValueError("Source uses every SPS id, there is none left for re-encoded frames")
+        source = stream.codec_context
+        codec = av.CodecContext.create('libx264', 'w')
+        codec.width = source.width
+        codec.height = source.height
+        codec.pix_fmt = source.pix_fmt
+        codec.time_base = stream.time_base
+        codec.framerate = stream.guessed_rate or 30
+        if source.sample_aspect_ratio:
+            codec.sample_aspect_ratio = source.sample_aspect_ratio
+        codec.colorspace = source.colorspace
+        codec.color_range = source.color_range
+        codec.color_primaries = source.color_primaries
+        codec.color_trc = source.color_trc
+        codec.max_b_frames = 0
+        codec.gop_size = 1 << 30
+        codec.flags |= av.codec.context.Flags.global_header
+        codec.options = {'preset': 'veryfast', 'tune': 'zerolatency', 'crf': str(BOUNDARY_CRF),
+                         'forced-idr': '1', 'x264-params': f'sps-id={free[-1]}'}
+        codec.open()
+        self.codec = codec
+        self.config = config
+        for unit in _nal_units(codec.extradata):
+            if unit[0] & 0x1F == 7:
+                config.sps.append(unit)
+            elif unit[0] & 0x1F == 8:
+                config.pps.append(unit)
+
+    def encode(self, frame, idr=False):
+        frame.pict_type = av.video.frame.PictureType.I if idr else av.video.frame.PictureType.NONE
+        return self.codec.encode(frame)
+
+
+def _video_packets(video_path, out_stream, index, plan, encoder, origin, decoder_options):
+    """Output video packets in DTS order: re-encoded head, copied middle, re-encoded tail"""
+    container = open_video(video_path, decoder_options)
+    try:
+        stream = container.streams.video[0]
+        tb = stream.time_base
+
+        def reencode(first, last, dts_offset):
+            # DTS sits dts_offset before PTS, the same distance as at the keyframe the
+            # next copied run starts from, so decode order stays increasing across joins
+            if first == last:
+                return
+            wanted = first
+            for frame in decode_from(container, stream, index, first):
+                n = int(np.searchsorted(index.pts, frame.pts, side='left'))
+                if n != wanted:
+                    continue
+                frame.pts = int(index.pts[n])
+                frame.time_base = tb
+                for packet in encoder.encode(frame, idr=n == first):
+                    yield _repack(packet, encoder, out_stream, origin, dts_offset)
+                wanted += 1
+                if wanted == last:
+                    break
+            if wanted != last:
+                raise RuntimeError(f"Decoded {wanted - first} of {last - first} boundary frames")
+
+        copy_dts_offset = 0
+        if plan.copied:
+            copy_dts_offset = int(index.pts[plan.copy_start] - index.dts[plan.copy_start])
+        yield from reencode(plan.first, plan.copy_start, copy_dts_offset)
+
+        if plan.copied:
+            start_dts = int(index.dts[plan.copy_start])
+            end_dts = int(index.dts[plan.copy_end]) if plan.copy_end < len(index) else None
+            container.seek(start_dts, stream=stream)
+            for packet in container.demux(stream):
+                if packet.dts is None or packet.dts < start_dts:
+                    continue
+                if end_dts is not None and packet.dts >= end_dts:
+                    break
+                packet.stream = out_stream
+                packet.pts -= origin
+                packet.dts -= origin
+                yield packet
+
+        if plan.copy_end < plan.last:
+            tail_dts_offset = int(index.pts[plan.copy_end] - index.dts[plan.copy_end])
+            yield from reencode(plan.copy_end, plan.last, tail_dts_offset)
+    finally:
+        container.close()
+
+
+def _repack(packet, encoder, out_stream, origin, dts_offset):
+    repacked = av.Packet(encoder.config.to_samples(packet))
+    repacked.pts = packet.pts - origin
+    repacked.dts = packet.pts - origin - dts_offset
+    repacked.time_base = packet.time_base
+    repacked.is_keyframe = packet.is_keyframe
+    repacked.stream = out_stream
+    return repacked
+
+
+def _audio_packets(video_path, out_stream, start, end):
+    """Audio of [start, end) cut to the sample and re-encoded. AAC and most other audio
+    codecs can't be cut between packets without it, and audio is cheap to encode."""
+    container = av.open(video_path)
+    try:
+        stream = container.streams.audio[0]
+        rate = stream.rate
+        first_sample = round(start * rate)
+        end_sample = round(end * rate)
+        container.seek(int(start / stream.time_base), stream=stream)
+        written = 0
+        for frame in container.decode(stream):
+            if frame.pts is None:
+                continue
+            frame_start = round(frame.pts * frame.time_base * rate)
+            if frame_start >= end_sample:
+                break
+            a = max(first_sample - frame_start, 0)
+            b = min(end_sample - frame_start, frame.samples)
+            if b <= a:
+                continue
+            samples = frame.to_ndarray()
+            if frame.format.is_planar:
+                samples = samples[:, a:b]
+            else:
+                samples = samples[:, a * len(frame.layout.channels):b * len(frame.layout.channels)]
+            cut = av.AudioFrame.from_ndarray(np.ascontiguousarray(samples), format=frame.format.name,
+                                             layout=frame.layout.name)
+            cut.sample_rate = rate
+            cut.pts = written
+            cut.time_base = Fraction(1, rate)
+            written += b - a
+            yield from out_stream.encode(cut)
+        yield from out_stream.encode(None)
+    finally:
+        container.close()
+
+
+def _packet_time(packet):
+    return packet.dts * packet.time_base
+
+
+def _add_audio_stream(output, audio):
+    out_audio = output.add_stream('aac', rate=audio.rate)
+    out_audio.layout = audio.layout.name
+    out_audio.bit_rate = audio.bit_rate or 192000
+    return out_audio
+
+
+def _write(out_path, write):
+    """Run write(output) on a temporary file and move it into place only if it finished"""
+    root, ext = os.path.splitext(out_path)
+    tmp_path = f"{root}.tmp{ext}"
+    completed = False
+    output = av.open(tmp_path, 'w')
+    try:
+        write(output)
+        completed = True
+    finally:
+        output.close()
+        if not completed and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    os.replace(tmp_path, out_path)
+
+
+def export_trim(video_path, out_path, start, end=None, decoder_options=None):
+    """Write [start, end) seconds of video_path to out_path, re-encoding as little as
+    possible, and return the TrimPlan it followed.
+
+    H.264 from MP4, MOV or Matroska only has the partial GOPs at each end re-encoded,
+    see TrimPlan. Other video is copied when both points land on clean keyframes and
+    re-encoded whole with libx264 otherwise. Audio is re-encoded, cut to the sample.
+    """
+    index = VideoIndex.open(video_path)
+    plan = TrimPlan(index, start, end)
+    if plan.frames <= 0:
+        raise ValueError(f"No frames between {start:.2f} s and {end} s")
+    with av.open(video_path) as probe:
+        video = probe.streams.video[0]
+        extradata = video.codec_context.extradata
+        # avcC extradata means length-prefixed packets, which is what this knows how to join
+        smart = video.codec_context.name == 'h264' and extradata is not None and extradata[:1] == b'\x01'
+        if plan.encoded and not smart:
+            print(f"Can't re-encode only part of a {video.codec_context.name} stream, "
+                  f"re-encoding all of it")
+            transcode_trim(video_path, out_path, start, end, decoder_options)
+            plan.copy_start = plan.copy_end = plan.last
+            return plan
+
+        origin = int(index.pts[plan.first])
+        start_time = float(origin * index.time_base)
+        end_time = index.time_of(plan.last) if plan.last < len(index) else index.duration
+
+        def write(output):
+            out_video = output.add_stream_from_template(video)
+            out_video.time_base = video.time_base
+            # PyAV opens an encoder on template streams when the header is written, and
+            # with a global header it would replace the extradata with its own
+            out_video.codec_context.flags &= ~av.codec.context.Flags.global_header
+            encoder = None
+            if plan.encoded:
+                config = _AvcConfig(extradata)
+                encoder = _BoundaryEncoder(video, config)
+                out_video.codec_context.extradata = config.serialize()
+            sources = [_video_packets(video_path, out_video, index, plan, encoder, origin,
+                                      decoder_options)]
+            if probe.streams.audio:
+                out_audio = _add_audio_stream(output, probe.streams.audio[0])
+                sources.append(_audio_packets(video_path, out_audio, start_time, end_time))
+            # Each source is in decode order, merging them interleaves the file
+            for packet in heapq.merge(*sources, key=_packet_time):
+                output.mux(packet)
+
+        _write(out_path, write)
+    return plan
+
+
+def transcode_trim(video_path, out_path, start, end=None, decoder_options=None):
+    """[start, end) with every frame re-encoded: the fallback, and what export_trim is
+    measured against"""
+    index = VideoIndex.open(video_path)
+    plan = TrimPlan(index, start, end)
+    if plan.frames <= 0:
+        raise ValueError(f"No frames between {start:.2f} s and {end} s")
+    origin = int(index.pts[plan.first])
+    start_time = float(origin * index.time_base)
+    end_time = index.time_of(plan.last) if plan.last < len(index) else index.duration
+    container = open_video(video_path, decoder_options)
+    try:
+        video = container.streams.video[0]
+
+        def encode_video(out_video):
+            wanted = plan.first
+            for frame in decode_from(container, video, index, plan.first):
+                n = int(np.searchsorted(index.pts, frame.pts, side='left'))
+                if n != wanted:
+                    continue
+                frame.pts = int(index.pts[n]) - origin
+                yield from out_video.encode(frame)
+                wanted += 1
+                if wanted == plan.last:
+                    break
+            yield from out_video.encode(None)
+
+        def write(output):
+            out_video = output.add_stream('libx264', rate=video.guessed_rate or 30)
+            out_video.width = video.width
+            out_video.height = video.height
+            out_video.pix_fmt = video.codec_context.pix_fmt
+            out_video.time_base = video.time_base
+            out_video.options = {'preset': 'veryfast', 'crf': str(BOUNDARY_CRF)}
+            sources = [encode_video(out_video)]
+            if container.streams.audio:
+                out_audio = _add_audio_stream(output, container.streams.audio[0])
+                sources.append(_audio_packets(video_path, out_audio, start_time, end_time))
+            for packet in heapq.merge(*sources, key=_packet_time):
+                output.mux(packet)
+
+        _write(out_path, write)
+    finally:
+        container.close()
+    return plan
+
+
+def main():
+    """Trim a video, then time the same trim fully re-encoded for comparison:
+
+        python trim_export.py video.mp4 --start 3.2 --end 10.5 [--out clip.mp4] [--compare]
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('video')
+    parser.add_argument('--start', type=float, default=0.0)
+    parser.add_argument('--end', type=float, default=None)
+    parser.add_argument('--out', default=None)
+    parser.add_argument('--compare', action='store_true')
+    args = parser.parse_args()
+    end = args.end if args.end is not None else VideoIndex.open(args.video).duration
+    out_path = args.out or trim_path_for(args.video, args.start, end)
+
+    started = time.perf_counter()
+    plan = export_trim(args.video, out_path, args.start, end)
+    seconds = time.perf_counter() - started
+    print(f"Wrote {out_path}: {plan.frames} frames, {plan.copied} copied, "
+          f"{plan.encoded} re-encoded, in {seconds:.2f} s")
+    if args.compare:
+        root, ext = os.path.splitext(out_path)
+        started = time.perf_counter()
+        transcode_trim(args.video, f"{root}.transcoded{ext}", args.start, end)
+        transcode_seconds = time.perf_counter() - started
+        print(f"Full transcode {transcode_seconds:.2f} s, export took "
+              f"{seconds / transcode_seconds:.0%} of that")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,64 +1,105 @@
-import av
+import math
+import os
+import time
+# Start of the clock for time-to-first-frame, before the heavy imports below
+PROCESS_START = time.perf_counter()
 from imgui_bundle import imgui, hello_imgui
-import OpenGL.GL as gl
-import numpy as np
-import subprocess
-import json
-import sounddevice as sd
 import threading
-import queue
-import time
+from video_index import VideoIndex
+from decoding import decode_from
+from frame_cache import FrameCache
+from disk_frame_cache import DiskFrameCache
+from seek_worker import SeekWorker
+from frame_queue import FrameQueue
+from av_clock import MasterClock
+from audio_ring import AudioRingBuffer, decode_audio_into
+from gl_texture import StreamingTexture
+from gl_yuv import YUVTexture
+from planar_frame import PlanarFrame
+from decoder_options import DecoderOptions, open_video
+from audio_output import AudioOutput
+from frame_size import DisplaySize, convert_frame, stream_duration
+from filmstrip import Filmstrip
+from waveform import Waveform
+from frame_ring import FrameRing
+from proxy import ProxyReader, proxy_is_fresh, proxy_size, build_proxy
+from trim_export import export_trim, trim_path_for
+from pipeline_stats import PipelineStats
+from gop_cache import GopCache
+from playlist import Playlist, playlist_paths
+from rotation import rotated_uvs, snapped_rotation
+from video_grid import VideoGrid
+
+FILMSTRIP_HEIGHT = 40
+WAVEFORM_HEIGHT = 32
+# Pixels per waveform column
+WAVEFORM_COLUMN = 2
+# Events kept for --trace, about a minute of playback
+TRACE_EVENTS = 200000
+# Shuttle speeds J and L step through, and how often keyframe shuttling shows a new frame
+SHUTTLE_SPEEDS = (1.0, 2.0, 4.0, 8.0, 16.0)
+SHUTTLE_FPS = 12
 
-def check_side_data_ffprobe(filename):
-    cmd = [
-        'ffprobe',
-        '-v', 'quiet',
-        '-print_format', 'json',
-        '-show_streams',  # Changed from -show_frames to -show_streams
-        '-select_streams', 'v:0',
-        filename
-    ]
-    
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    data = json.loads(result.stdout)
-    
-    # Check streams for side_data_list
-    streams = data.get('streams', [])
-    for stream in streams:
-        if 'side_data_list' in stream:
-            return {
-                'has_side_data': True,
-                'side_data': stream['side_data_list']
-            }
-    
-    return {
-        'has_side_data': False,
-        'side_data': None
-    }
 
 class VideoPlayer:
-    def __init__(self, video_path):
+    def __init__(self, video_path, cache_bytes=512 * 1024 * 1024, cache_window=1.0,
+                 lookahead_frames=8, lookahead_bytes=None, audio_buffer_seconds=0.5,
+                 yuv_display=True, display_scaled=False, use_proxy=False, decoder_options=None,
+                 started_at=PROCESS_START, filmstrip=True, waveform=True, frame_ring=None,
+                 frame_ring_policy='drop_oldest', show_stats=False, trace_path=None, prepared=None,
+                 disk_cache_bytes=None, audio_output=None):
+        # Startup stages in seconds since started_at, reported with the first frame drawn
+        self.started_at = started_at
+        self.startup_times = {'init': time.perf_counter() - started_at}
+        self.time_to_first_frame = None
+        # Timings of every pipeline stage, shown over the video with F2. With trace_path
+        # the last TRACE_EVENTS of them are also written there as a Chrome trace on exit.
+        self.show_stats = show_stats
+        self.trace_path = trace_path
+        self.stats = PipelineStats(TRACE_EVENTS if trace_path else 0)
         self.video_path = video_path
-        side = check_side_data_ffprobe(video_path)
-        self.container = av.open(video_path)
+        # Every container this player decodes video from is opened with the same threading.
+        # A PreparedClip (see playlist.py) comes with it open and its first frames and
+        # audio decoded, which play() starts from while nothing else has moved it.
+        self.decoder_options = decoder_options or DecoderOptions()
+        if prepared is not None:
+            self.container, prepared.container = prepared.container, None
+        else:
+            self.container = open_video(video_path, self.decoder_options)
         self.stream = self.container.streams.video[0]
+        self._preroll = None
+        self._audio_preroll_end = None
         
         # Initialize audio components
         self.audio_stream = None
-        self.audio_queue = queue.Queue(maxsize=100)  # Increased buffer size further
+        self.audio_ring = None
         self.is_playing = False
+        # The output stream, shared when a playlist passes one in so it stays open
+        # between clips. audio_device is it while this player is feeding it.
+        self._owns_audio_output = audio_output is None
+        self.audio_output = audio_output or AudioOutput()
         self.audio_device = None
         
-        # Frame timing control
+        # Frame timing control: frames are shown when the master clock reaches their PTS.
+        # The decode thread skips converting frames already late_threshold behind it.
         self.frame_rate = float(self.stream.guessed_rate or self.stream.rate or 30)
         self.frame_interval = 1.0 / self.frame_rate
-        self.last_frame_time = 0
+        self.clock = MasterClock()
+        self.late_threshold = 2 * self.frame_interval
+        self.dropped_frames = 0
+        self.audio_eof = False
+        self.video_eof = False
         
-        # Frame buffer
+        # Frame buffer: the decode thread runs up to lookahead_frames (or lookahead_bytes) ahead
         self.current_frame = None
-        self.next_frame = None
-        self.next_frame_pts = None
-        self.frame_ready = False
+        self.frame_queue = FrameQueue(lookahead_frames, lookahead_bytes)
+        
+        # Decoded RGB frames around the playhead, keyed by PTS. Seeks decode the last
+        # cache_window seconds before their target into it so scrubbing back is free.
+        self.frame_cache = FrameCache(cache_bytes)
+        self.cache_window = cache_window
+        # False when the shown frame came from the cache and the decoder is elsewhere
+        self.decoder_synced = True
         
         # Try to get audio stream
         audio_streams = [s for s in self.container.streams if s.type == 'audio']
@@ -66,188 +107,839 @@ class VideoPlayer:
             self.audio_stream = audio_streams[0]
             self.audio_sample_rate = self.audio_stream.rate
             self.audio_channels = self.audio_stream.channels
+            # Anything beyond stereo gets downmixed by the resampler
+            self.audio_out_channels = 2 if self.audio_channels >= 2 else 1
+            if prepared is not None and prepared.audio_ring is not None:
+                self.audio_ring = prepared.audio_ring
+                self._audio_preroll_end = prepared.audio_preroll_end
+            else:
+                self.audio_ring = AudioRingBuffer(int(self.audio_sample_rate * audio_buffer_seconds),
+                                                  self.audio_out_channels)
             print(f"Audio: {self.audio_channels} channels @ {self.audio_sample_rate}Hz")
             
-        self.duration = float(self.stream.duration * self.stream.time_base)
+        # Packet index for keyframe-accurate seeking, cached next to the video. Building
+        # one reads the whole file, so that happens in the background and seeks wait for it.
+        self.index = prepared.index if prepared is not None and prepared.index is not None \
+            else VideoIndex.load(video_path)
+        self.index_ready = threading.Event()
+        self.duration = stream_duration(self.container, self.stream)
+        if not self.duration and self.index is not None:
+            self.duration = self.index.duration
+        if self.index is None:
+            self.index_thread = threading.Thread(target=self._index_build_thread)
+            self.index_thread.daemon = True
+            self.index_thread.start()
+        else:
+            self.index_ready.set()
         self.current_time = 0.0
-        self.texture_id = gl.glGenTextures(1)
-        self.video_path = video_path
-        self.original_width = self.stream.width
-        self.original_height = self.stream.height
-        # Initialize video dimensions and rotation
-        self._init_video_dimensions()
-        self.rotation = 0
-        if side['has_side_data']:
+        # Texture storage is allocated once and refreshed through PBOs, see StreamingTexture.
+        # With yuv_display the decoder's planes are uploaded as-is and a shader converts
+        # them, which skips the CPU rgb24 conversion and halves what gets uploaded.
+        self.yuv_display = yuv_display
+        self.texture = None
+        if self.yuv_display:
             try:
-                for side_data in side['side_data']:
-                    if 'rotation' in side_data:
-                        self.rotation = side_data['rotation']
+                self.texture = YUVTexture()
             except Exception as e:
-                print(f"Error reading side data: {e}")
-                
-        if self.rotation in [90, 270, -90]:
-            self.frame_width = self.original_height
-            self.frame_height = self.original_width
-        else:
-            self.frame_width = self.original_width
-            self.frame_height = self.original_height
+                print(f"YUV display unavailable, using RGB: {e}")
+                self.yuv_display = False
+        if self.texture is None:
+            self.texture = StreamingTexture()
+        self.texture_id = self.texture.texture_id
+        
+        # Opt-in cache of full resolution frames on disk, kept across sessions and shared
+        # with other videos up to disk_cache_bytes. Seeks to frames in it skip decoding.
+        self.disk_cache = None
+        if disk_cache_bytes:
+            try:
+                self.disk_cache = DiskFrameCache(video_path, 'yuv420p' if self.yuv_display else 'rgb24',
+                                                 self.stream.width, self.stream.height, disk_cache_bytes)
+            except Exception as e:
+                print(f"Disk frame cache unavailable: {e}")
+        self.video_path = video_path
+        
+        # With display_scaled, playback converts frames straight to the size they are drawn
+        # at (decode_size, unrotated) and follows window resizes. Seeks while paused
+        # still decode full resolution. Reverse playback is always at screen_size, the
+        # same size whether or not display_scaled is set.
+        self.display_scaled = display_scaled
+        self.decode_size = None
+        self.screen_size = None
+        self._display_size = DisplaySize(self.stream.width, self.stream.height)
+        
+        # Low resolution copy of the video for scrubbing, built in the background if missing
+        self.proxy = None
+        self.proxy_thread = None
+        self._closing = False
+        if use_proxy:
+            if proxy_is_fresh(video_path):
+                self._open_proxy()
+            elif proxy_size(self.stream.width, self.stream.height) is not None:
+                self.proxy_thread = threading.Thread(target=self._proxy_build_thread)
+                self.proxy_thread.daemon = True
+                self.proxy_thread.start()
             
-        # Get first frame
-        for frame in self.container.decode(video=0):
-            self.current_frame = frame.to_ndarray(format='rgb24')
-            self.frame_width = frame.width
-            self.frame_height = frame.height
-            break
+        self.startup_times['open'] = time.perf_counter() - started_at
+            
+        # Get first frame, which also carries the display matrix
+        rotation = 0
+        if prepared is not None and prepared.frames and \
+                isinstance(prepared.frames[0][1], PlanarFrame) == self.yuv_display:
+            self._preroll = prepared.frames
+            for pts, converted in self._preroll:
+                self.frame_cache.put(pts, converted)
+            self.current_frame = self._preroll[0][1]
+            rotation = self._get_rotation(prepared.first_frame)
+        else:
+            if prepared is not None:
+                # Frames for the other kind of texture, start over
+                self.container.seek(0, stream=self.stream)
+            for frame in self.container.decode(video=0):
+                self.current_frame = self._convert_frame(frame)
+                if frame.pts is not None:
+                    self.frame_cache.put(frame.pts, self.current_frame)
+                rotation = self._get_rotation(frame)
+                break
+        self.startup_times['decode'] = time.perf_counter() - started_at
             
+        # Initialize video dimensions and rotation, read once here and used only for drawing
+        self._init_video_dimensions(rotation)
         self._update_texture()
+        self.startup_times['upload'] = time.perf_counter() - started_at
+        self.seek_worker = SeekWorker(self)
+        
+        # Frames played get published to other processes through shared memory when
+        # frame_ring names a ring, and boxes they post back are drawn over those frames
+        self.frame_ring = None
+        if frame_ring is not None:
+            self.frame_ring = FrameRing.create(frame_ring, max_shape=(self.stream.height, self.stream.width, 3),
+                                               policy=frame_ring_policy)
+            print(f"Publishing frames to shared memory ring {self.frame_ring.name}")
+        
+        # Keyframe thumbnails under the slider, decoded in the background after the first frame
+        self.filmstrip = None
+        self.filmstrip_texture = None
+        self._filmstrip_version = 0
+        self._filmstrip_uploaded_at = 0.0
+        if filmstrip:
+            self.filmstrip = Filmstrip(video_path, decoder_options=self.decoder_options)
+        
+        # Audio peaks under the slider, read in the background. waveform_view is the
+        # (start, end) zoomed into, None for the whole video.
+        self.waveform = None
+        self.waveform_view = None
+        if waveform and self.audio_stream is not None:
+            self.waveform = Waveform(video_path)
+        
+        # In and out points for export; out_point None means the end of the video.
+        # Exports run in the background and report through export_status.
+        self.in_point = 0.0
+        self.out_point = None
+        self.export_thread = None
+        self.export_status = ""
+        
+        # Frame stepping and reverse playback show frames out of whole decoded GOPs (see
+        # GopCache), set up once the index is ready. Reverse playback runs while
+        # reverse_speed > 0, on the monotonic clock from where it started and without audio.
+        self.gop_cache = None
+        self._step_target = None
+        self.reverse_speed = 0.0
+        self._shuttle_from = 0.0
+        self._shuttle_started = 0.0
+        # Shuttle playback (J/K/L). Forward play runs at playback_speed, skipping
+        # non-reference frames when faster than 1x. From 4x either way keyframe_speed
+        # is set and the seek worker fetches keyframes SHUTTLE_FPS times a second.
+        self.playback_speed = 1.0
+        self.keyframe_speed = 0.0
+        self._shuttle_key = None
+        self._shuttle_next_tick = 0.0
         
     def seek_frame(self, timestamp):
+        """Seek synchronously on the calling thread, which must own the GL context"""
         try:
-            # Allow seeking all the way to the end, but be extra careful
-            timestamp = max(0, min(timestamp, self.duration))
-            is_seeking_end = timestamp >= self.duration - 0.1  # Flag for end-seeking
-            
-            # Reopen the container
-            self.container = av.open(self.video_path)
-            self.stream = self.container.streams.video[0]
-            
-            # If we're seeking to the end, use a special approach
-            if is_seeking_end:
-                # Seek close to the end first
-                self.container.seek(int((self.duration - 1.0) / self.stream.time_base), stream=self.stream)
-                # Keep the last frame we see
-                last_frame = None
-                for frame in self.container.decode(video=0):
-                    last_frame = frame
-                if last_frame:
-                    self.current_frame = last_frame.to_ndarray(format='rgb24')
-                    self._update_texture()
-                    self.current_time = self.duration
-                return
-                
-            # Normal seeking for all other cases
-            seek_pts = int(timestamp / self.stream.time_base)
-            self.container.seek(seek_pts, stream=self.stream)
-            
-            # Decode frames until we get the exact frame we want
-            for frame in self.container.decode(video=0):
-                frame_ts = float(frame.pts * self.stream.time_base)
-                if abs(frame_ts - timestamp) < self.stream.time_base:
-                    self.current_frame = frame.to_ndarray(format='rgb24')
-                    self._update_texture()
-                    self.current_time = frame_ts
-                    break
-                elif frame_ts > timestamp:
-                    self.current_frame = frame.to_ndarray(format='rgb24')
-                    self._update_texture()
-                    self.current_time = frame_ts
-                    break
-                
+            pts, rgb = self._seek_decode(timestamp)
+            if rgb is not None:
+                self.current_frame = rgb
+                self._update_texture()
+                self.current_time = float(pts * self.stream.time_base)
         except Exception as e:
             print(f"Seek error: {e}")
 
-    def _init_video_dimensions(self):
+    def _seek_decode(self, timestamp, should_cancel=None, on_preview=None, scrub=False):
+        """Find the frame on screen at timestamp, from the cache or by decoding.
+        
+        No GL calls, so this can run on the seek worker. Returns (pts, rgb), or
+        (None, None) if should_cancel() turned true part way through. Scrub seeks
+        come from the proxy when there is one and take cached frames at any size;
+        the rest are full resolution.
+        """
+        self.index_ready.wait()
+        timestamp = max(0, min(timestamp, self.duration))
+        if len(self.index) == 0:
+            return None, None
+        # Map the time onto a real frame, so VFR files and the very last frame land exactly
+        target = self.index.frame_at_time(timestamp)
+        target_pts = int(self.index.pts[target])
+        
+        if self.disk_cache is not None:
+            # Only ever holds full resolution frames, which serve any seek like the
+            # memory cache's below
+            stored = self.disk_cache.get(target)
+            if stored is not None and (scrub or self._is_full_res(stored)):
+                self.decoder_synced = False
+                return target_pts, stored
+        
+        if scrub and self.proxy is not None:
+            frame = self.proxy.decode_at(self.index.time_of(target), should_cancel)
+            if frame is None:
+                return None, None
+            # The shared container stays where it was, but the playhead moves
+            self.decoder_synced = False
+            return target_pts, self._convert_frame(frame)
+        
+        cached = self.frame_cache.get(target_pts)
+        if cached is not None and (scrub or self._is_full_res(cached)):
+            self.decoder_synced = False
+            return target_pts, cached
+        
+        cache_from_pts = target_pts - int(self.cache_window / self.stream.time_base)
+        frame_pts, rgb = self._decode_to(target, cache_from_pts, should_cancel, on_preview,
+                                         full_res=not scrub)
+        self.decoder_synced = rgb is not None
+        return frame_pts, rgb
+
+    def _decode_to(self, target, cache_from_pts=None, should_cancel=None, on_preview=None,
+                   full_res=True):
+        """Seek the shared container to target's keyframe and decode up to that frame.
+        
+        Frames at or after cache_from_pts are converted and cached on the way, and
+        on_preview gets the keyframe first when it is not the target itself. Returns
+        (pts, rgb) for the target, where rgb is None if nothing was converted.
+        """
+        target_pts = int(self.index.pts[target])
+        first = True
+        # The container moves away from the end of the pre-roll
+        self._preroll = None
+        # Decode forward from the keyframe only as far as the frame we want
+        for frame in decode_from(self.container, self.stream, self.index, target):
+            if should_cancel is not None and should_cancel():
+                return None, None
+            rgb = None
+            if cache_from_pts is not None and frame.pts >= cache_from_pts:
+                rgb = self._convert_frame(frame, full_res)
+                self._cache_frame(frame.pts, rgb)
+            if frame.pts >= target_pts:
+                return frame.pts, rgb
+            if first and on_preview is not None:
+                if rgb is None:
+                    rgb = self._convert_frame(frame, full_res)
+                    self._cache_frame(frame.pts, rgb)
+                on_preview(frame.pts, rgb)
+            first = False
+        return None, None
+
+    def _convert_frame(self, frame, full_res=True, size=None):
+        """Decoded frame in whatever form self.texture uploads, scaled to size (by default
+        decode_size) during the conversion unless full_res"""
+        start = time.perf_counter()
+        converted = convert_frame(frame, self.yuv_display, None if full_res else size or self.decode_size)
+        self.stats.record('convert', start)
+        return converted
+    
+    def _cache_frame(self, pts, rgb):
+        """Keep a frame converted for a seek or scrub in memory, and on disk as well with
+        a disk cache if it is full resolution. Playback only caches in memory."""
+        self.frame_cache.put(pts, rgb)
+        if self.disk_cache is not None and self.index_ready.is_set() and self._is_full_res(rgb):
+            frame_number = self.index.frame_number(pts)
+            if frame_number is not None:
+                self.disk_cache.put(frame_number, rgb)
+    
+    def _is_full_res(self, frame):
+        return frame.shape[:2] == (self.original_height, self.original_width)
+    
+    def _update_decode_size(self, width, height):
+        """Follow the on-screen size of the video, once a resize has settled"""
+        size = self._display_size.update(width, height, self.rotation)
+        if size != self.screen_size:
+            # Picked up by the next conversion, the textures reallocate when frames change size
+            self.screen_size = size
+            if self.display_scaled:
+                self.decode_size = size
+    
+    def _open_proxy(self):
+        try:
+            self.proxy = ProxyReader(self.video_path, self.decoder_options)
+        except Exception as e:
+            print(f"Error opening proxy: {e}")
+    
+    def _proxy_build_thread(self):
+        try:
+            if build_proxy(self.video_path, should_cancel=lambda: self._closing,
+                           decoder_options=self.decoder_options):
+                self._open_proxy()
+        except Exception as e:
+            print(f"Proxy build error: {e}")
+
+    def _apply_seek_result(self):
+        """Show whatever the seek worker has finished since the last call"""
+        result = self.seek_worker.take_result()
+        if result is not None:
+            timestamp, rgb, exact = result
+            self.current_frame = rgb
+            self._update_texture()
+            # Previews leave the slider where the user put it
+            if exact:
+                self.current_time = timestamp
+
+    def _init_video_dimensions(self, rotation):
         self.original_width = self.stream.width
         self.original_height = self.stream.height
-        self.rotation = self._get_rotation()
+        self.rotation = rotation
         
-        if self.rotation in [90, 270, -90]:
-            self.frame_width = self.original_height
-            self.frame_height = self.original_width
+        # Frames are decoded and uploaded as they are, only the quad they are drawn on turns
+        self.frame_width = self.original_width
+        self.frame_height = self.original_height
+        if self.rotation in (90, 270):
+            self.display_width = self.original_height
+            self.display_height = self.original_width
         else:
-            self.frame_width = self.original_width
-            self.frame_height = self.original_height
+            self.display_width = self.original_width
+            self.display_height = self.original_height
+        self.rotation_uvs = rotated_uvs(self.rotation)
 
-    def _get_rotation(self):
+    def _get_rotation(self, frame):
+        return snapped_rotation(frame)
+    
+    def _update_filmstrip_texture(self):
+        """Upload the atlas again when the filmstrip has new thumbnails, a few times a
+        second at most while it is still filling"""
+        filmstrip = self.filmstrip
+        if filmstrip.atlas is None or filmstrip.version == self._filmstrip_version:
+            return
+        now = time.monotonic()
+        if not filmstrip.done and now - self._filmstrip_uploaded_at < 0.25:
+            return
+        if self.filmstrip_texture is None:
+            self.filmstrip_texture = StreamingTexture()
+        version = filmstrip.version
+        self.filmstrip_texture.upload(filmstrip.atlas)
+        self._filmstrip_version = version
+        self._filmstrip_uploaded_at = now
+    
+    def _draw_filmstrip(self, x, width):
+        """Thumbnails across [x, x + width], each showing the keyframe at or before the
+        time under it. Hovering previews from the atlas, clicking seeks."""
+        self._update_filmstrip_texture()
+        filmstrip = self.filmstrip
+        imgui.set_cursor_screen_pos(imgui.ImVec2(x, imgui.get_cursor_screen_pos().y))
+        pos = imgui.get_cursor_screen_pos()
+        clicked = imgui.invisible_button("##filmstrip", imgui.ImVec2(width, FILMSTRIP_HEIGHT))
+        if self.filmstrip_texture is None or self.duration <= 0:
+            return
+        
+        draw_list = imgui.get_window_draw_list()
+        cells = max(1, int(width / (FILMSTRIP_HEIGHT * self.display_width / self.display_height)))
+        cell_width = width / cells
+        for i in range(cells):
+            slot = filmstrip.thumb_for((i + 0.5) * self.duration / cells)
+            if slot is None:
+                break
+            left = pos.x + i * cell_width
+            draw_list.add_image_quad(
+                self.filmstrip_texture.texture_id,
+                imgui.ImVec2(left, pos.y),
+                imgui.ImVec2(left + cell_width, pos.y),
+                imgui.ImVec2(left + cell_width, pos.y + FILMSTRIP_HEIGHT),
+                imgui.ImVec2(left, pos.y + FILMSTRIP_HEIGHT),
+                *rotated_uvs(self.rotation, *filmstrip.uv_rect(slot))
+            )
+        playhead = pos.x + width * self.current_time / self.duration
+        draw_list.add_line(imgui.ImVec2(playhead, pos.y), imgui.ImVec2(playhead, pos.y + FILMSTRIP_HEIGHT),
+                           imgui.get_color_u32(imgui.ImVec4(1, 1, 1, 1)), 2.0)
+        
+        if imgui.is_item_hovered():
+            fraction = (imgui.get_io().mouse_pos.x - pos.x) / width
+            timestamp = max(0.0, min(fraction, 1.0)) * self.duration
+            slot = filmstrip.thumb_for(timestamp)
+            if slot is not None:
+                # Straight from the atlas texture, nothing is decoded for the preview
+                imgui.begin_tooltip()
+                imgui.text(f"{timestamp:.2f} s")
+                preview = imgui.get_cursor_screen_pos()
+                preview_height = 3 * FILMSTRIP_HEIGHT
+                preview_width = preview_height * self.display_width / self.display_height
+                imgui.dummy(imgui.ImVec2(preview_width, preview_height))
+                imgui.get_window_draw_list().add_image_quad(
+                    self.filmstrip_texture.texture_id,
+                    preview,
+                    imgui.ImVec2(preview.x + preview_width, preview.y),
+                    imgui.ImVec2(preview.x + preview_width, preview.y + preview_height),
+                    imgui.ImVec2(preview.x, preview.y + preview_height),
+                    *rotated_uvs(self.rotation, *filmstrip.uv_rect(slot))
+                )
+                imgui.end_tooltip()
+            if clicked:
+                self.pause()
+                self.current_time = timestamp
+                self.seek_worker.request(timestamp)
+    
+    def _draw_waveform(self, x, width):
+        """Min/max and RMS of the audio across [x, x + width], straight from the peak
+        pyramid. The wheel zooms around the pointer, a right click zooms back out to the
+        whole video and a left click seeks. While playing, the view pages along."""
+        imgui.set_cursor_screen_pos(imgui.ImVec2(x, imgui.get_cursor_screen_pos().y))
+        pos = imgui.get_cursor_screen_pos()
+        clicked = imgui.invisible_button("##waveform", imgui.ImVec2(width, WAVEFORM_HEIGHT))
+        if self.duration <= 0:
+            return
+        waveform = self.waveform
+        columns = max(1, int(width / WAVEFORM_COLUMN))
+        start, end = self.waveform_view or (0.0, self.duration)
+        
+        if imgui.is_item_hovered():
+            fraction = max(0.0, min((imgui.get_io().mouse_pos.x - pos.x) / width, 1.0))
+            pointer = start + fraction * (end - start)
+            imgui.set_tooltip(f"{pointer:.3f} s")
+            wheel = imgui.get_io().mouse_wheel
+            if wheel:
+                # No further in than one of the finest peaks per column
+                span = (end - start) * 0.8 ** wheel
+                span = min(max(span, columns * waveform.peak_seconds), self.duration)
+                start = max(0.0, min(pointer - fraction * span, self.duration - span))
+                end = start + span
+                self.waveform_view = None if span >= self.duration else (start, end)
+            if imgui.is_item_clicked(imgui.MouseButton_.right):
+                self.waveform_view = None
+                start, end = 0.0, self.duration
+            if clicked:
+                self.pause()
+                self.current_time = pointer
+                self.seek_worker.request(pointer)
+        elif self.is_playing and self.waveform_view is not None and not start <= self.current_time < end:
+            span = end - start
+            start = max(0.0, min(self.current_time, self.duration - span))
+            end = start + span
+            self.waveform_view = (start, end)
+        
+        draw_list = imgui.get_window_draw_list()
+        draw_list.add_rect_filled(pos, imgui.ImVec2(pos.x + width, pos.y + WAVEFORM_HEIGHT),
+                                  imgui.get_color_u32(imgui.ImVec4(0.0, 0.0, 0.0, 0.35)))
+        peaks = waveform.peaks(start, end, columns)
+        if peaks is not None:
+            peak_color = imgui.get_color_u32(imgui.ImVec4(0.3, 0.6, 1.0, 0.6))
+            rms_color = imgui.get_color_u32(imgui.ImVec4(0.5, 0.8, 1.0, 1.0))
+            middle = pos.y + WAVEFORM_HEIGHT / 2
+            scale = WAVEFORM_HEIGHT / 2
+            column_width = width / columns
+            for i, (low, high, rms) in enumerate(zip(*(values.tolist() for values in peaks))):
+                if math.isnan(high):
+                    continue
+                left = pos.x + i * column_width
+                right = left + column_width
+                draw_list.add_rect_filled(imgui.ImVec2(left, middle - min(high, 1.0) * scale),
+                                          imgui.ImVec2(right, middle - max(low, -1.0) * scale + 1),
+                                          peak_color)
+                draw_list.add_rect_filled(imgui.ImVec2(left, middle - min(rms, 1.0) * scale),
+                                          imgui.ImVec2(right, middle + min(rms, 1.0) * scale),
+                                          rms_color)
+        if start <= self.current_time <= end:
+            playhead = pos.x + width * (self.current_time - start) / (end - start)
+            draw_list.add_line(imgui.ImVec2(playhead, pos.y), imgui.ImVec2(playhead, pos.y + WAVEFORM_HEIGHT),
+                               imgui.get_color_u32(imgui.ImVec4(1, 1, 1, 1)), 2.0)
+    
+    def _draw_overlays(self, pos, width, height):
+        """Boxes consumers posted for the frame on screen, or for one shortly before it"""
+        pts = int(round(self.current_time / self.stream.time_base))
+        max_lag = int(2 * self.frame_interval / self.stream.time_base)
+        overlay = self.frame_ring.overlay_for(pts, max_lag)
+        if overlay is None:
+            return
+        # Boxes are in unrotated texture units, map them through the same corner UVs
+        # the frame is drawn with
+        a, b, _, d = self.rotation_uvs
+        def to_screen(u, v):
+            s = (u - a.x) * (b.x - a.x) + (v - a.y) * (b.y - a.y)
+            t = (u - a.x) * (d.x - a.x) + (v - a.y) * (d.y - a.y)
+            return pos.x + s * width, pos.y + t * height
+        draw_list = imgui.get_window_draw_list()
+        color = imgui.get_color_u32(imgui.ImVec4(0.2, 1.0, 0.3, 1.0))
+        for (x0, y0, x1, y1), score, label in zip(*overlay):
+            sx0, sy0 = to_screen(x0, y0)
+            sx1, sy1 = to_screen(x1, y1)
+            top_left = imgui.ImVec2(min(sx0, sx1), min(sy0, sy1))
+            draw_list.add_rect(top_left, imgui.ImVec2(max(sx0, sx1), max(sy0, sy1)), color, 0.0, 0, 2.0)
+            draw_list.add_text(top_left, color, f"{label} {score:.2f}")
+    
+    def _get_gop_cache(self):
+        if self.gop_cache is None:
+            if not self.index_ready.is_set() or len(self.index) == 0:
+                return None
+            self.gop_cache = GopCache(self.video_path, self.index, self._convert_gop_frame,
+                                      decoder_options=self.decoder_options, stats=self.stats)
+        return self.gop_cache
+    
+    def _convert_gop_frame(self, frame, full_res):
+        # GOPs for reverse playback are kept at the size they are shown
+        return self._convert_frame(frame, full_res, self.screen_size)
+    
+    def _show_frame(self, frame_number, rgb):
+        """Put a frame from the GOP cache on screen. The shared decoder stays where it was."""
+        self.current_frame = rgb
+        self._update_texture()
+        self.current_time = self.index.time_of(frame_number)
+        self.decoder_synced = False
+    
+    def step_frame(self, direction):
+        """Pause and show the next (direction 1) or previous (-1) frame"""
+        gop_cache = self._get_gop_cache()
+        if gop_cache is None:
+            return
+        if self.shuttle_speed:
+            self.pause()
+        # A seek still on its way would land after the step
+        self.seek_worker.take_result()
+        current = self._step_target
+        if current is None:
+            current = self.index.frame_at_time(self.current_time)
+        target = max(0, min(current + direction, len(self.index) - 1))
+        self._step_target = target
+        self._apply_step()
+        # Have the GOP the steps are heading into ready by the time they get there
+        first, end = gop_cache.gop_of(target)
+        ahead = end if direction > 0 else first - 1
+        if 0 <= ahead < len(self.index):
+            gop_cache.prefetch(ahead)
+    
+    def _apply_step(self):
+        """Show the frame stepped to once its GOP is decoded"""
+        rgb = self.gop_cache.get(self._step_target)
+        if rgb is not None:
+            self._show_frame(self._step_target, rgb)
+            self._step_target = None
+    
+    def play_reverse(self, speed=1.0):
+        """Play backwards from the current frame at speed times real time"""
+        gop_cache = self._get_gop_cache()
+        if gop_cache is None:
+            return
+        if self.is_playing:
+            self.pause()
+        self._step_target = None
+        self.seek_worker.take_result()
+        self.reverse_speed = speed
+        self._shuttle_from = self.current_time
+        self._shuttle_started = time.monotonic()
+        first, _ = gop_cache.gop_of(self.index.frame_at_time(self.current_time))
+        if first > 0:
+            gop_cache.prefetch(first - 1, full_res=False)
+    
+    def _advance_reverse(self):
+        """Show the frame reverse playback has reached, holding the one on screen while
+        the GOP it needs is still decoding"""
+        position = self._shuttle_from - self.reverse_speed * (time.monotonic() - self._shuttle_started)
+        target = self.index.frame_at_time(max(position, 0.0))
+        current = self.index.frame_at_time(self.current_time)
+        if target >= current:
+            if position <= 0:
+                self.reverse_speed = 0.0
+            return
+        rgb = self.gop_cache.get(target, full_res=False)
+        if rgb is None:
+            # Carry on from this frame once the GOP is in, rather than jumping ahead
+            self.stats.mark('reverse stall')
+            self._shuttle_from = self.current_time
+            self._shuttle_started = time.monotonic()
+            return
+        self._show_frame(target, rgb)
+        # The GOP before this one, decoded while this one plays out
+        first, _ = self.gop_cache.gop_of(target)
+        if first > 0:
+            self.gop_cache.prefetch(first - 1, full_res=False)
+    
+    @property
+    def shuttle_speed(self):
+        """Signed speed of whatever playback is running, 0 when paused"""
+        if self.keyframe_speed:
+            return self.keyframe_speed
+        if self.reverse_speed:
+            return -self.reverse_speed
+        return self.playback_speed if self.is_playing else 0.0
+    
+    def shuttle(self, speed):
+        """Play at speed times real time, backwards if negative. Only 1x forward has
+        sound. 2x forward skips non-reference frames, 4x and up either way shows
+        keyframes only, and reverse below that plays from decoded GOPs."""
+        if speed == self.shuttle_speed:
+            return
+        self.pause()
+        if speed == 0:
+            return
+        if abs(speed) >= 4:
+            if not self.index_ready.is_set() or len(self.index) == 0:
+                return
+            self.keyframe_speed = speed
+            self._shuttle_from = self.current_time
+            self._shuttle_started = time.monotonic()
+            self._shuttle_key = None
+            self._shuttle_next_tick = self._shuttle_started
+        elif speed > 0:
+            self.play(speed)
+        else:
+            self.play_reverse(-speed)
+    
+    def shuttle_key(self, direction):
+        """L (1) and J (-1): start at 1x that way, or go up a speed if already going
+        that way"""
+        speed = self.shuttle_speed * direction
+        faster = [s for s in SHUTTLE_SPEEDS if s > speed]
+        if speed <= 0:
+            self.shuttle(direction * SHUTTLE_SPEEDS[0])
+        elif faster:
+            self.shuttle(direction * faster[0])
+    
+    def pause_exact(self):
+        """Pause, then fetch the exact full resolution frame if what is on screen was
+        scaled for playback or only the nearest keyframe"""
+        approximate = self.decode_size is not None or self.keyframe_speed
+        self.pause()
+        if approximate:
+            self.seek_worker.request(self.current_time)
+    
+    def _advance_keyframe_shuttle(self):
+        """Ask the seek worker for the keyframe at the shuttle's position, on a steady
+        tick however fast the position moves. Requests it can't get to in time are
+        replaced by the next one rather than queued."""
+        now = time.monotonic()
+        if now < self._shuttle_next_tick:
+            return
+        interval = 1.0 / SHUTTLE_FPS
+        self._shuttle_next_tick += interval
+        if self._shuttle_next_tick < now:
+            self._shuttle_next_tick = now + interval
+        position = self._shuttle_from + self.keyframe_speed * (now - self._shuttle_started)
+        at_end = not 0 < position < self.duration
+        position = max(0.0, min(position, self.duration))
+        key = self.index.keyframe_for(self.index.frame_at_time(position))
+        if key != self._shuttle_key:
+            self._shuttle_key = key
+            self.seek_worker.request(self.index.time_of(key), scrub=True)
+        if at_end:
+            self.keyframe_speed = 0.0
+            self.seek_worker.request(position)
+    
+    def set_in_point(self, timestamp):
+        self.in_point = max(0.0, timestamp)
+        if self.out_point is not None and self.out_point <= self.in_point:
+            self.out_point = None
+    
+    def set_out_point(self, timestamp):
+        self.out_point = min(timestamp, self.duration)
+        if self.out_point <= self.in_point:
+            self.in_point = 0.0
+    
+    def export_selection(self, out_path=None):
+        """Export [in_point, out_point) next to the video in the background, copying
+        everything but the partial GOPs at either end"""
+        if self.export_thread is not None and self.export_thread.is_alive():
+            return
+        end = self.out_point if self.out_point is not None else self.duration
+        out_path = out_path or trim_path_for(self.video_path, self.in_point, end)
+        self.export_status = "Exporting..."
+        self.export_thread = threading.Thread(target=self._export_thread,
+                                              args=(out_path, self.in_point, end))
+        self.export_thread.daemon = True
+        self.export_thread.start()
+    
+    def _export_thread(self, out_path, start, end):
+        try:
+            started = time.perf_counter()
+            plan = export_trim(self.video_path, out_path, start, end, self.decoder_options)
+            self.export_status = (f"Exported {plan.frames} frames ({plan.encoded} re-encoded) "
+                                  f"in {time.perf_counter() - started:.1f} s")
+            print(f"{self.export_status} to {out_path}")
+        except Exception as e:
+            print(f"Export error: {e}")
+            self.export_status = f"Export failed: {e}"
+    
+    def _draw_selection(self, x, y, width, height):
+        """Shade the slider between the in and out points"""
+        if self.duration <= 0 or (self.in_point <= 0 and self.out_point is None):
+            return
+        end = self.out_point if self.out_point is not None else self.duration
+        left = x + width * self.in_point / self.duration
+        right = x + width * end / self.duration
+        imgui.get_window_draw_list().add_rect_filled(
+            imgui.ImVec2(left, y), imgui.ImVec2(right, y + height),
+            imgui.get_color_u32(imgui.ImVec4(1.0, 0.8, 0.2, 0.25)))
+    
+    def _report_startup(self):
+        """Print how long it took from process start until the first frame was drawn"""
+        self.time_to_first_frame = time.perf_counter() - self.started_at
+        stages = ', '.join(f"{name} {seconds * 1000:.0f}" for name, seconds in self.startup_times.items())
+        print(f"First frame after {self.time_to_first_frame * 1000:.0f} ms ({stages} ms)")
+    
+    def _draw_stats(self):
+        """Overlay in the top left corner: per-stage timings, queue depths and drops"""
+        imgui.set_next_window_pos(imgui.get_main_viewport().pos + imgui.ImVec2(8, 8))
+        imgui.set_next_window_bg_alpha(0.7)
+        flags = (imgui.WindowFlags_.no_decoration | imgui.WindowFlags_.always_auto_resize |
+                 imgui.WindowFlags_.no_saved_settings | imgui.WindowFlags_.no_focus_on_appearing |
+                 imgui.WindowFlags_.no_nav)
+        imgui.begin("Pipeline stats", flags=flags)
+        if imgui.begin_table("stages", 6, imgui.TableFlags_.sizing_fixed_fit | imgui.TableFlags_.row_bg):
+            for heading in ("stage", "count", "last ms", "p50 ms", "p99 ms", "max ms"):
+                imgui.table_setup_column(heading)
+            imgui.table_headers_row()
+            for name, histogram in self.stats.stages.items():
+                if not histogram.count:
+                    continue
+                imgui.table_next_row()
+                for value in (name, str(histogram.count), f"{histogram.last * 1000:.2f}",
+                              f"{histogram.percentile(50) * 1000:.2f}",
+                              f"{histogram.percentile(99) * 1000:.2f}", f"{histogram.max * 1000:.2f}"):
+                    imgui.table_next_column()
+                    imgui.text(value)
+            imgui.end_table()
+        
+        imgui.text(f"Frame queue {len(self.frame_queue)}/{self.frame_queue.max_frames}, "
+                   f"{self.frame_queue.nbytes / 2**20:.0f} MB; cache {len(self.frame_cache)} frames")
+        if self.disk_cache is not None:
+            imgui.text(f"Disk cache {len(self.disk_cache)} frames, {self.disk_cache.nbytes / 2**20:.0f} MB, "
+                       f"{self.disk_cache.hits} hits, {self.disk_cache.misses} misses"
+                       + (", full" if self.disk_cache.full else ""))
+        imgui.text(f"Dropped frames {self.dropped_frames}")
+        if self.audio_ring is not None:
+            imgui.text(f"Audio ring {self.audio_ring.available() / self.audio_sample_rate * 1000:.0f} ms, "
+                       f"underruns {self.audio_ring.underruns}, overruns {self.audio_ring.overruns}")
+        if self.frame_ring is not None:
+            imgui.text(f"Frame ring dropped {int(self.frame_ring.header['dropped'])}")
+        if self.stats.errors:
+            imgui.text(f"Errors {sum(self.stats.errors.values())}, last: {self.stats.last_error}")
+        if imgui.button("Reset"):
+            self.stats.reset()
+        if self.trace_path is not None:
+            imgui.same_line()
+            if imgui.button("Dump trace"):
+                self.dump_trace()
+        imgui.end()
+    
+    def dump_trace(self, path=None):
+        """Write the recent pipeline events to path (default trace_path) as a Chrome trace"""
+        path = path or self.trace_path
         try:
-            for s in self.stream.side_data:
-                if isinstance(s, av.VideoDisplayMatrix):
-                    return s.rotation
+            count = self.stats.dump_trace(path)
+            print(f"Wrote {count} trace events to {path}")
         except Exception as e:
-            print(f"Error getting rotation: {e}")
-        return 0
+            print(f"Trace dump error: {e}")
+    
+    def _index_build_thread(self):
+        try:
+            index = VideoIndex.build(self.video_path)
+            index.save(self.video_path)
+            self.index = index
+            if not self.duration:
+                self.duration = index.duration
+        except Exception as e:
+            print(f"Index build error: {e}")
+            self.index = VideoIndex.empty()
+        finally:
+            self.index_ready.set()
 
-    def _audio_decode_thread(self):
+    def _audio_decode_thread(self, start_time):
         """Dedicated thread for audio decoding"""
         try:
-            # Open a separate container for audio
-            audio_container = av.open(self.video_path)
-            audio_stream = audio_container.streams.audio[0]
-            audio_stream.thread_type = 'AUTO'
-            
-            resampler = av.AudioResampler(
-                format=av.AudioFormat('s16').packed,
-                layout='stereo' if self.audio_channels == 2 else 'mono',
-                rate=self.audio_sample_rate
-            )
-            
-            for frame in audio_container.decode(audio=0):
-                if not self.is_playing:
-                    break
-                    
-                try:
-                    # Resample audio frame
-                    frame = resampler.resample(frame)[0]
-                    
-                    # Convert to numpy array
-                    audio_data = frame.to_ndarray()
-                    
-                    # Ensure correct shape (samples, channels)
-                    if audio_data.ndim == 1:
-                        audio_data = audio_data.reshape(-1, 1)
-                    elif audio_data.ndim == 2 and audio_data.shape[0] < audio_data.shape[1]:
-                        audio_data = audio_data.T
-                    
-                    # Convert to float32 for sounddevice
-                    audio_data = audio_data.astype(np.float32) / 32768.0
-                    
-                    # Handle queue full condition
-                    try:
-                        self.audio_queue.put(audio_data, timeout=1.0)
-                    except queue.Full:
-                        # If queue is full, remove oldest item and try again
-                        try:
-                            self.audio_queue.get_nowait()
-                            self.audio_queue.put(audio_data)
-                        except (queue.Empty, queue.Full):
-                            continue
-                            
-                except Exception as e:
-                    print(f"Audio processing error: {e}")
-                    continue
-                    
-            audio_container.close()
-            
+            if decode_audio_into(self.audio_ring, self.video_path, start_time,
+                                 self.audio_sample_rate, lambda: self.is_playing, self.stats):
+                # Ran to the end of the track, the clock free-runs once the ring drains
+                self.audio_eof = True
         except Exception as e:
-            print(f"Audio decode thread error: {e}")
+            self.stats.error("Audio decode thread", e)
             self.is_playing = False
 
+    def _timed_decode(self, stream):
+        """Same frames as container.decode(stream), timing demuxing and decoding apart"""
+        stats = self.stats
+        start = time.perf_counter()
+        for packet in self.container.demux(stream):
+            decoding = time.perf_counter()
+            stats.record('demux', start, decoding)
+            frames = packet.decode()
+            stats.record('decode', decoding)
+            yield from frames
+            start = time.perf_counter()
+
     def _video_decode_thread(self):
         """Dedicated thread for video decoding"""
         try:
             video_stream = self.container.streams.video[0]
             stream_time_base = float(video_stream.time_base)
             
-            for frame in self.container.decode(video=0):
+            # The shown frame came from the cache, put the decoder back right after it.
+            # Both waits give up on pause, which joins this thread before seeking.
+            if not self.decoder_synced:
+                while not self.index_ready.wait(0.05):
+                    if not self.is_playing:
+                        return
+                frame_pts, _ = self._decode_to(self.index.frame_at_time(self.current_time),
+                                               should_cancel=lambda: not self.is_playing)
+                if frame_pts is None:
+                    return
+                self.decoder_synced = True
+            
+            # Faster than 1x the decoder drops frames nothing else references before
+            # decoding them. Set after catching up, which has to reach one exact frame.
+            if self.playback_speed > 1.0:
+                video_stream.codec_context.skip_frame = 'NONREF'
+            
+            consecutive_drops = 0
+            for frame in self._timed_decode(video_stream):
                 if not self.is_playing:
                     break
                     
-                while self.frame_ready and self.is_playing:
-                    time.sleep(0.001)
-                    
-                if not self.is_playing:
+                # Too late to ever be shown, skip the conversion to catch up. Let one
+                # through now and then so a decoder that can't keep up still shows something.
+                frame_time = float(frame.pts * stream_time_base)
+                if frame_time < self.clock.now() - self.late_threshold and consecutive_drops < 8:
+                    consecutive_drops += 1
+                    self.dropped_frames += 1
+                    self.stats.mark('dropped late')
+                    continue
+                consecutive_drops = 0
+                
+                rgb = self._convert_frame(frame, full_res=False)
+                self.frame_cache.put(frame.pts, rgb)
+                if self.frame_ring is not None:
+                    # Waits at most a frame for consumers under the block policy
+                    start = time.perf_counter()
+                    self.frame_ring.publish(frame, frame.pts, frame_time, self.rotation,
+                                            timeout=self.frame_interval)
+                    self.stats.record('publish', start)
+                
+                # Sleeps while the lookahead is full, returns False once paused
+                if not self.frame_queue.put(frame_time, rgb):
                     break
-                    
-                self.next_frame = frame.to_ndarray(format='rgb24')
-                self.next_frame_pts = float(frame.pts * stream_time_base)
-                self.frame_ready = True
+            else:
+                self.video_eof = True
                 
         except Exception as e:
-            print(f"Video decode thread error: {e}")
+            self.stats.error("Video decode thread", e)
             self.is_playing = False
+        finally:
+            # Seeks decode on the same container and need every frame
+            self.container.streams.video[0].codec_context.skip_frame = 'DEFAULT'
+
+    def at_end(self):
+        """Playing forward and everything up to the end has been shown and heard"""
+        if not self.is_playing or not self.video_eof or len(self.frame_queue):
+            return False
+        if self.clock.now() < self.current_time + self.frame_interval:
+            return False
+        return not self.audio_device or (self.audio_eof and self.audio_ring.available() == 0)
 
     def _audio_callback(self, outdata, frames, time_info, status):
         """Callback for audio output"""
+        start = time.perf_counter()
         try:
             if status:
                 print(f"Audio status: {status}")
@@ -256,57 +948,81 @@ class VideoPlayer:
                 outdata.fill(0)
                 return
                 
-            # Try to get data with a small timeout
-            try:
-                data = self.audio_queue.get(timeout=0.1)
-            except queue.Empty:
+            if self.audio_eof and self.audio_ring.available() == 0:
                 outdata.fill(0)
+                self.clock.free_run()
                 return
                 
-            # Handle output size
-            if len(data) < len(outdata):
-                outdata[:len(data)] = data
-                outdata[len(data):].fill(0)
-            else:
-                outdata[:] = data[:len(outdata)]
+            # Copies exactly `frames` samples, padding with silence on underrun
+            read = self.audio_ring.read_into(outdata)
+            self.clock.add_samples(read)
+            if read < frames:
+                self.stats.mark('audio underrun')
                 
         except Exception as e:
-            print(f"Audio callback error: {e}")
+            self.stats.error("Audio callback", e)
             outdata.fill(0)
-    def play(self):
-        """Start video playback"""
+        self.stats.record('audio_callback', start)
+    def play(self, speed=1.0):
+        """Start video playback, at speed times real time"""
         try:
             if not self.is_playing:
+                # Let an in-flight seek finish, it shares the container with the decode thread
+                self.seek_worker.wait_idle()
+                self._apply_seek_result()
+                
                 print("Starting playback...")
+                self.reverse_speed = 0.0
+                self.keyframe_speed = 0.0
+                self._step_target = None
+                self.playback_speed = speed
                 self.is_playing = True
+                self.audio_eof = False
+                self.video_eof = False
+                # A prepared clip's first frames and audio are only good from the start
+                from_start = self.current_time == 0.0
+                audio_start = self.current_time
+                
+                # Audio drives the clock when there is any, otherwise it's monotonic
+                self.clock.start(self.current_time, rate=speed)
                 
-                # Start audio if available
-                if self.audio_stream:
+                # Start audio if available; faster than 1x plays muted
+                if self.audio_stream and speed == 1.0:
                     try:
                         print("Starting audio stream...")
-                        self.audio_device = sd.OutputStream(
-                            channels=self.audio_channels,
-                            samplerate=self.audio_sample_rate,
-                            callback=self._audio_callback,
-                            blocksize=1024,
-                            latency='low'
-                        )
-                        self.audio_device.start()
+                        if from_start and self._audio_preroll_end is not None:
+                            # Keep the pre-rolled audio and decode on from its end
+                            audio_start = self._audio_preroll_end
+                        else:
+                            self.audio_ring.reset()
                         
-                        # Start audio decode thread
-                        self.audio_thread = threading.Thread(target=self._audio_decode_thread)
+                        # Start audio decode thread, ahead of the device so the ring has
+                        # something in it by the first callback
+                        self.audio_thread = threading.Thread(target=self._audio_decode_thread,
+                                                             args=(audio_start,))
                         self.audio_thread.daemon = True
                         self.audio_thread.start()
                         
+                        latency = self.audio_output.open(self.audio_out_channels,
+                                                         self.audio_sample_rate)
+                        self.clock.start(self.current_time, self.audio_sample_rate, latency)
+                        self.audio_output.attach(self._audio_callback)
+                        self.audio_device = self.audio_output
+                        
                     except Exception as e:
                         print(f"Audio start error: {e}")
                         self.audio_stream = None
                 
                 # Reset frame state
-                self.frame_ready = False
-                self.next_frame = None
-                self.next_frame_pts = None
-                self.last_frame_time = time.time()
+                self.frame_queue.clear()
+                self.frame_queue.reopen()
+                if from_start and self._preroll is not None and self.decoder_synced:
+                    # The container is just past these, the decode thread carries on after them
+                    time_base = float(self.stream.time_base)
+                    for pts, frame in self._preroll[:self.frame_queue.max_frames]:
+                        self.frame_queue.put(pts * time_base, frame)
+                self._preroll = None
+                self._audio_preroll_end = None
                 
                 # Start video decode thread
                 self.video_thread = threading.Thread(target=self._video_decode_thread)
@@ -319,68 +1035,116 @@ class VideoPlayer:
 
             
     def _update_texture(self):
+        start = time.perf_counter()
         try:
-            if self.rotation:
-                k = {90: 1, 180: 2, 270: 3, -90: 3, -180: 2, -270: 1}.get(self.rotation, 0)
-                if k:
-                    self.current_frame = np.ascontiguousarray(np.rot90(self.current_frame, k=k))
-                    
-            gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_id)
-            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
-            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
-            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
-            gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)
-            gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
-            
-            actual_height, actual_width = self.current_frame.shape[:2]
-            gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGB, 
-                           actual_width, actual_height,
-                           0, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, self.current_frame)
+            self.texture.upload(self.current_frame)
         except Exception as e:
-            print(f"Texture update error: {e}")
+            self.stats.error("Texture update", e)
+        self.stats.record('upload', start)
             
     def pause(self):
         """Pause video playback"""
         self.is_playing = False
+        self.reverse_speed = 0.0
+        self.keyframe_speed = 0.0
+        self._step_target = None
+        self.frame_queue.close()
+        self.clock.stop()
+        
+        # Seeks share the container with the decode thread, so wait for it to let go.
+        # Everything it waits on or decodes checks is_playing, so this is one frame at most.
+        video_thread = getattr(self, 'video_thread', None)
+        if video_thread and video_thread.is_alive() and video_thread is not threading.current_thread():
+            video_thread.join()
         
         # Stop audio
         if self.audio_device:
-            try:
-                self.audio_device.stop()
-                self.audio_device.close()
-                self.audio_device = None
-            except Exception as e:
-                print(f"Error stopping audio: {e}")
+            self.audio_device.detach(self._audio_callback)
+            self.audio_device = None
+            if self._owns_audio_output:
+                self.audio_output.close()
         
-        # Clear audio queue
-        while not self.audio_queue.empty():
-            try:
-                self.audio_queue.get_nowait()
-            except queue.Empty:
-                break
+        # The audio thread notices is_playing within one wait for ring space
+        audio_thread = getattr(self, 'audio_thread', None)
+        if audio_thread and audio_thread.is_alive() and audio_thread is not threading.current_thread():
+            audio_thread.join(timeout=1.0)
                 
     def cleanup(self):
         """Clean up resources"""
+        if self.is_playing:
+            self.pause()
         self.is_playing = False
+        self._closing = True
+        self.frame_queue.close()
+        if hasattr(self, 'seek_worker'):
+            self.seek_worker.stop()
+        if getattr(self, 'filmstrip', None) is not None:
+            self.filmstrip.stop()
+        if getattr(self, 'waveform', None) is not None:
+            self.waveform.stop()
+        if getattr(self, 'gop_cache', None) is not None:
+            self.gop_cache.stop()
+        if self.proxy_thread is not None:
+            self.proxy_thread.join(timeout=1.0)
+        if getattr(self, 'export_thread', None) is not None and self.export_thread.is_alive():
+            # Its daemon thread would otherwise die mid-write with the process
+            print("Waiting for export to finish...")
+            self.export_thread.join()
+        if self.proxy is not None:
+            self.proxy.close()
+        if getattr(self, 'frame_ring', None) is not None:
+            try:
+                self.frame_ring.close()
+            except BufferError as e:
+                print(f"Frame ring still in use: {e}")
+        self.frame_cache.clear()
+        if getattr(self, 'disk_cache', None) is not None:
+            self.disk_cache.close()
         if hasattr(self, 'container'):
             self.container.close()
-        if hasattr(self, 'texture_id'):
+        if getattr(self, 'trace_path', None) is not None:
+            self.dump_trace()
+        if hasattr(self, 'texture'):
             try:
-                gl.glDeleteTextures(self.texture_id)
+                if getattr(self, 'filmstrip_texture', None) is not None:
+                    self.filmstrip_texture.delete()
+                self.texture.delete()
             except Exception as e:
                 print(f"Cleanup error: {e}")
                 
     def render_gui(self):
+        start = time.perf_counter()
         try:
-            current_time = time.time()
+            self._apply_seek_result()
             
-            # Check if it's time to display the next frame
-            if self.is_playing and self.frame_ready and (current_time - self.last_frame_time) >= self.frame_interval:
-                self.current_frame = self.next_frame
-                self.current_time = self.next_frame_pts
-                self.frame_ready = False
-                self.last_frame_time = current_time
-                self._update_texture()
+            # Show the newest frame whose PTS the clock has reached, dropping any that
+            # a later due frame has already overtaken
+            if self.is_playing:
+                now = self.clock.now()
+                item = None
+                while True:
+                    head = self.frame_queue.peek()
+                    if head is None or head[0] > now:
+                        break
+                    if item is not None:
+                        self.dropped_frames += 1
+                        self.stats.mark('dropped overtaken')
+                    item = self.frame_queue.pop()
+                if item is not None:
+                    self.current_time, self.current_frame = item
+                    # How far behind its PTS the frame made it to the screen
+                    self.stats.add('present_lag', now - self.current_time)
+                    self._update_texture()
+                if self.stats.tracing:
+                    self.stats.counter('frame queue', len(self.frame_queue))
+                    if self.audio_ring is not None:
+                        self.stats.counter('audio ring', self.audio_ring.available())
+            elif self.reverse_speed:
+                self._advance_reverse()
+            elif self.keyframe_speed:
+                self._advance_keyframe_shuttle()
+            if self._step_target is not None:
+                self._apply_step()
             
             viewport = imgui.get_main_viewport()
             imgui.set_next_window_pos(viewport.pos)
@@ -400,12 +1164,13 @@ class VideoPlayer:
                 
                 # Video display
                 avail_width = imgui.get_content_region_avail().x
-                avail_height = imgui.get_content_region_avail().y - 60
+                avail_height = imgui.get_content_region_avail().y - 60 - imgui.get_frame_height_with_spacing()
+                if self.filmstrip is not None:
+                    avail_height -= FILMSTRIP_HEIGHT + imgui.get_style().item_spacing.y
+                if self.waveform is not None:
+                    avail_height -= WAVEFORM_HEIGHT + imgui.get_style().item_spacing.y
                 
-                if self.rotation in [90, -90, 270, -270]:
-                    aspect_ratio = self.frame_height / self.frame_width
-                else:
-                    aspect_ratio = self.frame_width / self.frame_height
+                aspect_ratio = self.display_width / self.display_height
                     
                 if avail_width / avail_height > aspect_ratio:
                     display_height = avail_height
@@ -413,9 +1178,26 @@ class VideoPlayer:
                 else:
                     display_width = avail_width
                     display_height = avail_width / aspect_ratio
+                self._update_decode_size(display_width, display_height)
                 
                 imgui.set_cursor_pos_x((avail_width - display_width) * 0.5)
-                imgui.image(self.texture_id, imgui.ImVec2(display_width, display_height))
+                
+                # Reserve the space, then draw the unrotated texture turned through its UVs
+                pos = imgui.get_cursor_screen_pos()
+                imgui.dummy(imgui.ImVec2(display_width, display_height))
+                uv1, uv2, uv3, uv4 = self.rotation_uvs
+                imgui.get_window_draw_list().add_image_quad(
+                    self.texture_id,
+                    pos,
+                    imgui.ImVec2(pos.x + display_width, pos.y),
+                    imgui.ImVec2(pos.x + display_width, pos.y + display_height),
+                    imgui.ImVec2(pos.x, pos.y + display_height),
+                    uv1, uv2, uv3, uv4
+                )
+                if self.frame_ring is not None:
+                    self._draw_overlays(pos, display_width, display_height)
+                if self.time_to_first_frame is None:
+                    self._report_startup()
                 
                 imgui.spacing()
                 imgui.spacing()
@@ -424,9 +1206,9 @@ class VideoPlayer:
                 controls_width = min(avail_width * 0.8, 600)
                 imgui.set_cursor_pos_x((avail_width - controls_width) * 0.5)
                 
-                if imgui.button("Play" if not self.is_playing else "Pause"):
-                    if self.is_playing:
-                        self.pause()
+                if imgui.button("Play" if not self.shuttle_speed else "Pause"):
+                    if self.shuttle_speed:
+                        self.pause_exact()
                     else:
                         self.play()
                         
@@ -443,28 +1225,125 @@ class VideoPlayer:
                 )
                 if changed:
                     self.pause()
-                    self.seek_frame(value)
+                    self.current_time = value
+                    self.seek_worker.request(value, scrub=True)
+                # Dragging shows proxy frames, letting go fetches the full resolution one
+                if imgui.is_item_deactivated_after_edit():
+                    self.seek_worker.request(self.current_time)
+                slider_x = imgui.get_item_rect_min().x
+                slider_width = imgui.get_item_rect_size().x
+                self._draw_selection(slider_x, imgui.get_item_rect_min().y,
+                                     slider_width, imgui.get_item_rect_size().y)
                     
                 imgui.pop_item_width()
+                
+                if self.waveform is not None:
+                    self._draw_waveform(slider_x, slider_width)
+                if self.filmstrip is not None:
+                    self._draw_filmstrip(slider_x, slider_width)
+                
+                # Frame steps (also the arrow keys) and reverse playback, then in/out points,
+                # also on the I and O keys, and export of the range between
+                imgui.set_cursor_pos_x((avail_width - controls_width) * 0.5)
+                if imgui.button("<|") or imgui.is_key_pressed(imgui.Key.left_arrow):
+                    self.step_frame(-1)
+                imgui.same_line()
+                if imgui.button("<<"):
+                    self.play_reverse()
+                imgui.same_line()
+                if imgui.button("|>") or imgui.is_key_pressed(imgui.Key.right_arrow):
+                    self.step_frame(1)
+                imgui.same_line()
+                # J/K/L shuttle: J and L go faster each way, K pauses
+                if imgui.is_key_pressed(imgui.Key.l, False):
+                    self.shuttle_key(1)
+                if imgui.is_key_pressed(imgui.Key.j, False):
+                    self.shuttle_key(-1)
+                if imgui.is_key_pressed(imgui.Key.k, False) and self.shuttle_speed:
+                    self.pause_exact()
+                if self.shuttle_speed not in (0.0, 1.0):
+                    imgui.text(f"{self.shuttle_speed:+g}x")
+                    imgui.same_line()
+                if imgui.button("Set In") or imgui.is_key_pressed(imgui.Key.i, False):
+                    self.set_in_point(self.current_time)
+                imgui.same_line()
+                if imgui.button("Set Out") or imgui.is_key_pressed(imgui.Key.o, False):
+                    self.set_out_point(self.current_time)
+                imgui.same_line()
+                exporting = self.export_thread is not None and self.export_thread.is_alive()
+                imgui.begin_disabled(exporting)
+                if imgui.button("Export"):
+                    self.export_selection()
+                imgui.end_disabled()
+                imgui.same_line()
+                end = self.out_point if self.out_point is not None else self.duration
+                imgui.text(f"{self.in_point:.2f} - {end:.2f} s  {self.export_status}")
                 imgui.end()
                 
+                if imgui.is_key_pressed(imgui.Key.f2, False):
+                    self.show_stats = not self.show_stats
+                if self.show_stats:
+                    self._draw_stats()
+                
             except Exception as e:
                 print(f"ImGui error: {e}")
                 if imgui.get_current_window() is not None:
                     imgui.end()
                 
         except Exception as e:
-            print(f"Render error: {e}")
+            self.stats.error("Render", e)
             if imgui.get_current_window() is not None:
                 imgui.end()
+        self.stats.record('render', start)
 
 def main():
     player = None
     import sys
-    video_file = sys.argv[1]
+    # --display-size decodes at the drawn size while playing, --proxy scrubs a low-res copy,
+    # --threads=TYPE[:COUNT] sets video decoder threading (frame, slice, auto or none),
+    # --frame-ring=NAME publishes played frames to shared memory for frame_ring.py consumers,
+    # --stats shows pipeline timings (F2 toggles them), --trace=FILE writes a Chrome trace on exit
+    # (FILE-<clip>.json for each clip of a playlist),
+    # --disk-cache=MB keeps decoded frames on disk across sessions, up to MB megabytes in all.
+    # Several files or a directory play as a playlist, the next clip opened in the background,
+    # or with --grid side by side in lockstep.
+    args = sys.argv[1:]
+    paths = playlist_paths([arg for arg in args if not arg.startswith('--')])
+    decoder_options = None
+    frame_ring = None
+    trace_path = None
+    disk_cache_bytes = None
+    for arg in args:
+        if arg.startswith('--frame-ring='):
+            frame_ring = arg.split('=', 1)[1]
+        elif arg.startswith('--trace='):
+            trace_path = arg.split('=', 1)[1]
+        elif arg.startswith('--disk-cache='):
+            disk_cache_bytes = int(float(arg.split('=', 1)[1]) * 2**20)
+        elif arg.startswith('--threads='):
+            thread_type, _, count = arg.split('=', 1)[1].partition(':')
+            decoder_options = DecoderOptions(thread_type, int(count or 0))
+    def open_player(video_file, prepared=None, audio_output=None):
+        clip_trace_path = trace_path
+        if trace_path is not None and len(paths) > 1:
+            # One trace per clip, or each would overwrite the last
+            root, ext = os.path.splitext(trace_path)
+            name = os.path.splitext(os.path.basename(video_file))[0]
+            clip_trace_path = f"{root}-{name}{ext}"
+        return VideoPlayer(video_file, display_scaled='--display-size' in args,
+                           use_proxy='--proxy' in args, decoder_options=decoder_options,
+                           frame_ring=frame_ring, show_stats='--stats' in args,
+                           trace_path=clip_trace_path, prepared=prepared,
+                           disk_cache_bytes=disk_cache_bytes, audio_output=audio_output)
+    
     def gui_setup():
         nonlocal player
-        player = VideoPlayer(video_file)
+        if '--grid' in args:
+            player = VideoGrid(paths, decoder_options=decoder_options)
+        elif len(paths) == 1:
+            player = open_player(paths[0])
+        else:
+            player = Playlist(paths, open_player, {'decoder_options': decoder_options})
         imgui.style_colors_dark()
         style = imgui.get_style()
         style.window_padding = imgui.ImVec2(0, 0)
@@ -0,0 +1,567 @@
+"""Several videos in a grid, playing, seeking and stepping in lockstep.
+
+Every tile is presented against one MasterClock, so the frames on screen always
+belong to the same moment of each video. Tiles have no threads of their own: one
+DecodePool, a worker per core at most, does the decoding for all of them a short turn
+at a time. There is no audio; the clock runs on time.monotonic().
+
+    python user_interface.py --grid original.mp4 variant_a.mp4 variant_b.mp4
+"""
+import math
+import os
+import threading
+import time
+import numpy as np
+from imgui_bundle import imgui
+from av_clock import MasterClock
+from decoder_options import DecoderOptions, open_video
+from decoding import decode_from
+from frame_size import DisplaySize, convert_frame, stream_duration
+from frame_cache import FrameCache
+from frame_queue import FrameQueue
+from gl_texture import StreamingTexture
+from gl_yuv import YUVTexture
+from pipeline_stats import PipelineStats
+from rotation import rotated_uvs, snapped_rotation
+from video_index import VideoIndex
+
+# Frames a tile decodes in one turn on a pool worker before another tile can have it
+TURN_FRAMES = 2
+# Exact seeks cache this many seconds before their target, for stepping back
+CACHE_WINDOW = 1.0
+
+
+class GridTile:
+    """One video in the grid: its container, lookahead queue, frame cache and texture.
+
+    The decoding state is only touched by whichever pool worker holds the tile, and a
+    tile is only ever held by one (see DecodePool). Frames reach the renderer through
+    frame_queue while playing and as seek results while paused. Playback and exact
+    seeks convert frames to the size the tile is drawn at.
+    """
+
+    def __init__(self, video_path, decoder_options, stats, lookahead_frames=4,
+                 cache_bytes=64 * 1024 * 1024, yuv_display=True):
+        self.video_path = video_path
+        self.name = os.path.basename(video_path)
+        self.stats = stats
+        self.container = open_video(video_path, decoder_options)
+        self.stream = self.container.streams.video[0]
+        self.time_base = float(self.stream.time_base)
+        self.late_threshold = 2.0 / float(self.stream.guessed_rate or self.stream.rate or 30)
+        self.duration = stream_duration(self.container, self.stream)
+        # Loaded, or built and saved, by the tile's first turn
+        self.index = None
+        self.rotation = None
+
+        self.frame_queue = FrameQueue(lookahead_frames)
+        self.frame_cache = FrameCache(cache_bytes)
+        self.dropped_frames = 0
+        self.playing = False
+        self.eof = False
+        # Time of the last frame decoded for playback, the pool serves the lowest first
+        self.queued_until = 0.0
+        self.decode_size = None
+        self._display_size = DisplaySize(self.stream.width, self.stream.height)
+
+        # Decoder position: _frames carries on after frame number _decoded. shown is the
+        # frame on screen, or about to be once the renderer takes the seek result.
+        self._frames = None
+        self._decoded = None
+        self._consecutive_drops = 0
+        self._resumed = False
+        self.shown = None
+
+        # Seek requests and results, handed over under _lock
+        self._lock = threading.Lock()
+        self.seek_generation = 0
+        self.seek_request = None
+        self.seek_result = None
+
+        self.current_frame = None
+        self.current_time = 0.0
+        self.yuv_display = yuv_display
+        self.texture = None
+        if self.yuv_display:
+            try:
+                self.texture = YUVTexture()
+            except Exception as e:
+                print(f"YUV display unavailable, using RGB: {e}")
+                self.yuv_display = False
+        if self.texture is None:
+            self.texture = StreamingTexture()
+
+    @property
+    def display_size(self):
+        """Width and height as shown, after rotation"""
+        if self.rotation in (90, 270):
+            return self.stream.height, self.stream.width
+        return self.stream.width, self.stream.height
+
+    def request_seek(self, timestamp, exact):
+        with self._lock:
+            self.seek_generation += 1
+            self.seek_request = (self.seek_generation, timestamp, exact)
+
+    def take_seek_result(self):
+        """(time, frame) for the latest seek once it is decoded, or None"""
+        with self._lock:
+            result, self.seek_result = self.seek_result, None
+        if result is None or result[0] != self.seek_generation:
+            return None
+        return result[1:]
+
+    def show(self, timestamp, frame):
+        """Upload a frame to the tile's texture; on the render thread"""
+        self.current_time = timestamp
+        self.current_frame = frame
+        start = time.perf_counter()
+        try:
+            self.texture.upload(frame)
+        except Exception as e:
+            self.stats.error(f"Texture update ({self.name})", e)
+        self.stats.record('upload', start)
+
+    def update_decode_size(self, width, height):
+        """Follow the on-screen size of the tile, once a resize has settled"""
+        self.decode_size = self._display_size.update(width, height, self.rotation)
+
+    # Everything below runs on a pool worker
+
+    def priority(self):
+        """How soon the tile needs a turn, lowest first, or None if it has nothing to do.
+        Seeks come first, then the playing tile whose lookahead runs out soonest."""
+        if self.seek_request is not None:
+            return (0, 0.0)
+        if self.playing and not self.eof and len(self.frame_queue) < self.frame_queue.max_frames:
+            return (1, self.queued_until)
+        return None
+
+    def turn(self, clock):
+        if self.index is None:
+            self.index = VideoIndex.open(self.video_path)
+            self.duration = self.index.duration or self.duration
+        with self._lock:
+            request, self.seek_request = self.seek_request, None
+        if request is not None:
+            self._seek(*request)
+        elif self.playing:
+            self._play(clock)
+
+    def _convert(self, frame):
+        start = time.perf_counter()
+        converted = convert_frame(frame, self.yuv_display, self.decode_size)
+        self.stats.record('convert', start)
+        return converted
+
+    def _next_frame(self):
+        """Next decoded frame of _frames, or None at the end"""
+        start = time.perf_counter()
+        frame = next(self._frames, None)
+        self.stats.record('decode', start)
+        if frame is None:
+            self._frames = None
+            return None
+        self._decoded = int(np.searchsorted(self.index.pts, frame.pts, side='left'))
+        if self.rotation is None:
+            self.rotation = snapped_rotation(frame)
+        return frame
+
+    def _decode_to(self, target, should_cancel, cache_from_pts=None):
+        """Decoded frame number target, carrying on from where the decoder is when that
+        is in the same GOP, and caching converted frames from cache_from_pts on the way.
+        None if cancelled."""
+        index = self.index
+        target_pts = int(index.pts[target])
+        if self._frames is None or self._decoded is None or self._decoded >= target or \
+                index.keyframe_for(target) > self._decoded:
+            self._frames = decode_from(self.container, self.stream, index, target)
+            self._decoded = None
+        while not should_cancel():
+            frame = self._next_frame()
+            if frame is None:
+                return None
+            if frame.pts >= target_pts:
+                return frame
+            if cache_from_pts is not None and frame.pts >= cache_from_pts:
+                self.frame_cache.put(frame.pts, self._convert(frame))
+        # Somewhere short of the target, start over next time
+        self._frames = None
+        return None
+
+    def _seek(self, generation, timestamp, exact):
+        start = time.perf_counter()
+        index = self.index
+        if len(index) == 0:
+            return
+        target = index.frame_at_time(timestamp)
+        target_pts = int(index.pts[target])
+        converted = self.frame_cache.get(target_pts)
+        if converted is None:
+            cache_from_pts = target_pts - int(CACHE_WINDOW / self.time_base) if exact else None
+            frame = self._decode_to(target, lambda: self.seek_generation != generation, cache_from_pts)
+            if frame is None:
+                return
+            converted = self._convert(frame)
+            self.frame_cache.put(frame.pts, converted)
+        self.shown = target
+        with self._lock:
+            self.seek_result = (generation, index.time_of(target), converted)
+        if exact:
+            self.stats.record('seek', start)
+
+    def _resume(self):
+        """Line the decoder up right after the frame on screen. False if paused meanwhile."""
+        if self.shown is None or self._decoded == self.shown:
+            return True
+        index = self.index
+        if self._frames is not None and self._decoded is not None and self.shown < self._decoded:
+            # Frames decoded ahead before the pause went through the cache, queue them again
+            pts = index.pts[self.shown + 1:self._decoded + 1]
+            cached = [self.frame_cache.get(int(p)) for p in pts]
+            if len(cached) <= self.frame_queue.max_frames and all(c is not None for c in cached):
+                for p, frame in zip(pts, cached):
+                    self.frame_queue.put(int(p) * self.time_base, frame)
+                return True
+        return self._decode_to(self.shown, lambda: not self.playing) is not None
+
+    def _play(self, clock):
+        if not self._resumed:
+            if not self._resume():
+                return
+            self._resumed = True
+        for _ in range(TURN_FRAMES):
+            if not self.playing or len(self.frame_queue) >= self.frame_queue.max_frames:
+                return
+            frame = self._next_frame() if self._frames is not None else None
+            if frame is None:
+                self.eof = True
+                return
+            frame_time = frame.pts * self.time_base
+            self.queued_until = frame_time
+            # Too late to be shown, as in the player's decode thread
+            if frame_time < clock.now() - self.late_threshold and self._consecutive_drops < 8:
+                self._consecutive_drops += 1
+                self.dropped_frames += 1
+                self.stats.mark('dropped late')
+                continue
+            self._consecutive_drops = 0
+            converted = self._convert(frame)
+            self.frame_cache.put(frame.pts, converted)
+            if not self.frame_queue.put(frame_time, converted):
+                return
+
+    def close(self):
+        self.frame_queue.close()
+        self.frame_cache.clear()
+        self.container.close()
+        try:
+            self.texture.delete()
+        except Exception as e:
+            print(f"Cleanup error: {e}")
+
+
+class DecodePool:
+    """Worker threads shared by every tile of a grid.
+
+    A tile is held by at most one worker at a time, since its container can't be used
+    from two threads, and only for one turn: a seek, or TURN_FRAMES frames of playback.
+    Then the tile that needs it most goes next. Seeks go first; after them comes the
+    playing tile whose queued frames run out soonest, so when the workers can't keep up
+    every tile falls behind by about the same and drops about the same share of frames,
+    instead of some tiles playing smoothly while others starve.
+    """
+
+    def __init__(self, tiles, workers, clock, stats):
+        self.tiles = tiles
+        self.clock = clock
+        self.stats = stats
+        self._busy = set()
+        self._cond = threading.Condition()
+        self._running = True
+        self.threads = []
+        for i in range(max(1, workers)):
+            thread = threading.Thread(target=self._run, name=f"Grid decode {i}")
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def wake(self):
+        """Have the workers look again, after a request or a frame leaving a queue"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def stop(self):
+        """Stop the workers; True once they all have"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self.threads:
+            thread.join(timeout=1.0)
+        return not any(thread.is_alive() for thread in self.threads)
+
+    def _next_tile(self):
+        best, best_priority = None, None
+        for tile in self.tiles:
+            if tile in self._busy:
+                continue
+            priority = tile.priority()
+            if priority is not None and (best is None or priority < best_priority):
+                best, best_priority = tile, priority
+        return best
+
+    def _run(self):
+        while True:
+            with self._cond:
+                tile = None
+                while self._running:
+                    tile = self._next_tile()
+                    if tile is not None:
+                        break
+                    self._cond.wait()
+                if not self._running:
+                    return
+                self._busy.add(tile)
+            try:
+                tile.turn(self.clock)
+            except Exception as e:
+                self.stats.error(f"Grid decode ({tile.name})", e)
+                tile.eof = True
+            finally:
+                with self._cond:
+                    self._busy.discard(tile)
+                    self._cond.notify_all()
+
+
+class VideoGrid:
+    """Videos in a grid under one set of controls, playing, seeking and stepping together.
+
+    Seeks send every tile to the same time and steps go frame by frame through the first
+    video, the others showing whatever frame of theirs is on screen at that time. With
+    workers unset the pool gets one worker per tile, up to the number of cores, and each
+    decoder threads over its share of the cores.
+    """
+
+    def __init__(self, video_paths, workers=None, decoder_options=None, lookahead_frames=4,
+                 cache_bytes=64 * 1024 * 1024, yuv_display=True):
+        if not video_paths:
+            raise ValueError("VideoGrid needs at least one video")
+        cores = os.cpu_count() or 1
+        if decoder_options is None:
+            threads = max(1, cores // len(video_paths))
+            decoder_options = DecoderOptions('AUTO' if threads > 1 else 'NONE', threads)
+        self.stats = PipelineStats()
+        self.clock = MasterClock()
+        self.tiles = [GridTile(path, decoder_options, self.stats, lookahead_frames, cache_bytes,
+                               yuv_display) for path in video_paths]
+        self.pool = DecodePool(self.tiles, min(workers or cores, len(self.tiles)), self.clock,
+                               self.stats)
+        self.playing = False
+        self.position = 0.0
+        self.seek(0.0)
+
+    @property
+    def duration(self):
+        return max(tile.duration for tile in self.tiles)
+
+    @property
+    def dropped_frames(self):
+        return sum(tile.dropped_frames for tile in self.tiles)
+
+    def play(self):
+        if self.playing:
+            return
+        if self.position >= self.duration:
+            self.position = 0.0
+            self.seek(0.0)
+        for tile in self.tiles:
+            tile.eof = False
+            tile._resumed = False
+            tile.frame_queue.reopen()
+            tile.playing = True
+        self.playing = True
+        self.clock.start(self.position)
+        self.pool.wake()
+
+    def pause(self):
+        """Stop where the first video is. Frames decoded ahead are dropped from the
+        queues but stay cached, so playing again carries on with them."""
+        if not self.playing:
+            return
+        self.playing = False
+        self.clock.stop()
+        for tile in self.tiles:
+            tile.playing = False
+            tile.frame_queue.close()
+            tile.frame_queue.clear()
+        reference = self.tiles[0]
+        self.position = reference.current_time if reference.current_frame is not None \
+            else min(self.clock.now(), self.duration)
+
+    def seek(self, timestamp, exact=True):
+        """Pause and show every video at timestamp. Scrub seeks (exact False) give way to
+        the next request and don't cache the frames leading up to the target."""
+        self.pause()
+        self.position = max(0.0, min(timestamp, self.duration))
+        for tile in self.tiles:
+            tile.request_seek(self.position, exact)
+        self.pool.wake()
+
+    def step(self, direction):
+        """Pause and move one frame of the first video forward (1) or back (-1)"""
+        index = self.tiles[0].index
+        if index is None or len(index) == 0:
+            return
+        self.pause()
+        target = max(0, min(index.frame_at_time(self.position) + direction, len(index) - 1))
+        self.seek(index.time_of(target))
+
+    def _present(self):
+        """Show seek results, and while playing the newest frame each tile has due. No
+        tile goes past the time the one furthest behind has reached, so they stay in
+        step when decoding can't keep up, and the tiles ahead hold off decoding."""
+        now = self.clock.now()
+        if self.playing:
+            reached = now
+            for tile in self.tiles:
+                if tile.current_frame is None or (tile.eof and not len(tile.frame_queue)):
+                    continue
+                due = tile.frame_queue.newest_due(now)
+                reached = min(reached, tile.current_time if due is None else max(due, tile.current_time))
+            now = reached
+        popped = False
+        for tile in self.tiles:
+            result = tile.take_seek_result()
+            if result is not None:
+                tile.show(*result)
+            if not self.playing:
+                continue
+            item = None
+            while True:
+                head = tile.frame_queue.peek()
+                if head is None or head[0] > now:
+                    break
+                if item is not None:
+                    tile.dropped_frames += 1
+                    self.stats.mark('dropped overtaken')
+                item = tile.frame_queue.pop()
+                popped = True
+            if item is not None:
+                tile.shown = int(np.searchsorted(tile.index.pts, round(item[0] / tile.time_base), side='left'))
+                self.stats.add('present_lag', now - item[0])
+                tile.show(*item)
+        if popped:
+            self.pool.wake()
+        if self.playing:
+            self.position = min(self.clock.now(), self.duration)
+            if all(tile.eof and not len(tile.frame_queue) for tile in self.tiles):
+                self.pause()
+                self.position = self.duration
+
+    def _layout(self, width, height):
+        """Columns and rows that make the tiles biggest for the first video's shape"""
+        tile_width, tile_height = self.tiles[0].display_size
+        aspect = tile_width / tile_height
+        best = None
+        for columns in range(1, len(self.tiles) + 1):
+            rows = math.ceil(len(self.tiles) / columns)
+            cell_width, cell_height = width / columns, height / rows
+            scale = min(cell_width, cell_height * aspect)
+            if best is None or scale > best[0]:
+                best = (scale, columns, rows)
+        return best[1], best[2]
+
+    def _draw_tiles(self, origin, width, height):
+        draw_list = imgui.get_window_draw_list()
+        color = imgui.get_color_u32(imgui.ImVec4(1.0, 1.0, 1.0, 0.9))
+        columns, rows = self._layout(width, height)
+        cell_width, cell_height = width / columns, height / rows
+        for i, tile in enumerate(self.tiles):
+            x = origin.x + (i % columns) * cell_width
+            y = origin.y + (i // columns) * cell_height
+            display_width, display_height = tile.display_size
+            scale = min((cell_width - 4) / display_width, (cell_height - 4) / display_height)
+            w, h = display_width * scale, display_height * scale
+            tile.update_decode_size(w, h)
+            left = x + (cell_width - w) * 0.5
+            top = y + (cell_height - h) * 0.5
+            if tile.current_frame is not None:
+                uv1, uv2, uv3, uv4 = rotated_uvs(tile.rotation or 0)
+                draw_list.add_image_quad(
+                    tile.texture.texture_id,
+                    imgui.ImVec2(left, top), imgui.ImVec2(left + w, top),
+                    imgui.ImVec2(left + w, top + h), imgui.ImVec2(left, top + h),
+                    uv1, uv2, uv3, uv4
+                )
+            label = f"{tile.name}  {tile.current_time:.2f} s"
+            if tile.dropped_frames:
+                label += f"  dropped {tile.dropped_frames}"
+            draw_list.add_text(imgui.ImVec2(left + 4, top + 4), color, label)
+
+    def render_gui(self):
+        start = time.perf_counter()
+        try:
+            self._present()
+
+            viewport = imgui.get_main_viewport()
+            imgui.set_next_window_pos(viewport.pos)
+            imgui.set_next_window_size(viewport.size)
+            window_flags = (
+                imgui.WindowFlags_.no_decoration |
+                imgui.WindowFlags_.no_move |
+                imgui.WindowFlags_.no_background |
+                imgui.WindowFlags_.no_bring_to_front_on_focus |
+                imgui.WindowFlags_.no_nav_focus |
+                imgui.WindowFlags_.no_saved_settings
+            )
+            imgui.begin("Video Grid", flags=window_flags)
+
+            avail_width = imgui.get_content_region_avail().x
+            grid_height = imgui.get_content_region_avail().y - 2 * imgui.get_frame_height_with_spacing() - 10
+            origin = imgui.get_cursor_screen_pos()
+            imgui.dummy(imgui.ImVec2(avail_width, grid_height))
+            self._draw_tiles(origin, avail_width, grid_height)
+            imgui.spacing()
+
+            controls_width = min(avail_width * 0.8, 600)
+            imgui.set_cursor_pos_x((avail_width - controls_width) * 0.5)
+            if imgui.button("Play" if not self.playing else "Pause"):
+                if self.playing:
+                    self.pause()
+                else:
+                    self.play()
+            imgui.same_line()
+            imgui.push_item_width(controls_width - 100)
+            changed, value = imgui.slider_float("##time", self.position, 0, self.duration, "%.2f s")
+            if changed:
+                self.seek(value, exact=False)
+            if imgui.is_item_deactivated_after_edit():
+                self.seek(self.position)
+            imgui.pop_item_width()
+
+            # Frame steps through the first video, also on the arrow keys
+            imgui.set_cursor_pos_x((avail_width - controls_width) * 0.5)
+            if imgui.button("<|") or imgui.is_key_pressed(imgui.Key.left_arrow):
+                self.step(-1)
+            imgui.same_line()
+            if imgui.button("|>") or imgui.is_key_pressed(imgui.Key.right_arrow):
+                self.step(1)
+            imgui.same_line()
+            imgui.text(f"{len(self.tiles)} videos on {len(self.pool.threads)} decode workers, "
+                       f"dropped {self.dropped_frames}")
+            imgui.end()
+        except Exception as e:
+            self.stats.error("Render", e)
+            if imgui.get_current_window() is not None:
+                imgui.end()
+        self.stats.record('render', start)
+
+    def cleanup(self):
+        self.pause()
+        for tile in self.tiles:
+            # Cancels any seek still decoding
+            tile.request_seek(0.0, False)
+            tile.seek_request = None
+        if self.pool.stop():
+            for tile in self.tiles:
+                tile.close()
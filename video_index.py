@@ -0,0 +1,127 @@
+from fractions import Fraction
+import av
+import numpy as np
+from sidecar import load_sidecar, save_sidecar
+
+INDEX_VERSION = 1
+
+
+def index_path_for(video_path):
+    return video_path + '.index.npz'
+
+
+class VideoIndex:
+    """Packet table (PTS, DTS, keyframe flag, byte offset) for the first video stream.
+
+    Entries are sorted by PTS, so row N is the Nth frame in presentation order.
+    """
+
+    def __init__(self, pts, dts, is_key, pos, time_base):
+        self.pts = pts
+        self.dts = dts
+        self.is_key = is_key
+        self.pos = pos
+        self.time_base = time_base
+        self.key_frames = np.flatnonzero(is_key)
+        # Streams whose first packet isn't flagged as a keyframe still need somewhere to seek to
+        if len(self.key_frames) == 0 or self.key_frames[0] != 0:
+            self.key_frames = np.concatenate(([0], self.key_frames))
+
+    @classmethod
+    def build(cls, video_path):
+        """Demux-only pass over the video stream, nothing gets decoded"""
+        container = av.open(video_path)
+        try:
+            stream = container.streams.video[0]
+            pts, dts, is_key, pos = [], [], [], []
+            for packet in container.demux(stream):
+                # The flush packet at EOF carries no timestamps
+                ts = packet.pts if packet.pts is not None else packet.dts
+                if ts is None:
+                    continue
+                pts.append(ts)
+                dts.append(packet.dts if packet.dts is not None else ts)
+                is_key.append(packet.is_keyframe)
+                pos.append(packet.pos if packet.pos is not None else -1)
+            time_base = stream.time_base
+        finally:
+            container.close()
+
+        pts = np.asarray(pts, dtype=np.int64)
+        order = np.argsort(pts, kind='stable')
+        return cls(
+            pts[order],
+            np.asarray(dts, dtype=np.int64)[order],
+            np.asarray(is_key, dtype=bool)[order],
+            np.asarray(pos, dtype=np.int64)[order],
+            time_base,
+        )
+
+    @classmethod
+    def empty(cls, time_base=Fraction(1, 1)):
+        """Index with no frames, for a file that couldn't be read"""
+        none = np.zeros(0, dtype=np.int64)
+        return cls(none, none, np.zeros(0, dtype=bool), none, time_base)
+
+    @classmethod
+    def load(cls, video_path):
+        """Load the sidecar index, or return None if it is missing or stale"""
+        data = load_sidecar(index_path_for(video_path), video_path, INDEX_VERSION)
+        if data is None:
+            return None
+        num, den = (int(x) for x in data['time_base'])
+        return cls(data['pts'], data['dts'], data['is_key'], data['pos'], Fraction(num, den))
+
+    def save(self, video_path):
+        save_sidecar(
+            index_path_for(video_path), video_path, INDEX_VERSION,
+            time_base=np.array([self.time_base.numerator, self.time_base.denominator]),
+            pts=self.pts,
+            dts=self.dts,
+            is_key=self.is_key,
+            pos=self.pos,
+        )
+
+    @classmethod
+    def open(cls, video_path):
+        """Load the cached index for video_path, building and saving it if needed"""
+        index = cls.load(video_path)
+        if index is None:
+            index = cls.build(video_path)
+            index.save(video_path)
+        return index
+
+    def __len__(self):
+        return len(self.pts)
+
+    @property
+    def duration(self):
+        """End time of the last frame, in seconds"""
+        if len(self.pts) == 0:
+            return 0.0
+        last = int(self.pts[-1])
+        step = last - int(self.pts[-2]) if len(self.pts) > 1 else 0
+        return float((last + step) * self.time_base)
+
+    def time_of(self, frame_number):
+        return float(int(self.pts[frame_number]) * self.time_base)
+
+    def frame_at_time(self, timestamp):
+        """Frame on screen at timestamp: the last frame whose PTS is <= timestamp"""
+        target = round(timestamp / self.time_base)
+        frame_number = int(np.searchsorted(self.pts, target, side='right')) - 1
+        return max(0, min(frame_number, len(self.pts) - 1))
+
+    def frame_number(self, pts):
+        """Frame number of the frame with this PTS, or None if no frame has it"""
+        i = int(np.searchsorted(self.pts, pts, side='left'))
+        return i if i < len(self.pts) and self.pts[i] == pts else None
+
+    def keyframe_for(self, frame_number):
+        """Frame number of the keyframe that decoding frame_number has to start from"""
+        i = int(np.searchsorted(self.key_frames, frame_number, side='right')) - 1
+        return int(self.key_frames[max(i, 0)])
+
+    def previous_keyframe(self, key_frame_number):
+        i = int(np.searchsorted(self.key_frames, key_frame_number, side='left')) - 1
+        return int(self.key_frames[i]) if i >= 0 else None
@@ -0,0 +1,217 @@
+import itertools
+import threading
+import av
+import numpy as np
+from sidecar import load_sidecar, save_sidecar
+
+WAVEFORM_VERSION = 1
+# Samples summarized by each peak of the finest level; every level up doubles it
+BASE_BIN = 256
+# Mono samples gathered before they are reduced to peaks, so numpy works on whole blocks
+# rather than one small audio frame at a time
+CHUNK_SAMPLES = BASE_BIN * 256
+# Enough levels for about 12 hours at 48 kHz to fit in a single peak
+MAX_LEVELS = 24
+
+
+def waveform_path_for(video_path):
+    return video_path + '.waveform.npz'
+
+
+class Waveform:
+    """Min, max and RMS of the first audio track at every power-of-two zoom, for drawing
+    under the slider.
+
+    A background thread demuxes and decodes the audio stream alone, mixes it down to
+    mono and reduces it to one (min, max, rms) peak per BASE_BIN samples as it goes;
+    each level above holds one peak per pair below it. Decoded audio never outlives
+    its chunk, so the pass runs in the same memory whatever the length, and the peaks
+    it keeps are about a hundredth the size of the mono audio. `counts` goes up as
+    peaks land, so the GUI can draw what has been read so far. Only the finest level
+    is cached next to the video, the others are rebuilt from it on load; it is reused
+    while the video's size and mtime match.
+    """
+
+    def __init__(self, video_path):
+        self.video_path = video_path
+        self.sample_rate = 0
+        self.start_time = 0.0
+        self.levels = []
+        self.counts = []
+        self.done = False
+        self._running = True
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self._running = False
+        self.thread.join(timeout=1.0)
+
+    @property
+    def peak_seconds(self):
+        """Seconds each peak of the finest level covers, as far as it can be zoomed in"""
+        return BASE_BIN / self.sample_rate if self.sample_rate else 0.0
+
+    def peaks(self, start, end, columns):
+        """(min, max, rms) arrays with one value per column evenly covering start..end
+        seconds, from the coarsest level with at least one peak per column. Columns
+        before the audio or past what has been read so far are NaN. None before
+        anything has been read."""
+        if not self.counts or self.counts[0] == 0 or end <= start or columns <= 0:
+            return None
+        column_samples = (end - start) * self.sample_rate / columns
+        level = int(np.log2(max(column_samples / BASE_BIN, 1.0)))
+        level = min(level, len(self.levels) - 1)
+        # Count before array: the array is only ever swapped for a bigger copy
+        count = self.counts[level]
+        while count == 0:
+            level -= 1
+            count = self.counts[level]
+        peaks = self.levels[level][:count]
+
+        bin_seconds = BASE_BIN * 2 ** level / self.sample_rate
+        edges = np.floor((start - self.start_time + np.arange(columns + 1) * (end - start) / columns)
+                         / bin_seconds).astype(np.int64)
+        first = np.clip(edges[:-1], 0, count - 1)
+        last = np.clip(edges[1:], 0, count)
+        # Each column reduces the peaks from its first up to the next column's, the last
+        # one up to the end of the slice; one narrower than a peak just repeats it
+        stop = max(first[-1] + 1, last[-1])
+        peaks = peaks[first[0]:stop]
+        first = first - first[0]
+        low = np.minimum.reduceat(peaks[:, 0], first)
+        high = np.maximum.reduceat(peaks[:, 1], first)
+        spans = np.maximum(np.diff(first, append=len(peaks)), 1)
+        rms = np.sqrt(np.add.reduceat(peaks[:, 2] ** 2, first) / spans)
+        outside = (edges[:-1] < 0) | (edges[:-1] >= count)
+        for values in (low, high, rms):
+            values[outside] = np.nan
+        return low, high, rms
+
+    def _allocate(self, base_capacity):
+        """Levels big enough for base_capacity finest peaks, keeping the ones so far"""
+        levels = []
+        for level in range(MAX_LEVELS):
+            array = np.zeros(((base_capacity >> level) + 1, 3), dtype=np.float32)
+            if level < len(self.levels):
+                array[:self.counts[level]] = self.levels[level][:self.counts[level]]
+            levels.append(array)
+        self.levels = levels
+        if not self.counts:
+            self.counts = [0] * MAX_LEVELS
+
+    def _append(self, blocks):
+        """Reduce (n, BASE_BIN) samples to n finest peaks and fold them up the levels"""
+        count = self.counts[0]
+        if count + len(blocks) > len(self.levels[0]):
+            self._allocate(2 * (count + len(blocks)))
+        out = self.levels[0][count:count + len(blocks)]
+        out[:, 0] = blocks.min(axis=1)
+        out[:, 1] = blocks.max(axis=1)
+        out[:, 2] = np.sqrt(np.einsum('ij,ij->i', blocks, blocks) / blocks.shape[1])
+        self.counts[0] = count + len(blocks)
+        self._fold()
+
+    def _fold(self, finish=False):
+        """Fill each level from complete pairs in the one below. With finish, a
+        trailing unpaired peak goes up on its own too."""
+        for level in range(1, MAX_LEVELS):
+            below = self.counts[level - 1]
+            have = self.counts[level]
+            new = (below + 1) // 2 if finish else below // 2
+            if new == have:
+                if not finish:
+                    break
+                continue
+            pairs = self.levels[level - 1][2 * have:min(2 * new, below)]
+            if len(pairs) % 2:
+                pairs = np.concatenate((pairs, pairs[-1:]))
+            pairs = pairs.reshape(-1, 2, 3)
+            out = self.levels[level][have:new]
+            out[:, 0] = pairs[:, :, 0].min(axis=1)
+            out[:, 1] = pairs[:, :, 1].max(axis=1)
+            out[:, 2] = np.sqrt((pairs[:, :, 2] ** 2).mean(axis=1))
+            self.counts[level] = new
+
+    def _run(self):
+        # Hours of audio take a moment to load too, so that happens here as well
+        if self._load():
+            self.done = True
+            return
+        try:
+            container = av.open(self.video_path)
+        except Exception as e:
+            print(f"Waveform error: {e}")
+            self.done = True
+            return
+        try:
+            if not container.streams.audio:
+                return
+            stream = container.streams.audio[0]
+            stream.thread_type = 'AUTO'
+            self.sample_rate = stream.rate
+            duration = 0.0
+            if stream.duration:
+                duration = float(stream.duration * stream.time_base)
+            elif container.duration:
+                duration = container.duration / av.time_base
+            if stream.start_time is not None:
+                self.start_time = float(stream.start_time * stream.time_base)
+            self._allocate(max(1024, int(duration * self.sample_rate / BASE_BIN) + 1))
+
+            resampler = av.AudioResampler(format='flt', layout='mono', rate=self.sample_rate)
+            chunk = np.zeros(CHUNK_SAMPLES, dtype=np.float32)
+            filled = 0
+            # Only audio packets are read off the demuxer, the video is never decoded.
+            # None at the end flushes what the resampler holds back.
+            frames = (frame for packet in container.demux(stream) for frame in packet.decode())
+            for frame in itertools.chain(frames, [None]):
+                if not self._running:
+                    return
+                for out_frame in resampler.resample(frame):
+                    samples = out_frame.to_ndarray().reshape(-1)
+                    while len(samples):
+                        take = min(len(samples), CHUNK_SAMPLES - filled)
+                        chunk[filled:filled + take] = samples[:take]
+                        filled += take
+                        samples = samples[take:]
+                        if filled == CHUNK_SAMPLES:
+                            self._append(chunk.reshape(-1, BASE_BIN))
+                            filled = 0
+            whole = filled // BASE_BIN * BASE_BIN
+            if whole:
+                self._append(chunk[:whole].reshape(-1, BASE_BIN))
+            if filled > whole:
+                self._append(chunk[whole:filled].reshape(1, -1))
+            self._fold(finish=True)
+            self._save()
+        except Exception as e:
+            print(f"Waveform error: {e}")
+        finally:
+            container.close()
+            self.done = True
+
+    def _load(self):
+        data = load_sidecar(waveform_path_for(self.video_path), self.video_path, WAVEFORM_VERSION,
+                            base_bin=BASE_BIN)
+        if data is None:
+            return False
+        peaks = data['peaks']
+        self.sample_rate = int(data['sample_rate'])
+        self.start_time = float(data['start_time'])
+        self._allocate(len(peaks))
+        self.levels[0][:len(peaks)] = peaks
+        self.counts[0] = len(peaks)
+        self._fold(finish=True)
+        return True
+
+    def _save(self):
+        save_sidecar(
+            waveform_path_for(self.video_path), self.video_path, WAVEFORM_VERSION,
+            compressed=True,
+            base_bin=BASE_BIN,
+            sample_rate=self.sample_rate,
+            start_time=self.start_time,
+            peaks=self.levels[0][:self.counts[0]],
+        )